@@ -0,0 +1,61 @@
+# database/async_database.py
+import logging
+from typing import AsyncGenerator, Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from database.database import SQLALCHEMY_DATABASE_URL
+from database.pool import async_pool_metrics, engine_options, instrument_engine, pool_status
+
+# 同步 URL -> 异步驱动：Postgres 走 asyncpg，本地 sqlite 走 aiosqlite
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+_async_engine: Optional[AsyncEngine] = None
+
+# expire_on_commit=False：commit 后仍可读取对象属性，不会在事件循环里触发隐式懒加载
+AsyncSessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+def get_async_engine() -> AsyncEngine:
+    """
+    Creates the async engine on first use, so processes that never touch the async path
+    do not need the async driver installed.
+    """
+    global _async_engine
+    if _async_engine is None:
+        url = to_async_url(SQLALCHEMY_DATABASE_URL)
+        _async_engine = create_async_engine(url, **engine_options(url, async_engine=True))
+        instrument_engine(_async_engine.sync_engine, async_pool_metrics)
+        AsyncSessionLocal.configure(bind=_async_engine)
+        logging.info(f"[DB] Async engine created ({url.split('://')[0]})")
+    return _async_engine
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    get_async_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def async_pool_status() -> Optional[dict]:
+    if _async_engine is None:
+        return None
+    return pool_status(_async_engine.sync_engine, async_pool_metrics)
+
+
+async def dispose_async_engine():
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
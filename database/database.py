@@ -5,6 +5,7 @@ from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
 from database.base import Base  # ✅ 从 base.py 获取 Base
+from database.pool import engine_options, instrument_engine
 from modules.users.models import User
 from modules.character.models import Character
 from modules.texter.models import Dialogue
@@ -12,6 +13,7 @@ from modules.imager.models import Image
 
 load_dotenv()
 SQLALCHEMY_DATABASE_URL = os.getenv('DATABASEIPV4')
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# 连接池大小、回收、pre-ping、statement_timeout 等由 DB_* 环境变量配置（见 database/pool.py）
+engine = instrument_engine(create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL)))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
@@ -0,0 +1,144 @@
+# database/pool.py
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# 早于 Postgres / 负载均衡的空闲断开时间回收连接
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# 主从切换后检出时先 ping，丢弃失效连接
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "oc-backend")
+DB_POOL_WAIT_SAMPLES = 1024
+
+
+class PoolMetrics:
+    """
+    Counters for pool activity plus a rolling window of checkout wait times.
+
+    Wait time is how long a caller blocked in the pool before getting a connection, which is
+    the number to watch when sizing DB_POOL_SIZE + DB_MAX_OVERFLOW against uvicorn workers.
+    """
+
+    def __init__(self, samples: int = DB_POOL_WAIT_SAMPLES):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=samples)
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.checkout_timeouts = 0
+        self.max_wait_ms = 0.0
+
+    def observe_wait(self, seconds: float, timed_out: bool = False):
+        wait_ms = seconds * 1000
+        with self._lock:
+            self._waits.append(wait_ms)
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            if timed_out:
+                self.checkout_timeouts += 1
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))], 3) if waits else 0.0
+        return {
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "invalidations": self.invalidations,
+            "checkout_timeouts": self.checkout_timeouts,
+            "wait_ms_p50": percentile(0.5),
+            "wait_ms_p95": percentile(0.95),
+            "wait_ms_max": round(self.max_wait_ms, 3),
+        }
+
+
+pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
+
+
+class _CheckoutTimingMixin:
+    """
+    Records how long each checkout waited for a free connection in `metrics`.
+    """
+    metrics: PoolMetrics = pool_metrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            self.metrics.observe_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.observe_wait(time.perf_counter() - start)
+        return conn
+
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    metrics = pool_metrics
+
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    metrics = async_pool_metrics
+
+
+def engine_options(database_url: str, async_engine: bool = False) -> dict:
+    """
+    Keyword arguments for create_engine / create_async_engine, driven by the DB_* environment variables.
+    """
+    options = {
+        "poolclass": InstrumentedAsyncQueuePool if async_engine else InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if database_url and database_url.startswith("postgresql+asyncpg"):
+        options["connect_args"] = {"server_settings": {
+            "application_name": DB_APPLICATION_NAME,
+            "statement_timeout": str(DB_STATEMENT_TIMEOUT_MS),
+        }}
+    elif database_url and database_url.startswith("postgresql"):
+        options["connect_args"] = {
+            "application_name": DB_APPLICATION_NAME,
+            "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+        }
+    return options
+
+
+def instrument_engine(engine, metrics: PoolMetrics = pool_metrics):
+    """
+    Hooks pool events into `metrics` (pass `engine.sync_engine` for an AsyncEngine).
+    """
+    event.listen(engine, "connect", lambda dbapi_conn, record: metrics.incr("connects"))
+    event.listen(engine, "checkout", lambda dbapi_conn, record, proxy: metrics.incr("checkouts"))
+    event.listen(engine, "checkin", lambda dbapi_conn, record: metrics.incr("checkins"))
+    event.listen(engine, "invalidate", lambda dbapi_conn, record, exc: metrics.incr("invalidations"))
+    return engine
+
+
+def pool_status(engine, metrics: PoolMetrics = pool_metrics) -> dict:
+    pool = engine.pool
+    status = {
+        "pool_size": pool.size() if hasattr(pool, "size") else None,
+        "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+        "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+        "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+        "max_overflow": getattr(pool, "_max_overflow", None),
+    }
+    status.update(metrics.snapshot())
+    return status
@@ -0,0 +1,95 @@
+# database/schema.py
+"""
+建表 / 补索引的一次性命令，部署时在启动 worker 之前运行：
+
+    python -m database.schema           # create_all + 补齐缺失索引
+    python -m database.schema --check   # 只检查，缺表或缺索引时退出码为 1
+
+DB_SCHEMA_ON_STARTUP=false 时 main 导入时不再做建表检查，worker 启动不必连接数据库。
+"""
+import argparse
+import logging
+import os
+import sys
+
+from sqlalchemy import inspect
+
+from database.base import Base
+
+DB_SCHEMA_ON_STARTUP = os.getenv("DB_SCHEMA_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+
+def ensure_indexes(bind):
+    """
+    Creates indexes declared on the models that are missing from existing tables.
+
+    `create_all` only creates indexes together with new tables, so indexes added to a model
+    later (e.g. ix_characters_user_id_name) would otherwise never reach a live database.
+    On a large Postgres table, prefer building the index manually with CREATE INDEX CONCURRENTLY
+    before deploying; this then becomes a no-op.
+    """
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables or not table.indexes:
+            continue
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            try:
+                index.create(bind=bind)
+                created.append(index.name)
+            except Exception as e:
+                logging.error(f"[DB] Failed to ensure index {index.name}: {e}")
+    return created
+
+
+def create_schema(bind):
+    Base.metadata.create_all(bind=bind)
+    return ensure_indexes(bind)
+
+
+def check_schema(bind) -> dict:
+    """
+    Returns the model tables and indexes missing from the database.
+    """
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    missing_tables, missing_indexes = [], []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            missing_tables.append(table.name)
+            continue
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing_indexes.extend(index.name for index in table.indexes if index.name not in existing_indexes)
+    return {"missing_tables": missing_tables, "missing_indexes": missing_indexes}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Create or check the database schema.")
+    parser.add_argument("--check", action="store_true", help="only report missing tables / indexes")
+    args = parser.parse_args(argv)
+
+    from database.database import engine  # 导入时注册全部模型
+
+    if args.check:
+        report = check_schema(engine)
+        for name in report["missing_tables"]:
+            print(f"❌ missing table: {name}")
+        for name in report["missing_indexes"]:
+            print(f"❌ missing index: {name}")
+        if report["missing_tables"] or report["missing_indexes"]:
+            return 1
+        print("✅ schema up to date")
+        return 0
+
+    for name in create_schema(engine):
+        print(f"✅ created index: {name}")
+    print("✅ schema created / up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
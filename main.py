@@ -1,12 +1,15 @@
+import asyncio
 import json
 import os
 import sys
+import time
 from datetime import datetime
-from uuid import uuid4
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Literal
 
-from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Depends, APIRouter
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Depends, APIRouter, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
@@ -14,8 +17,17 @@ from dotenv import load_dotenv
 from modules.imager.image_generator import ImageGenerator
 from modules.imager import crud as image_crud, schemas as image_schemas
 from modules.imager.schemas import ImageCreate
-from modules.texter.schemas import DialogueCreate
+from modules.imager.tasks import generate_character_image
+from modules.jobs.runner import job_runner, JobQueueFull
+from modules.jobs.store import job_store, TERMINAL_STATUSES
+from modules.jobs.webhooks import InvalidWebhookUrl, validate_webhook_url
 from modules.texter.text_generator import TextGenerator
+from modules.texter.text_generator_stream import TextGenerator as StreamTextGenerator
+from modules.texter.memory import conversation_memory
+from modules.texter.response_cache import response_cache
+from modules.texter.dialogue_writer import dialogue_writer
+from modules.texter.history import DIALOGUE_PAGE_DEFAULT, DIALOGUE_PAGE_MAX, build_page, decode_cursor
+from modules.texter.summarizer import DialogueSummarizer
 from modules.users.models import User
 from modules.character import schemas as character_schemas
 from modules.character import crud as character_crud
@@ -26,20 +38,38 @@ from utils.redis import delete_session
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
 
 from database.database import SessionLocal, engine
-from utils.llms import Kimi, StableDiffusion
+from database.async_database import async_pool_status, dispose_async_engine, get_async_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.pool import pool_status
+from database.schema import DB_SCHEMA_ON_STARTUP, create_schema
+from utils.llms import Kimi, StableDiffusion, close_async_http_client
+from utils.llm_registry import get_llm
+from utils.rate_limiter import rate_limiter
+from utils.image_cache import image_cache
+from utils.image_host import IMAGE_HOST_BACKEND, LOCAL_IMAGE_HOST_DIR, LocalHost
+from utils.uploads import save_upload_stream, normalize_and_upload, discard_upload
+from utils.poller import get_poll_scheduler
 from utils.utils import extract_value_from_description, upload_to_imgbb, convert_image_to_png
 from utils.redis import get_session, r, get_user_id_by_token
-from utils.security import verify_password, hash_password
+from utils.security import verify_password, hash_password, password_hasher
 from tools.prompts.text_prompt import text_prompt
 from modules.base_module import BaseModule
-from modules.users import models, schemas, crud
+from modules.users import schemas
+from modules.users import async_crud as users_async_crud
 from modules.users.schemas import ChangePasswordRequest
-from modules.users.dependencies import get_db, get_current_user
-from modules.texter import crud as dialogue_crud
+from modules.users.dependencies import get_db, get_current_user, get_current_user_id
+from modules.users.session_cache import session_cache
+from modules.texter import async_crud as dialogue_async_crud
+from modules.character import async_crud as character_async_crud
 
 # 初始化 FastAPI 应用
 app = FastAPI(title="Unified AI API Service")
 
+# 本地图床后端：上传的图片通过 /hosted 静态路由对外提供
+if IMAGE_HOST_BACKEND == LocalHost.name:
+    os.makedirs(LOCAL_IMAGE_HOST_DIR, exist_ok=True)
+    app.mount("/hosted", StaticFiles(directory=LOCAL_IMAGE_HOST_DIR), name="hosted")
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -49,8 +79,20 @@ app.add_middleware(
 
 load_dotenv()
 
-# 创建数据库表
-models.Base.metadata.create_all(bind=engine)
+# 创建数据库表（生产环境设 DB_SCHEMA_ON_STARTUP=false，改为部署时运行 python -m database.schema）
+if DB_SCHEMA_ON_STARTUP:
+    create_schema(engine)
+
+
+@app.on_event("shutdown")
+async def close_llm_connections():
+    # 释放 LLM 共享连接池，停止接收新的后台图像任务和远端轮询
+    await close_async_http_client()
+    job_runner.shutdown(wait=False)
+    password_hasher.shutdown(wait=False)
+    get_poll_scheduler().stop()
+    await dialogue_writer.close()
+    await dispose_async_engine()
 
 
 # ======================= 获取描述接口 =======================
@@ -98,26 +140,20 @@ def get_my_characters(
     characters = character_crud.get_characters_by_user(db, current_user.id)
     return characters
 
-def save_temp_file(file: UploadFile) -> str:
-    upload_dir = os.path.join(os.getcwd(), "temp_uploads")
-    os.makedirs(upload_dir, exist_ok=True)  # 自动创建目录
-    file_ext = os.path.splitext(file.filename)[-1] or ".png"
-    file_path = os.path.join(upload_dir, f"user_upload_{uuid4().hex}{file_ext}")
-    with open(file_path, "wb") as f:
-        f.write(file.file.read())
-    return file_path
-
 @app.post("/upload-character-image")
 async def upload_character_image(
     character_id: int = Form(...),
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
-    # Step 1: 保存临时文件
-    file_path = save_temp_file(file)
+    # Step 1: 流式保存临时文件
+    upload = await save_upload_stream(file)
 
     # Step 2: 上传到 imgbb
-    public_url = upload_to_imgbb(file_path)
+    try:
+        public_url = upload_to_imgbb(upload.path)
+    finally:
+        discard_upload(upload.path)
     if not public_url:
         raise HTTPException(500, detail="Upload to hosting failed")
 
@@ -129,49 +165,36 @@ async def upload_character_image(
 # ======================= 图像生成接口 =======================
 class Text2ImgRequest(BaseModel):
     description: List[Dict[str, str]]
+    bypass_cache: Optional[bool] = False  # True 时跳过图像缓存，重新生成（新图会替换缓存）
 
 
 @app.post("/generate/text2img")
 def generate_text2img(
     request: Text2ImgRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id)
 ):
     # ✅ Step 1: 提取角色名
     character_name = extract_value_from_description(request.description, key="Name")
     if character_name == "unknown":
         raise HTTPException(status_code=400, detail="Character name not found in description")
 
-    # ✅ Step 2: 查询角色信息
-    character = character_crud.get_character_by_name(db, character_name)
+    # ✅ Step 2: 查询当前用户的角色信息
+    character = character_crud.get_character_for_user(db, current_user_id, character_name)
     if not character:
         raise HTTPException(status_code=404, detail=f"Character '{character_name}' not found")
 
     character_id = character.id
 
-    # ✅ Step 3: 使用数据库中的完整角色描述（结构化 or 纯文本包装）
+    # ✅ Step 3: 使用数据库中的完整角色描述（角色快照中已预解析：结构化 or 纯文本包装）
     print("🔥 当前角色名：", character.name)
-    print("🔥 数据库中 description 类型：", type(character.description))
-    print("🔥 数据库中 description 内容：", character.description)
-
-    if isinstance(character.description, str):
-        try:
-            parsed = json.loads(character.description)
-            if isinstance(parsed, list):
-                full_description = parsed
-            else:
-                full_description = [{"RawDescription": character.description}]
-        except Exception:
-            full_description = [{"RawDescription": character.description}]
-    elif isinstance(character.description, list):
-        full_description = character.description
-    else:
-        raise HTTPException(status_code=500, detail="Character description format is invalid")
 
     # ✅ Step 4: 调用图像生成器
     generator = ImageGenerator(mode="text2img")
     image_url, _ = generator.generate_image(
-        description=full_description,
-        character_name=character.name
+        description=character.parsed_description,
+        character_name=character.name,
+        use_cache=not request.bypass_cache
     )
 
     if not image_url:
@@ -202,7 +225,9 @@ async def generate_img2img(
     description: str = Form(...),
     file: UploadFile = File(...),
     character_name: Optional[str] = Form(None),
-    db: Session = Depends(get_db)
+    bypass_cache: bool = Form(False),
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id)
 ):
 
     # ✅ Step 1: 提取角色名（优先使用 character_name 参数，其次从 description 中提取）
@@ -218,30 +243,19 @@ async def generate_img2img(
         if character_name == "unknown":
             raise HTTPException(status_code=400, detail="Character name not found in description")
 
-    # ✅ Step 2: 查询角色信息
-    character = character_crud.get_character_by_name(db, character_name)
+    # ✅ Step 2: 查询当前用户的角色信息
+    character = character_crud.get_character_for_user(db, current_user_id, character_name)
     if not character:
         raise HTTPException(status_code=404, detail=f"Character '{character_name}' not found")
 
     character_id = character.id
 
-    # ✅ Step 3: 使用数据库中的完整描述（结构化 or 包装成 RawDescription）
+    # ✅ Step 3: 流式保存上传文件，归一化后只上传一次，URL 同时用于记录和 SD init image
+    upload = await save_upload_stream(file)
     try:
-        stored_description = character.description
-        if isinstance(stored_description, str):
-            parsed = json.loads(stored_description)
-            if isinstance(parsed, list):
-                full_description = parsed
-            else:
-                full_description = [{"RawDescription": stored_description}]
-        else:
-            full_description = [{"RawDescription": str(stored_description)}]
-    except Exception:
-        full_description = [{"RawDescription": character.description}]
-
-    # ✅ Step 3 (替代): 保存文件 + 上传 imgbb
-    file_path = save_temp_file(file)
-    user_image_url = upload_to_imgbb(file_path)
+        user_image_url = normalize_and_upload(upload.path)
+    finally:
+        discard_upload(upload.path)
     if not user_image_url:
         raise HTTPException(status_code=500, detail="Upload to image host failed")
 
@@ -259,9 +273,11 @@ async def generate_img2img(
     # ✅ Step 4: 调用图像生成器
     generator = ImageGenerator(mode="img2img")
     generated_image_url, _ = generator.generate_image(
-        description=full_description,
+        description=character.parsed_description,  # 角色快照中已预解析：结构化 or 包装成 RawDescription
         character_name=character.name,
-        init_image_path=file_path
+        init_image_url=user_image_url,
+        init_image_hash=upload.sha256,
+        use_cache=not bypass_cache
     )
 
     if not generated_image_url:
@@ -296,88 +312,376 @@ class DialogueItem(BaseModel):
 class GenerateTextRequest(BaseModel):
     dialogues: List[Dict[str, str]]
     description: List[Dict[str, str]]
+    bypass_cache: Optional[bool] = False  # True 时跳过回复缓存，强制调用 LLM
 
 router = APIRouter()
+dialogue_summarizer = DialogueSummarizer()
+
+
+def _user_messages(dialogues: List[Dict]) -> List[str]:
+    return [
+        content.strip()
+        for content in ((d.get("Input") or d.get("content")) for d in dialogues)
+        if content and content.strip()
+    ]
+
+
+def _dialogue_summary_text(character) -> Optional[str]:
+    # 滚动摘要随角色快照一起缓存，这里只取文本，不触发 LLM
+    return character.summary
+
+
 @router.post("/generate-text")
 async def generate_text_api(
     request: GenerateTextRequest,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id)
 ):
     # 1. 提取角色名（从请求体的 description 中提取 Name 字段）
     character_name = extract_value_from_description(request.description, key="Name")
     if character_name == "unknown":
         raise HTTPException(status_code=400, detail="Character name not found in description")
 
-    # 2. 查询角色信息（角色名唯一，由前端保证）
-    character = character_crud.get_character_by_name(db, character_name)
+    # 2. 查询当前用户的角色（(user_id, name) 索引 + 缓存）；AsyncSession 查询不阻塞事件循环
+    character = await character_async_crud.get_character_for_user(db, current_user_id, character_name)
     if not character:
         raise HTTPException(status_code=404, detail="Character not found")
 
-    # 3. 使用数据库中保存的完整角色描述
+    # 3. 使用数据库中保存的完整角色描述：快照里已有解析结果和拼好的 persona 文本，不再逐请求解析
     print("🔥 当前角色名：", character.name)
-    print("🔥 数据库中 description 类型：", type(character.description))
-    print("🔥 数据库中 description 内容：", character.description)
-
-    if isinstance(character.description, str):
-        try:
-            # 尝试解析为结构化 JSON
-            parsed = json.loads(character.description)
-            if isinstance(parsed, list):
-                full_description = parsed
-            else:
-                # 如果是普通字符串而非 JSON list，则包装为单项 list 结构
-                full_description = [{"RawDescription": character.description}]
-        except Exception:
-            # 非 JSON 字符串，说明是纯文本描述，包装处理
-            full_description = [{"RawDescription": character.description}]
-    elif isinstance(character.description, list):
-        full_description = character.description
-    else:
-        raise HTTPException(status_code=500, detail="Character description format is invalid")
 
     # 4. 格式化对话内容
-    formatted_dialogues = request.dialogues
-
-    # 5. 入库用户对话
-    for d in request.dialogues:
-        content = d.get("Input") or d.get("content")
-        if content and content.strip():
-            dialogue = DialogueCreate(
-                character_id=character.id,
-                sender="user",  # 或从 d.get("sender") 取也行
-                content=content.strip()
-            )
-            dialogue_crud.create_dialogue(db, dialogue)
-
-    # 6. 调用文本生成器
-    generator = TextGenerator()
+    user_messages = _user_messages(request.dialogues)
+
+    # 5. 调用文本生成器（历史从 Redis 会话记忆中按 用户+角色 读取）
+    generator = TextGenerator(memory=conversation_memory, response_cache=response_cache)
     result = await generator.generate_text(
         dialogues=request.dialogues,  # 用原始格式也可以
-        description=full_description,
-        character_name=character.name
+        description=character.parsed_description,
+        persona=character.persona,
+        character_name=character.name,
+        user_id=character.user_id,
+        character_id=character.id,
+        summary=_dialogue_summary_text(character),
+        use_cache=not request.bypass_cache
     )
 
-    # 7. 角色回复
+    # 6. 角色回复
     reply_text = result.get("SampleSpeech", "") if isinstance(result, dict) else str(result)
 
-    # 8. 存入角色回复
-    reply = DialogueCreate(
+    # 7. 用户消息 + 角色回复 + character.generated_dialogue 一个事务落库；
+    #    write-behind 模式下交给后台批量写入
+    if dialogue_writer.write_behind:
+        background_tasks.add_task(dialogue_writer.save, character.id, user_messages, reply_text)
+    else:
+        await dialogue_writer.save(character.id, user_messages, reply_text, db=db)
+
+    # 8. 后台增量更新滚动摘要（达到阈值才会调用 LLM）
+    background_tasks.add_task(dialogue_summarizer.maybe_update, character.id)
+
+    # 9. 返回响应
+    return {
+        "result": result
+    }
+
+
+def _sse_event(data: dict, event: Optional[str] = None) -> str:
+    # 每个 token 做 JSON 编码，避免换行打断 SSE 的 data 行
+    payload = json.dumps(data, ensure_ascii=False)
+    if event:
+        return f"event: {event}\ndata: {payload}\n\n"
+    return f"data: {payload}\n\n"
+
+
+async def persist_streamed_dialogues(character_id: int, user_messages: List[str], reply_text: Optional[str]):
+    """
+    流式结束后在后台写入本轮对话（请求内的 db session 此时已关闭，writer 单独开 session）；
+    客户端中途断开时 reply_text 为 None，只保存用户消息
+    """
+    await dialogue_writer.save(character_id, user_messages, reply_text)
+
+
+@router.post("/generate-text-stream")
+async def generate_text_stream_api(
+    request: GenerateTextRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """
+    /generate-text 的流式版本（text/event-stream）：
+      - 每个 token 作为 `data: {"token": "..."}` 推送
+      - 结束时推送 `event: done`，携带与 /generate-text 相同的 result
+      - 首 token 延迟通过响应头 X-First-Token-Latency-Ms 返回
+      - 流结束后在后台写入 user / character 的 Dialogue 记录，并增量更新滚动摘要
+    """
+    # 1. 提取角色名并查询角色
+    character_name = extract_value_from_description(request.description, key="Name")
+    if character_name == "unknown":
+        raise HTTPException(status_code=400, detail="Character name not found in description")
+
+    character = await character_async_crud.get_character_for_user(db, current_user_id, character_name)
+    if not character:
+        raise HTTPException(status_code=404, detail="Character not found")
+
+    # 2. 使用数据库中保存的完整角色描述（角色快照中已预解析）
+    character_id = character.id
+    user_messages = _user_messages(request.dialogues)
+
+    # 3. 先拿到首个 token 再返回响应，这样首 token 延迟才能写进响应头
+    generator = StreamTextGenerator(memory=conversation_memory)
+    tokens = generator.generate_text_stream(
+        request.dialogues,
+        character.parsed_description,
+        character_name=character.name,
+        user_id=character.user_id,
         character_id=character.id,
-        sender="character",
-        content=reply_text
+        summary=_dialogue_summary_text(character),
+        persona=character.persona
+    )
+    started_at = time.perf_counter()
+    try:
+        first_token = await anext(tokens)
+    except StopAsyncIteration:
+        first_token = ""
+    first_token_ms = (time.perf_counter() - started_at) * 1000
+
+    chunks: List[str] = [first_token]
+    state = {"completed": False}
+
+    async def event_stream():
+        try:
+            if first_token:
+                yield _sse_event({"token": first_token})
+            async for token in tokens:
+                chunks.append(token)
+                yield _sse_event({"token": token})
+            state["completed"] = True
+            result = generator.extract_content_from_response("".join(chunks))
+            yield _sse_event({"result": result}, event="done")
+        finally:
+            await tokens.aclose()
+
+    async def persist():
+        reply_text = None
+        if state["completed"]:
+            result = generator.extract_content_from_response("".join(chunks))
+            reply_text = result.get("SampleSpeech", "") if isinstance(result, dict) else str(result)
+        await persist_streamed_dialogues(character_id, user_messages, reply_text)
+
+    background = BackgroundTasks()
+    background.add_task(persist)
+    background.add_task(dialogue_summarizer.maybe_update, character_id)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "X-First-Token-Latency-Ms": f"{first_token_ms:.1f}",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # 关闭 nginx 缓冲，保证逐 token 下发
+        },
+        background=background
     )
-    dialogue_crud.create_dialogue(db, reply)
 
-    # 9. 更新 character.generated_dialogue 字段
-    character.generated_dialogue = reply_text
-    db.flush()  # 确保 pending changes 入库
-    db.refresh(character)  # 刷新当前对象的最新值
-    db.commit()
 
-    # 10. 返回响应
+@router.get("/dialogues/{character_name}")
+async def get_dialogue_history(
+    character_name: str,
+    limit: int = Query(DIALOGUE_PAGE_DEFAULT, ge=1, le=DIALOGUE_PAGE_MAX),
+    cursor: Optional[str] = None,
+    format: Literal["rows", "columnar"] = "rows",
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """
+    对话历史，按时间倒序分页：
+      - 首页不带 cursor，之后把上一页的 next_cursor 原样传回；next_cursor 为 null 表示到底
+      - keyset 分页走 (character_id, timestamp, id) 索引，翻到多深都是一次索引 seek
+      - format=columnar 返回按列组织的数组，长列表体积更小
+    """
+    character = await character_async_crud.get_character_for_user(db, current_user_id, character_name)
+    if not character:
+        raise HTTPException(status_code=404, detail="Character not found")
+
+    before = decode_cursor(cursor) if cursor else None
+    rows = await dialogue_async_crud.get_dialogue_page(db, character.id, limit, before=before)
+    return build_page(rows, limit, columnar=(format == "columnar"))
+
+# ======================= 异步图像任务接口 =======================
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "1"))
+
+
+class Text2ImgJobRequest(Text2ImgRequest):
+    webhook_url: Optional[str] = None  # 任务结束后 POST 完整 job 文档到该地址（仅 https 公网地址）
+
+
+def _check_webhook_url(webhook_url: Optional[str]) -> Optional[str]:
+    if not webhook_url:
+        return None
+    try:
+        return validate_webhook_url(webhook_url)
+    except InvalidWebhookUrl as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _submit_image_job(mode: str, character, user_id: int, webhook_url: Optional[str],
+                      init_image_path: Optional[str] = None, init_image_hash: Optional[str] = None,
+                      use_cache: bool = True) -> dict:
+    try:
+        return job_runner.submit(
+            mode,
+            generate_character_image,
+            mode,
+            character.id,
+            character.name,
+            character.parsed_description,
+            init_image_path=init_image_path,
+            init_image_hash=init_image_hash,
+            executor=job_runner.executor,
+            use_cache=use_cache,
+            user_id=user_id,
+            webhook_url=webhook_url,
+            meta={"character_id": character.id}
+        )
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Too many pending image jobs, please retry later")
+
+
+@app.post("/jobs/text2img", status_code=202)
+def submit_text2img_job(
+    request: Text2ImgJobRequest,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """
+    提交 text2img 任务，立即返回 job_id；通过 GET /jobs/{job_id}、SSE 或 webhook 获取结果
+    """
+    webhook_url = _check_webhook_url(request.webhook_url)
+    character_name = extract_value_from_description(request.description, key="Name")
+    if character_name == "unknown":
+        raise HTTPException(status_code=400, detail="Character name not found in description")
+
+    character = character_crud.get_character_for_user(db, current_user_id, character_name)
+    if not character:
+        raise HTTPException(status_code=404, detail=f"Character '{character_name}' not found")
+
+    job = _submit_image_job("text2img", character, current_user_id, webhook_url,
+                            use_cache=not request.bypass_cache)
+    return {"job_id": job["id"], "status": job["status"]}
+
+
+@app.post("/jobs/img2img", status_code=202)
+async def submit_img2img_job(
+    description: str = Form(...),
+    file: UploadFile = File(...),
+    character_name: Optional[str] = Form(None),
+    webhook_url: Optional[str] = Form(None),
+    bypass_cache: bool = Form(False),
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """
+    提交 img2img 任务：请求内只保存上传文件，上传图床与生成都在后台 worker 中完成
+    """
+    webhook_url = await asyncio.to_thread(_check_webhook_url, webhook_url)  # 含 DNS 解析
+    try:
+        description_json = json.loads(description)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid description format. Must be a JSON string list.")
+
+    if character_name and character_name.strip():
+        character_name = character_name.strip()
+    else:
+        character_name = extract_value_from_description(description_json, key="Name")
+        if character_name == "unknown":
+            raise HTTPException(status_code=400, detail="Character name not found in description")
+
+    character = character_crud.get_character_for_user(db, current_user_id, character_name)
+    if not character:
+        raise HTTPException(status_code=404, detail=f"Character '{character_name}' not found")
+
+    upload = await save_upload_stream(file)
+    try:
+        job = _submit_image_job("img2img", character, current_user_id, webhook_url,
+                                init_image_path=upload.path, init_image_hash=upload.sha256,
+                                use_cache=not bypass_cache)
+    except Exception:
+        # 未入队（如队列已满返回 503）：临时文件不会被 worker 清理，这里删掉
+        discard_upload(upload.path)
+        raise
+    return {"job_id": job["id"], "status": job["status"]}
+
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str, current_user_id: int = Depends(get_current_user_id)):
+    job = job_store.get_for_user(job_id, current_user_id)  # 非本人提交的任务同样返回 404
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, current_user_id: int = Depends(get_current_user_id)):
+    """
+    以 SSE 推送任务状态变化，任务结束（succeeded / failed）后关闭连接
+    """
+    job = await asyncio.to_thread(job_store.get_for_user, job_id, current_user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        current = job
+        last_update = None
+        while True:
+            if current and current.get("updated_at") != last_update:
+                last_update = current.get("updated_at")
+                yield _sse_event(current, event="status")
+            if not current or current.get("status") in TERMINAL_STATUSES:
+                break
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+            current = await asyncio.to_thread(job_store.get, job_id)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ======================= 缓存 / 连接池指标接口 =======================
+@app.get("/metrics/cache")
+def get_cache_metrics():
     return {
-        "result": result
+        "image_cache": image_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "session_cache": session_cache.stats(),
+        "password_hasher": password_hasher.stats()
     }
+
+
+@app.get("/metrics/db")
+def get_db_pool_metrics():
+    status = pool_status(engine)
+    status["async_pool"] = async_pool_status()  # 尚未创建异步引擎时为 None
+    status["dialogue_writer"] = dialogue_writer.stats()
+    return status
+
+
+@app.get("/metrics/llm")
+def get_llm_metrics():
+    """
+    各 provider 的滚动 p50/p95 延迟、错误率与对冲次数
+    """
+    return get_llm("chat").stats()
+
+
+@app.get("/metrics/rate-limits")
+def get_rate_limit_metrics():
+    """
+    各 provider 的限流配置、排队等待时间（p50/p95/max）、超时与 429 次数
+    """
+    return rate_limiter.stats()
+
 # ======================= 视频生成接口 =======================
 class VideoGenerationRequest(BaseModel):
     dialogues: List[Dict[str, str]]
@@ -429,13 +733,15 @@ def generate_video(request: VideoGenerationRequest):
         }
 
 # ======================= 用户认证接口 =======================
+# bcrypt 在专用有界线程池中执行（utils.security.password_hasher），接口本身是 async，
+# 登录高峰不会占满同步接口共用的线程池；队列满时返回 503
 @app.post("/register")
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    return crud.register_user(db, user)
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    return await users_async_crud.register_user(db, user)
 
 @app.post("/login")
-def login(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    return crud.login_user(db, user)
+async def login(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    return await users_async_crud.login_user(db, user)
 
 
 @app.get("/protected-route")
@@ -445,14 +751,15 @@ def protected_route(current_user: User = Depends(get_current_user)):
 @app.post("/logout")
 def logout(token: str = Header(...)):
     delete_session(token)
+    session_cache.invalidate_token(token)
     return {"message": "Logged out successfully"}
 
 @app.post("/change-password")
-def change_password(
+async def change_password(
     request: ChangePasswordRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id)
 ):
-    return crud.change_password(db, current_user.id, request.old_password, request.new_password)
+    return await users_async_crud.change_password(db, current_user_id, request.old_password, request.new_password)
 
 app.include_router(router)
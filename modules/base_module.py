@@ -3,7 +3,8 @@ import json
 import os
 from typing import List, Dict
 
-from utils.llms import OpenAI, DeepSeek, ElevenLabs
+from utils.llm_registry import MODEL_TYPES, get_llm
+from modules.character.description import format_persona
 from dotenv import load_dotenv
 
 load_dotenv(dotenv_path='.env', override=True)
@@ -19,20 +20,16 @@ class BaseModule:
         """
         Initializes a new instance of BaseModule with an optional LLM instance.
         If no LLM is provided, a default one will be selected based on MODEL_TYPE.
+        Clients come from the process-wide registry, so constructing a module is cheap.
         """
         if llm is not None:
             self.llm = llm
         else:
             # fallback to .env config
             MODEL_TYPE = os.getenv("MODEL_TYPE")
-            if MODEL_TYPE == "OpenAI":
-                self.llm = OpenAI()
-            elif MODEL_TYPE == "DeepSeek":
-                self.llm = DeepSeek()
-            elif MODEL_TYPE == "ElevenLabs":
-                self.llm = ElevenLabs()
-            else:
+            if MODEL_TYPE not in MODEL_TYPES:
                 raise ValueError(f"Unsupported MODEL_TYPE: {MODEL_TYPE}")
+            self.llm = get_llm(MODEL_TYPES[MODEL_TYPE])
 
         print(f"✅ Initialized LLM: {self.llm.model_name}")
         # self.environment = PythonEnv()
@@ -183,15 +180,7 @@ class BaseModule:
         """
         将 List[Dict] 转为自然段文本，确保 content 是字符串
         """
-        if not data:
-            return ""
-
-        prompt_lines = []
-        for item in data:
-            for key, value in item.items():
-                prompt_lines.append(f"{key}: {value}")
-
-        return "\n".join(prompt_lines)  # ✅ 返回一个干净的字符串
+        return format_persona(data)  # ✅ 返回一个干净的字符串
 
     def send_chat_prompts(sys_prompt, user_prompt, llm, prefix=""):
         """
@@ -0,0 +1,61 @@
+# modules/character/async_crud.py
+# character/crud.py 的 AsyncSession 版本，供 async 接口在事件循环内使用
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import schemas
+from .cache import character_cache
+from .models import Character
+
+# Create a new character
+async def create_character(db: AsyncSession, character: schemas.CharacterCreate, user_id: int, description: str):
+    new_character = Character(
+        user_id=user_id,
+        name=character.name or "Unnamed Hero",
+        description=description,
+        status=character.status,
+    )
+    db.add(new_character)
+    await db.commit()
+    await db.refresh(new_character)
+    return new_character
+
+# Get all characters belonging to a user
+async def get_characters_by_user(db: AsyncSession, user_id: int):
+    result = await db.execute(select(Character).filter(Character.user_id == user_id))
+    return result.scalars().all()
+
+async def get_character_by_id(db: AsyncSession, character_id: int):
+    result = await db.execute(select(Character).filter(Character.id == character_id))
+    return result.scalars().first()
+
+async def get_character_by_name(db: AsyncSession, name: str, user_id: int = None):
+    query = select(Character).filter(Character.name == name)
+    if user_id is not None:
+        query = query.filter(Character.user_id == user_id)
+    result = await db.execute(query.limit(1))
+    return result.scalars().first()
+
+# 生成接口使用：只在当前用户的角色中查找（走 (user_id, name) 索引），结果经进程内 + Redis 缓存
+async def get_character_for_user(db: AsyncSession, user_id: int, name: str):
+    cached = await character_cache.aget(user_id, name)
+    if cached is not None:
+        return cached
+    character = await get_character_by_name(db, name, user_id=user_id)
+    if character is None:
+        return None
+    return await character_cache.aput(character)
+
+async def update_character_final_image_url(db: AsyncSession, character_id: int, image_url: str):
+    character = await get_character_by_id(db, character_id)
+    if character:
+        character.final_image_url = image_url
+        await db.commit()
+    return character
+
+async def update_character_generated_dialogue(db: AsyncSession, character_id: int, generated_dialogue: str):
+    character = await get_character_by_id(db, character_id)
+    if character:
+        character.generated_dialogue = generated_dialogue
+        await db.commit()
+    return character
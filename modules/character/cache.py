@@ -0,0 +1,155 @@
+# modules/character/cache.py
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import utils.redis as redis_store
+from modules.character.description import format_persona, parse_description
+
+CHARACTER_CACHE_PREFIX = "character:"
+CHARACTER_CACHE_TTL_SECONDS = int(os.getenv("CHARACTER_CACHE_TTL_SECONDS", "600"))
+# 进程内缓存只保留很短时间：其他 worker 的失效只会删除 Redis，本地副本靠 TTL 过期
+CHARACTER_LOCAL_CACHE_TTL_SECONDS = float(os.getenv("CHARACTER_LOCAL_CACHE_TTL_SECONDS", "10"))
+CHARACTER_LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("CHARACTER_LOCAL_CACHE_MAX_ENTRIES", "4096"))
+
+# 只缓存生成链路读取的、很少变化的列；final_image_url / generated_dialogue 每轮对话、每次出图都会写，
+# 放进快照会让每次写入都失效缓存，而生成接口并不读它们
+CACHED_FIELDS = ("id", "user_id", "name", "description", "status")
+
+
+class CachedCharacter:
+    """
+    Detached, read-only snapshot of a characters row plus its rolling dialogue summary text.
+
+    Exposes the same attributes the generation endpoints read from the ORM model, so it can be
+    passed around without a live session. The description is parsed once per snapshot:
+    `parsed_description` (List[dict]) and `persona` (the prompt text block) travel with it
+    through Redis, so hot paths never re-parse an unchanged character.
+    """
+    __slots__ = CACHED_FIELDS + ("summary", "parsed_description", "persona")
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+        # 旧格式的 Redis 缓存没有预解析字段，这里补算一次
+        if self.parsed_description is None:
+            self.parsed_description = parse_description(self.description)
+        if self.persona is None:
+            self.persona = format_persona(self.parsed_description)
+
+    @classmethod
+    def from_model(cls, character) -> "CachedCharacter":
+        fields = {name: getattr(character, name) for name in CACHED_FIELDS}
+        summary = character.dialogue_summary
+        fields["summary"] = summary.summary if summary else None
+        return cls(**fields)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class CharacterCache:
+    """
+    Two-level cache for (user_id, name) -> CachedCharacter: a small in-process dict in front of
+    Redis (`character:{user_id}:{name}`). Writers call `invalidate` after committing.
+    Async callers use `aget` / `aput` / `ainvalidate`, which run the Redis calls in a worker thread.
+    """
+
+    def __init__(self, redis_client=None, ttl_seconds: int = CHARACTER_CACHE_TTL_SECONDS,
+                 local_ttl_seconds: float = CHARACTER_LOCAL_CACHE_TTL_SECONDS,
+                 max_local_entries: int = CHARACTER_LOCAL_CACHE_MAX_ENTRIES):
+        self._redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.local_ttl_seconds = local_ttl_seconds
+        self.max_local_entries = max_local_entries
+        self._local: dict = {}
+        self._lock = threading.Lock()
+
+    @property
+    def redis(self):
+        return self._redis if self._redis is not None else redis_store.r
+
+    @staticmethod
+    def _key(user_id: int, name: str) -> str:
+        return f"{CHARACTER_CACHE_PREFIX}{user_id}:{name}"
+
+    def _get_local(self, key: str) -> Optional[CachedCharacter]:
+        with self._lock:
+            entry = self._local.get(key)
+            if entry and entry[1] > time.monotonic():
+                return entry[0]
+        return None
+
+    def get(self, user_id: int, name: str) -> Optional[CachedCharacter]:
+        key = self._key(user_id, name)
+        cached = self._get_local(key)
+        if cached is not None:
+            return cached
+
+        if self.redis:
+            try:
+                fields = json.loads(self.redis.get(key))
+                if isinstance(fields, dict):
+                    character = CachedCharacter(**fields)
+                    self._store_local(key, character)
+                    return character
+            except Exception:
+                pass
+        return None
+
+    def put(self, character) -> CachedCharacter:
+        cached = character if isinstance(character, CachedCharacter) else CachedCharacter.from_model(character)
+        key = self._key(cached.user_id, cached.name)
+        self._store_local(key, cached)
+        if self.redis:
+            try:
+                self.redis.set(key, json.dumps(cached.to_dict(), ensure_ascii=False), ex=self.ttl_seconds)
+            except Exception as e:
+                logging.error(f"[CharacterCache] Redis write failed: {e}")
+        return cached
+
+    async def aget(self, user_id: int, name: str) -> Optional[CachedCharacter]:
+        # 进程内命中不需要切线程
+        cached = self._get_local(self._key(user_id, name))
+        if cached is not None or not self.redis:
+            return cached
+        return await asyncio.to_thread(self.get, user_id, name)
+
+    async def aput(self, character) -> CachedCharacter:
+        # ORM 属性在事件循环里读完（AsyncSession 的对象不能在其他线程里访问），线程里只写 Redis
+        cached = character if isinstance(character, CachedCharacter) else CachedCharacter.from_model(character)
+        if not self.redis:
+            return self.put(cached)
+        return await asyncio.to_thread(self.put, cached)
+
+    def _store_local(self, key: str, character: CachedCharacter):
+        with self._lock:
+            if len(self._local) >= self.max_local_entries:
+                self._local.clear()
+            self._local[key] = (character, time.monotonic() + self.local_ttl_seconds)
+
+    def invalidate(self, user_id: int, name: str):
+        key = self._key(user_id, name)
+        with self._lock:
+            self._local.pop(key, None)
+        if self.redis:
+            try:
+                self.redis.delete(key)
+            except Exception as e:
+                logging.error(f"[CharacterCache] Redis delete failed: {e}")
+
+    async def ainvalidate(self, user_id: int, name: str):
+        if not self.redis:
+            return self.invalidate(user_id, name)
+        await asyncio.to_thread(self.invalidate, user_id, name)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+
+character_cache = CharacterCache()
@@ -2,6 +2,7 @@
 
 from sqlalchemy.orm import Session
 from . import schemas
+from .cache import character_cache
 from .models import Character
 
 # Create a new character
@@ -30,6 +31,16 @@ def get_character_by_name(db: Session, name: str, user_id: int = None):
         query = query.filter(Character.user_id == user_id)
     return query.first()
 
+# 生成接口使用：只在当前用户的角色中查找（走 (user_id, name) 索引），结果经进程内 + Redis 缓存
+def get_character_for_user(db: Session, user_id: int, name: str):
+    cached = character_cache.get(user_id, name)
+    if cached is not None:
+        return cached
+    character = get_character_by_name(db, name, user_id=user_id)
+    if character is None:
+        return None
+    return character_cache.put(character)
+
 def update_character_final_image_url(db: Session, character_id: int, image_url: str):
     character = get_character_by_id(db, character_id)
     if character:
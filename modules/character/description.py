@@ -0,0 +1,28 @@
+# modules/character/description.py
+import json
+from typing import Any, Dict, List
+
+
+def parse_description(raw: Any) -> List[Dict[str, Any]]:
+    """
+    数据库中的描述：结构化 JSON list 原样返回，其余（纯文本 / 非 list JSON / 空）包装成 RawDescription
+    """
+    if isinstance(raw, list):
+        return raw
+    if isinstance(raw, str):
+        try:
+            parsed = json.loads(raw)
+            if isinstance(parsed, list):
+                return parsed
+        except ValueError:
+            pass
+    return [{"RawDescription": raw if isinstance(raw, str) else str(raw)}]
+
+
+def format_persona(data: List[Dict[str, Any]]) -> str:
+    """
+    将 List[Dict] 转为 "Key: Value" 逐行文本，即 LLM 请求里的 persona 段落
+    """
+    if not data:
+        return ""
+    return "\n".join(f"{key}: {value}" for item in data for key, value in item.items())
@@ -1,14 +1,16 @@
 # modules/character/models.py
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database.base import Base
 from modules.imager.models import Image
-from modules.texter import Dialogue
+from modules.texter import Dialogue, DialogueSummary
 
 
 class Character(Base):
     __tablename__ = "characters"
+    # 生成接口按 (user_id, name) 查角色，复合索引避免全表扫描
+    __table_args__ = (Index("ix_characters_user_id_name", "user_id", "name"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -24,4 +26,6 @@ class Character(Base):
     # 关系
     owner = relationship("User", back_populates="characters")
     dialogues = relationship(Dialogue, back_populates="character")
+    # 滚动对话摘要与角色一起加载（joined），热路径不需要额外查询
+    dialogue_summary = relationship(DialogueSummary, back_populates="character", uselist=False, lazy="joined")
     images = relationship(Image, back_populates="character")
\ No newline at end of file
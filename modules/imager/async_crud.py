@@ -0,0 +1,22 @@
+# modules/imager/async_crud.py
+# imager/crud.py 的 AsyncSession 版本，供 async 接口在事件循环内使用
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import schemas
+from .models import Image
+
+
+# ---------------- Image ----------------
+async def create_image(db: AsyncSession, image: schemas.ImageCreate):
+    new_image = Image(**image.dict())
+    db.add(new_image)
+    await db.commit()
+    await db.refresh(new_image)
+    return new_image
+
+async def get_images_by_character(db: AsyncSession, character_id: int):
+    result = await db.execute(select(Image).filter(Image.character_id == character_id))
+    return result.scalars().all()
+
+async def get_images_by_character_id(db: AsyncSession, character_id: int):
+    return await get_images_by_character(db, character_id)
@@ -1,36 +1,47 @@
 import os
 import sys
 import json
+from concurrent.futures import Future
 from uuid import uuid4
 from typing import Optional, List, Tuple
 
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from flask import Request
 from pydantic import BaseModel
 from starlette.staticfiles import StaticFiles
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from utils.llms import StableDiffusion
+from utils.image_cache import file_sha256
+from utils.llm_registry import get_llm
+from utils.poller import chain_future
 from utils.utils import extract_value_from_description, upload_to_imgbb, convert_image_to_png
 
 class ImageGenerator:
-    def __init__(self, mode: str = "text2img"):
+    def __init__(self, mode: str = "text2img", sd=None):
+        if mode not in ("text2img", "img2img"):
+            raise ValueError("mode must be 'text2img' or 'img2img'")
         self.mode = mode
-        self.sd = StableDiffusion(mode=mode)
+        # StableDiffusion 客户端按 mode 在进程内只创建一次
+        self.sd = sd or get_llm(f"sd_{mode}")
 
-    def generate_image(
+    def _prepare(
         self,
-        description: Optional[List[dict]] = None,
-        character_name: Optional[str] = None,
-        init_image_path: Optional[str] = None,
-        output_path: Optional[str] = None
-    ) -> Tuple[Optional[str], str]:
+        description: Optional[List[dict]],
+        character_name: Optional[str],
+        init_image_path: Optional[str],
+        init_image_url: Optional[str] = None,
+        init_image_hash: Optional[str] = None
+    ) -> Optional[Tuple[str, str, Optional[str], Optional[str]]]:
+        """
+        生成前的准备：返回 (prompt, character_name, init_image_url, init_image_hash)，失败返回 None
+
+        调用方已上传过归一化图像时直接传 init_image_url（及内容哈希），跳过转换和二次上传。
+        """
         # —— 1. description 已由外部轮换池准备，直接使用 ——
         if not description:
             print("❌ 缺少角色描述，终止生成")
-            return None, "unknown"
+            return None
 
         # —— 2. 提取角色名（若未提供） ——
         if not character_name:
@@ -46,7 +57,9 @@ class ImageGenerator:
         prompt = self.sd.build_front_facing_prompt(description)
 
         # —— 4. img2img 特有流程 ——
-        if self.mode == "img2img":
+        if self.mode == "img2img" and init_image_url:
+            init_image_hash = init_image_hash or init_image_url
+        elif self.mode == "img2img":
             if not init_image_path or not os.path.exists(init_image_path):
                 print("❌ init_image_path 无效或未提供，无法进行 img2img")
                 return None
@@ -61,8 +74,28 @@ class ImageGenerator:
                 return None
 
             print("🌐 上传成功，URL:", init_image_url)
+            # 按原图内容寻址，同一张图多次上传得到的不同 URL 也能命中图像缓存
+            init_image_hash = init_image_hash or file_sha256(init_image_path)
         else:
             init_image_url = None
+            init_image_hash = None
+
+        return prompt, character_name, init_image_url, init_image_hash
+
+    def generate_image(
+        self,
+        description: Optional[List[dict]] = None,
+        character_name: Optional[str] = None,
+        init_image_path: Optional[str] = None,
+        output_path: Optional[str] = None,
+        init_image_url: Optional[str] = None,
+        init_image_hash: Optional[str] = None,
+        use_cache: bool = True
+    ) -> Tuple[Optional[str], str]:
+        prepared = self._prepare(description, character_name, init_image_path, init_image_url, init_image_hash)
+        if prepared is None:
+            return None, character_name or "unknown"
+        prompt, character_name, init_image_url, init_image_hash = prepared
 
         # —— 5. 调用 StableDiffusion 生成 ——
         print(f"🎨 开始生成 [{self.mode}] 图像，角色：{character_name}")
@@ -70,7 +103,9 @@ class ImageGenerator:
             prompt=prompt,
             character_name=character_name,
             init_image_url=init_image_url,
-            output_path=output_path
+            output_path=output_path,
+            init_image_hash=init_image_hash,
+            use_cache=use_cache
         )
 
         if remote_url:
@@ -80,6 +115,38 @@ class ImageGenerator:
 
         return remote_url, character_name
 
+    def generate_image_future(
+        self,
+        description: Optional[List[dict]] = None,
+        character_name: Optional[str] = None,
+        init_image_path: Optional[str] = None,
+        output_path: Optional[str] = None,
+        init_image_url: Optional[str] = None,
+        init_image_hash: Optional[str] = None,
+        use_cache: bool = True
+    ) -> Future:
+        """
+        非阻塞版本：准备工作在调用线程完成，远端生成与轮询交给 PollScheduler。
+        Future 结果为 (remote_url, character_name)，与 generate_image 一致。
+        """
+        prepared = self._prepare(description, character_name, init_image_path, init_image_url, init_image_hash)
+        if prepared is None:
+            done: Future = Future()
+            done.set_result((None, character_name or "unknown"))
+            return done
+        prompt, character_name, init_image_url, init_image_hash = prepared
+
+        print(f"🎨 开始生成 [{self.mode}] 图像，角色：{character_name}")
+        remote_future = self.sd.generate_future(
+            prompt=prompt,
+            character_name=character_name,
+            init_image_url=init_image_url,
+            output_path=output_path,
+            init_image_hash=init_image_hash,
+            use_cache=use_cache
+        )
+        return chain_future(remote_future, lambda remote_url: (remote_url, character_name))
+
 
 # —— FastAPI 应用部分 ——
 
@@ -0,0 +1,86 @@
+# modules/imager/tasks.py
+from concurrent.futures import Executor, Future
+from typing import List, Optional
+
+from database.database import SessionLocal
+from modules.character import crud as character_crud
+from modules.imager import crud as image_crud
+from modules.imager.image_generator import ImageGenerator
+from modules.imager.schemas import ImageCreate
+from utils.poller import chain_future
+from utils.uploads import normalize_and_upload, discard_upload
+
+
+def generate_character_image(
+    mode: str,
+    character_id: int,
+    character_name: str,
+    description: List[dict],
+    init_image_path: Optional[str] = None,
+    init_image_hash: Optional[str] = None,
+    executor: Optional[Executor] = None,
+    use_cache: bool = True
+) -> Future:
+    """
+    后台任务：执行一次 text2img / img2img 生成并写库（在 job worker 线程中启动）
+
+    img2img 原图只归一化、上传一次，URL 同时用于 user_upload 记录和 SD init image；
+    准备工作在 worker 线程完成；远端生成与轮询交给 PollScheduler，
+    worker 线程随即释放。生成结束后在 `executor` 上写库。
+
+    Returns:
+        Future: 结果为与同步接口相同的响应体 {"character_name", "character_id", "image_url"}
+    """
+    # img2img：先上传用户原图并记录
+    init_image_url = None
+    if mode == "img2img":
+        try:
+            init_image_url = normalize_and_upload(init_image_path)
+        finally:
+            discard_upload(init_image_path)
+        if not init_image_url:
+            raise RuntimeError("Upload to image host failed")
+        db = SessionLocal()
+        try:
+            image_crud.create_image(db, ImageCreate(
+                character_id=character_id,
+                image_type="user_upload",
+                input_type="img2img",
+                image_url=init_image_url
+            ))
+        finally:
+            db.close()
+
+    generator = ImageGenerator(mode=mode)
+    remote_future = generator.generate_image_future(
+        description=description,
+        character_name=character_name,
+        init_image_url=init_image_url,
+        init_image_hash=init_image_hash,
+        use_cache=use_cache
+    )
+
+    def record(generated) -> dict:
+        image_url, _ = generated
+        if not image_url:
+            raise RuntimeError("Image generation failed")
+
+        db = SessionLocal()
+        try:
+            image_crud.create_image(db, ImageCreate(
+                character_id=character_id,
+                image_type="model_generated",
+                input_type=mode,
+                image_url=image_url
+            ))
+            character_crud.update_character_final_image_url(db, character_id, image_url)
+        finally:
+            db.close()
+
+        return {
+            "character_name": character_name,
+            "character_id": character_id,
+            "image_url": image_url
+        }
+
+    return chain_future(remote_future, record, executor=executor)
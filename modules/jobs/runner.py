@@ -0,0 +1,117 @@
+# modules/jobs/runner.py
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+import requests
+
+from .webhooks import validate_webhook_url
+from .store import JobStore, job_store, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "200"))
+JOB_WEBHOOK_TIMEOUT = float(os.getenv("JOB_WEBHOOK_TIMEOUT", "10"))
+
+
+class JobQueueFull(Exception):
+    """Raised when the worker pool already has `max_pending` jobs queued or running."""
+
+
+class JobRunner:
+    """
+    Runs long generation jobs on a bounded background worker pool.
+
+    `submit` records the job as queued and returns immediately; the worker marks it running,
+    stores the result (or error) in the JobStore and, if a webhook URL was given, POSTs the
+    final job document to it. A job function may return a Future instead of a result; the
+    worker is then released and the job completes when the Future does.
+    """
+
+    def __init__(self, store: JobStore = job_store, max_workers: int = JOB_WORKERS,
+                 max_pending: int = JOB_MAX_PENDING):
+        self.store = store
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        return self._executor
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, job_type: str, fn: Callable[..., dict], *args, user_id: Optional[int] = None,
+               webhook_url: Optional[str] = None, meta: Optional[dict] = None, **kwargs) -> dict:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} jobs already pending")
+            self._pending += 1
+        try:
+            job = self.store.create(job_type, user_id=user_id, **(meta or {}))
+            self.executor.submit(self._run, job["id"], fn, args, kwargs, webhook_url)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return job
+
+    def _run(self, job_id: str, fn: Callable[..., dict], args: tuple, kwargs: dict, webhook_url: Optional[str]):
+        try:
+            self.store.update(job_id, status=JOB_RUNNING)
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._finish(job_id, webhook_url, error=e)
+            return
+
+        # fn 返回 Future 时（远端任务交给 PollScheduler 轮询），释放 worker，完成时再收尾
+        if isinstance(result, Future):
+            result.add_done_callback(lambda done: self._finish_future(job_id, webhook_url, done))
+        else:
+            self._finish(job_id, webhook_url, result=result)
+
+    def _finish_future(self, job_id: str, webhook_url: Optional[str], done: Future):
+        if done.cancelled():
+            self._finish(job_id, webhook_url, error=RuntimeError("cancelled"))
+        elif done.exception() is not None:
+            self._finish(job_id, webhook_url, error=done.exception())
+        else:
+            self._finish(job_id, webhook_url, result=done.result())
+
+    def _finish(self, job_id: str, webhook_url: Optional[str], result=None, error: Optional[BaseException] = None):
+        try:
+            if error is not None:
+                logging.error(f"[Jobs] Job {job_id} failed: {error}")
+                job = self.store.update(job_id, status=JOB_FAILED, error=str(error))
+            else:
+                job = self.store.update(job_id, status=JOB_SUCCEEDED, result=result)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        if webhook_url and job:
+            self._notify(webhook_url, job)
+
+    @staticmethod
+    def _notify(webhook_url: str, job: dict):
+        try:
+            # 提交时已校验过；发送前再解析一次，防止 DNS 在此期间被改指向内网
+            validate_webhook_url(webhook_url)
+            requests.post(webhook_url, json=job, timeout=JOB_WEBHOOK_TIMEOUT, allow_redirects=False)
+        except Exception as e:
+            logging.warning(f"[Jobs] Webhook {webhook_url} failed for job {job.get('id')}: {e}")
+
+    def shutdown(self, wait: bool = False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+job_runner = JobRunner()
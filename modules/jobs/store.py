@@ -0,0 +1,107 @@
+# modules/jobs/store.py
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+from uuid import uuid4
+
+import utils.redis as redis_store
+
+JOB_PREFIX = "job:"
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", str(24 * 3600)))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+TERMINAL_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+
+class JobStore:
+    """
+    Job state kept in a Redis hash per job (`job:{id}`), so any worker can answer status queries.
+
+    Falls back to an in-process dict when Redis is unavailable (single worker / local dev).
+    """
+
+    def __init__(self, redis_client=None, ttl_seconds: int = JOB_TTL_SECONDS):
+        self._redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self._local: dict = {}
+        self._lock = threading.Lock()
+
+    @property
+    def redis(self):
+        return self._redis if self._redis is not None else redis_store.r
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"{JOB_PREFIX}{job_id}"
+
+    @staticmethod
+    def _encode(fields: dict) -> dict:
+        return {k: json.dumps(v, ensure_ascii=False) for k, v in fields.items()}
+
+    @staticmethod
+    def _decode(raw: dict) -> dict:
+        return {k: json.loads(v) for k, v in raw.items()}
+
+    def create(self, job_type: str, user_id: Optional[int] = None, **meta) -> dict:
+        now = time.time()
+        job = {
+            "id": uuid4().hex,
+            "type": job_type,
+            "user_id": user_id,
+            "status": JOB_QUEUED,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            **meta,
+        }
+        self._write(job["id"], job)
+        return job
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        fields["updated_at"] = time.time()
+        self._write(job_id, fields)
+        return self.get(job_id)
+
+    def _write(self, job_id: str, fields: dict):
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.hset(self._key(job_id), mapping=self._encode(fields))
+                pipe.expire(self._key(job_id), self.ttl_seconds)
+                pipe.execute()
+                return
+            except Exception as e:
+                logging.error(f"[Jobs] Redis write failed, keeping job {job_id} in memory: {e}")
+        with self._lock:
+            self._local.setdefault(job_id, {}).update(fields)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        if self.redis:
+            try:
+                raw = self.redis.hgetall(self._key(job_id))
+                if raw:
+                    return self._decode(raw)
+            except Exception as e:
+                logging.error(f"[Jobs] Redis read failed: {e}")
+        with self._lock:
+            job = self._local.get(job_id)
+            return dict(job) if job else None
+
+    def get_for_user(self, job_id: str, user_id: int) -> Optional[dict]:
+        """
+        Returns the job only if `user_id` submitted it; other users get None (same as not found).
+        """
+        job = self.get(job_id)
+        if not job or job.get("user_id") != user_id:
+            return None
+        return job
+
+
+job_store = JobStore()
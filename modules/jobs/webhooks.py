@@ -0,0 +1,45 @@
+# modules/jobs/webhooks.py
+import ipaddress
+import os
+import socket
+from typing import List
+from urllib.parse import urlsplit
+
+# 逗号分隔的允许主机（example.com 同时允许其子域名）；为空时允许任意公网 https 主机
+JOB_WEBHOOK_ALLOWED_HOSTS: List[str] = [
+    host.strip().lower() for host in os.getenv("JOB_WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()
+]
+
+
+class InvalidWebhookUrl(ValueError):
+    """Raised for webhook URLs the server must not call (non-https, not allowed, internal address)."""
+
+
+def _host_allowed(host: str, allowed_hosts: List[str]) -> bool:
+    return not allowed_hosts or any(host == allowed or host.endswith("." + allowed) for allowed in allowed_hosts)
+
+
+def validate_webhook_url(url: str, allowed_hosts: List[str] = None) -> str:
+    """
+    Checks that the server may POST to `url`: https only, host in JOB_WEBHOOK_ALLOWED_HOSTS (when set),
+    and every address the host resolves to is public (no loopback / private / link-local targets).
+    """
+    allowed_hosts = JOB_WEBHOOK_ALLOWED_HOSTS if allowed_hosts is None else allowed_hosts
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme != "https" or not host:
+        raise InvalidWebhookUrl("webhook_url must be an https URL")
+    if parts.username or parts.password:
+        raise InvalidWebhookUrl("webhook_url must not contain credentials")
+    if not _host_allowed(host, allowed_hosts):
+        raise InvalidWebhookUrl(f"webhook host '{host}' is not allowed")
+
+    try:
+        infos = socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError):
+        raise InvalidWebhookUrl(f"webhook host '{host}' cannot be resolved")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global or address.is_multicast:
+            raise InvalidWebhookUrl(f"webhook host '{host}' resolves to a non-public address")
+    return url
@@ -1 +1 @@
-from .models import Dialogue
\ No newline at end of file
+from .models import Dialogue, DialogueSummary
\ No newline at end of file
@@ -0,0 +1,108 @@
+# modules/texter/async_crud.py
+# texter/crud.py 的 AsyncSession 版本，供 async 接口在事件循环内使用
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import schemas
+from .models import Dialogue, DialogueSummary
+from modules.character.cache import character_cache
+from modules.character.models import Character
+
+
+# ---------------- Dialogue ----------------
+async def create_dialogue(db: AsyncSession, dialogue: schemas.DialogueCreate):
+    db_dialogue = Dialogue(
+        character_id=dialogue.character_id,
+        sender=dialogue.sender,
+        content=dialogue.content,
+        timestamp=datetime.utcnow()
+    )
+    db.add(db_dialogue)
+    await db.commit()
+    await db.refresh(db_dialogue)
+    return db_dialogue
+
+def _turn_rows(character_id: int, user_messages: Iterable[str], reply_text: Optional[str], timestamp: datetime):
+    rows = [Dialogue(character_id=character_id, sender="user", content=content, timestamp=timestamp)
+            for content in user_messages]
+    if reply_text is not None:
+        rows.append(Dialogue(character_id=character_id, sender="character", content=reply_text, timestamp=timestamp))
+    return rows
+
+async def save_dialogue_turns(db: AsyncSession, turns: Iterable[tuple]):
+    """
+    一个事务写入多轮对话：turns 为 (character_id, user_messages, reply_text)。
+    插入全部 user / character 消息，并把每个角色的 generated_dialogue 更新为其最后一条回复。
+    """
+    now = datetime.utcnow()
+    latest_reply = {}
+    for character_id, user_messages, reply_text in turns:
+        db.add_all(_turn_rows(character_id, user_messages, reply_text, now))
+        if reply_text is not None:
+            latest_reply[character_id] = reply_text
+
+    # generated_dialogue 不在角色缓存快照里，写入后无需失效缓存
+    for character_id, reply_text in latest_reply.items():
+        await db.execute(
+            update(Character)
+            .where(Character.id == character_id)
+            .values(generated_dialogue=reply_text)
+        )
+    await db.commit()
+
+async def save_dialogue_turn(db: AsyncSession, character_id: int, user_messages: Iterable[str], reply_text: Optional[str]):
+    await save_dialogue_turns(db, [(character_id, list(user_messages), reply_text)])
+
+async def get_dialogues_by_character(db: AsyncSession, character_id: int):
+    result = await db.execute(select(Dialogue).filter(Dialogue.character_id == character_id))
+    return result.scalars().all()
+
+async def get_dialogue_page(db: AsyncSession, character_id: int, limit: int,
+                            before: Optional[Tuple[datetime, int]] = None):
+    """
+    按 (timestamp, id) 倒序取一页历史，before 为上一页最后一条的 (timestamp, id)。
+    多取一条用于判断是否还有下一页；只选需要的列，不构造 ORM 对象。
+    """
+    stmt = select(Dialogue.id, Dialogue.sender, Dialogue.content, Dialogue.timestamp).filter(
+        Dialogue.character_id == character_id
+    )
+    if before is not None:
+        stmt = stmt.filter(tuple_(Dialogue.timestamp, Dialogue.id) < tuple_(*before))
+    stmt = stmt.order_by(Dialogue.timestamp.desc(), Dialogue.id.desc()).limit(limit + 1)
+    result = await db.execute(stmt)
+    return result.all()
+
+async def get_dialogues_after(db: AsyncSession, character_id: int, after_id: int, limit: int):
+    result = await db.execute(
+        select(Dialogue)
+        .filter(Dialogue.character_id == character_id, Dialogue.id > after_id)
+        .order_by(Dialogue.id)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
+# ---------------- Dialogue Summary ----------------
+async def get_dialogue_summary(db: AsyncSession, character_id: int):
+    result = await db.execute(select(DialogueSummary).filter(DialogueSummary.character_id == character_id))
+    return result.scalars().first()
+
+async def upsert_dialogue_summary(db: AsyncSession, character_id: int, summary: str, last_dialogue_id: int):
+    db_summary = await get_dialogue_summary(db, character_id)
+    if db_summary is None:
+        db_summary = DialogueSummary(character_id=character_id)
+        db.add(db_summary)
+    db_summary.summary = summary
+    db_summary.last_dialogue_id = last_dialogue_id
+    db_summary.updated_at = datetime.utcnow()
+    await db.commit()
+    await db.refresh(db_summary)
+    # 缓存的角色快照带有摘要文本，更新后失效
+    owner = (await db.execute(
+        select(Character.user_id, Character.name).filter(Character.id == character_id)
+    )).first()
+    if owner is not None:
+        await character_cache.ainvalidate(owner.user_id, owner.name)
+    return db_summary
@@ -0,0 +1,123 @@
+# modules/texter/context.py
+import logging
+import math
+import os
+import re
+from functools import lru_cache
+from typing import List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # 未安装 tiktoken 时按字符数估算
+    tiktoken = None
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_TOKENIZER = os.getenv("CHAT_CONTEXT_TOKENIZER", "cl100k_base")
+# 每条 message 的角色 / 分隔符开销（与 OpenAI 的计数方式一致的近似值）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(CONTEXT_TOKENIZER)
+    except Exception as e:
+        # 编码表需要下载 / 缓存（TIKTOKEN_CACHE_DIR），离线环境下退化为估算
+        logging.warning(f"[Context] tiktoken encoding unavailable, using estimate: {e}")
+        return None
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """
+    Counts tokens with a local tokenizer (tiktoken), falling back to a character based estimate.
+
+    Results are memoised, so the system prompt and personas that repeat on every request are
+    only tokenised once per process.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+@lru_cache(maxsize=64)
+def compact_prompt(text: str) -> str:
+    """
+    Strips indentation and blank runs from a prompt template without changing its wording.
+    """
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextBuilder:
+    """
+    Packs a chat prompt into a fixed token budget.
+
+    Priority order: system prompt + persona (always kept), the current user input, a summary
+    of older turns (if it fits), then as many of the most recent history messages as still fit,
+    newest first. Whole user/assistant turns are dropped together so the history never starts
+    with an orphaned reply.
+    """
+
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+
+    def build_system_content(self, system_prompt: str, persona: str, summary: Optional[str] = None) -> str:
+        content = compact_prompt(system_prompt) + "\n\n**Persona**:\n" + persona
+        if summary:
+            content += "\n\n**Conversation so far**:\n" + summary
+        return content
+
+    def build(
+        self,
+        system_prompt: str,
+        persona: str,
+        history: List[dict],
+        user_input: str,
+        summary: Optional[str] = None,
+    ) -> List[dict]:
+        system_content = self.build_system_content(system_prompt, persona)
+        user_message = {"role": "user", "content": user_input}
+
+        remaining = self.token_budget - count_tokens(system_content) - message_tokens(user_message) \
+            - 2 * MESSAGE_OVERHEAD_TOKENS
+
+        # 摘要放得下才带上（只占 system 里的一段）
+        if summary:
+            with_summary = self.build_system_content(system_prompt, persona, summary)
+            summary_cost = count_tokens(with_summary) - count_tokens(system_content)
+            if summary_cost <= remaining:
+                system_content = with_summary
+                remaining -= summary_cost
+
+        # 从最新一轮往前装，整轮装不下就停
+        recent: List[dict] = []
+        index = len(history)
+        while index > 0 and remaining > 0:
+            start = index - 1
+            if history[start].get("role") == "assistant" and start > 0 and history[start - 1].get("role") == "user":
+                start -= 1
+            turn = history[start:index]
+            cost = sum(message_tokens(m) for m in turn)
+            if cost > remaining:
+                break
+            recent[:0] = turn
+            remaining -= cost
+            index = start
+
+        return [{"role": "system", "content": system_content}, *recent, user_message]
+
+
+default_context_builder = ContextBuilder()
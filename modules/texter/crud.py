@@ -1,9 +1,14 @@
 from datetime import datetime
 
+from typing import Iterable, Optional
+
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from . import schemas
 from . import models
-from .models import Dialogue
+from .models import Dialogue, DialogueSummary
+from modules.character.cache import character_cache
+from modules.character.models import Character
 
 
 # ---------------- Dialogue ----------------
@@ -19,5 +24,50 @@ def create_dialogue(db: Session, dialogue: schemas.DialogueCreate):
     db.refresh(db_dialogue)
     return db_dialogue
 
+def save_dialogue_turn(db: Session, character_id: int, user_messages: Iterable[str], reply_text: Optional[str]):
+    """
+    一个事务写入一轮对话：全部用户消息 + 角色回复 + characters.generated_dialogue
+    """
+    now = datetime.utcnow()
+    db.add_all([Dialogue(character_id=character_id, sender="user", content=content, timestamp=now)
+                for content in user_messages])
+    if reply_text is not None:
+        db.add(Dialogue(character_id=character_id, sender="character", content=reply_text, timestamp=now))
+        db.execute(
+            update(Character)
+            .where(Character.id == character_id)
+            .values(generated_dialogue=reply_text)
+        )
+    db.commit()
+
 def get_dialogues_by_character(db: Session, character_id: int):
-    return db.query(Dialogue).filter(Dialogue.character_id == character_id).all()
\ No newline at end of file
+    return db.query(Dialogue).filter(Dialogue.character_id == character_id).all()
+
+def get_dialogues_after(db: Session, character_id: int, after_id: int, limit: int):
+    return (
+        db.query(Dialogue)
+        .filter(Dialogue.character_id == character_id, Dialogue.id > after_id)
+        .order_by(Dialogue.id)
+        .limit(limit)
+        .all()
+    )
+
+
+# ---------------- Dialogue Summary ----------------
+def get_dialogue_summary(db: Session, character_id: int):
+    return db.query(DialogueSummary).filter(DialogueSummary.character_id == character_id).first()
+
+def upsert_dialogue_summary(db: Session, character_id: int, summary: str, last_dialogue_id: int):
+    db_summary = get_dialogue_summary(db, character_id)
+    if db_summary is None:
+        db_summary = DialogueSummary(character_id=character_id)
+        db.add(db_summary)
+    db_summary.summary = summary
+    db_summary.last_dialogue_id = last_dialogue_id
+    db_summary.updated_at = datetime.utcnow()
+    db.commit()
+    db.refresh(db_summary)
+    # 缓存的角色快照带有摘要文本，更新后失效
+    if db_summary.character is not None:
+        character_cache.invalidate(db_summary.character.user_id, db_summary.character.name)
+    return db_summary
@@ -0,0 +1,147 @@
+# modules/texter/dialogue_writer.py
+import asyncio
+import logging
+import os
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.async_database import AsyncSessionLocal, get_async_engine
+from modules.texter import async_crud as dialogue_async_crud
+
+# 开启后对话先进内存缓冲，由后台任务合并成一个事务批量落库（进程崩溃会丢失未 flush 的轮次）
+CHAT_DIALOGUE_WRITE_BEHIND = os.getenv("CHAT_DIALOGUE_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+CHAT_DIALOGUE_FLUSH_INTERVAL = float(os.getenv("CHAT_DIALOGUE_FLUSH_INTERVAL", "0.5"))
+CHAT_DIALOGUE_FLUSH_MAX_TURNS = int(os.getenv("CHAT_DIALOGUE_FLUSH_MAX_TURNS", "200"))
+# 数据库持续不可用时缓冲区的上限，超出后丢弃最旧的轮次并记录错误
+CHAT_DIALOGUE_MAX_PENDING = int(os.getenv("CHAT_DIALOGUE_MAX_PENDING", "5000"))
+# flush 失败后按指数退避重试，最长间隔
+CHAT_DIALOGUE_RETRY_MAX_DELAY = float(os.getenv("CHAT_DIALOGUE_RETRY_MAX_DELAY", "30"))
+
+# (character_id, user_messages, reply_text)
+DialogueTurn = Tuple[int, List[str], Optional[str]]
+
+
+class DialogueWriter:
+    """
+    Persists chat turns with one transaction per turn, or — in write-behind mode — one
+    transaction per batch of turns.
+
+    A turn is every user message of the request, the character reply and the
+    characters.generated_dialogue update; before this it was N+2 separate commits.
+    """
+
+    def __init__(self, write_behind: bool = CHAT_DIALOGUE_WRITE_BEHIND,
+                 flush_interval: float = CHAT_DIALOGUE_FLUSH_INTERVAL,
+                 max_turns: int = CHAT_DIALOGUE_FLUSH_MAX_TURNS,
+                 max_pending: int = CHAT_DIALOGUE_MAX_PENDING,
+                 retry_max_delay: float = CHAT_DIALOGUE_RETRY_MAX_DELAY):
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.max_turns = max_turns
+        self.max_pending = max_pending
+        self.retry_max_delay = retry_max_delay
+        self._pending: List[DialogueTurn] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._failures = 0  # 连续失败次数，决定重试退避
+        self._closing = False
+        self.turns_written = 0
+        self.batches_written = 0
+        self.failed_flushes = 0
+        self.dropped_turns = 0
+
+    async def save(self, character_id: int, user_messages: Sequence[str], reply_text: Optional[str],
+                   db: Optional[AsyncSession] = None):
+        """
+        Writes one turn. `db` is reused for the synchronous path; write-behind always
+        flushes on its own session because the request session is closed by then.
+        """
+        turn = (character_id, list(user_messages), reply_text)
+        if not self.write_behind:
+            await self._write([turn], db)
+            return
+
+        self._pending.append(turn)
+        self._enforce_cap()
+        if len(self._pending) >= self.max_turns and not self._failures:
+            await self.flush()
+        else:
+            self._schedule_flush(self.flush_interval)  # 退避期间已有重试任务，不会提前触发
+
+    def _schedule_flush(self, delay: float):
+        task = self._flush_task
+        if task is not None and not task.done() and task is not asyncio.current_task():
+            return
+        self._flush_task = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    def _enforce_cap(self):
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            del self._pending[:overflow]
+            self.dropped_turns += overflow
+            logging.error(f"[DialogueWriter] Buffer full ({self.max_pending} turns), dropped {overflow} oldest turns")
+
+    async def flush(self):
+        turns, self._pending = self._pending, []
+        if not turns:
+            return
+        try:
+            await self._write(turns)
+        except asyncio.CancelledError:
+            self._pending[:0] = turns
+            raise
+        except Exception as e:
+            # 放回队首，按指数退避安排下一次重试
+            self.failed_flushes += 1
+            self._failures += 1
+            self._pending[:0] = turns
+            self._enforce_cap()
+            if self._closing:
+                logging.error(f"[DialogueWriter] Final flush failed, {len(self._pending)} turns lost: {e}")
+                return
+            delay = min(self.retry_max_delay, self.flush_interval * 2 ** self._failures)
+            logging.error(f"[DialogueWriter] Flush of {len(turns)} turns failed, retrying in {delay:.1f}s: {e}")
+            self._schedule_flush(delay)
+        else:
+            self._failures = 0
+
+    async def _write(self, turns: List[DialogueTurn], db: Optional[AsyncSession] = None):
+        if db is not None:
+            await dialogue_async_crud.save_dialogue_turns(db, turns)
+        else:
+            get_async_engine()
+            async with AsyncSessionLocal() as session:
+                await dialogue_async_crud.save_dialogue_turns(session, turns)
+        self.turns_written += len(turns)
+        self.batches_written += 1
+
+    async def close(self):
+        """
+        Flushes whatever is still buffered; called from the app shutdown hook.
+        """
+        self._closing = True
+        task, self._flush_task = self._flush_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "write_behind": self.write_behind,
+            "pending_turns": len(self._pending),
+            "turns_written": self.turns_written,
+            "batches_written": self.batches_written,
+            "failed_flushes": self.failed_flushes,
+            "dropped_turns": self.dropped_turns,
+        }
+
+
+dialogue_writer = DialogueWriter()
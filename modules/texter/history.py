@@ -0,0 +1,60 @@
+# modules/texter/history.py
+import base64
+import binascii
+import os
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+DIALOGUE_PAGE_DEFAULT = int(os.getenv("DIALOGUE_PAGE_DEFAULT", "50"))
+DIALOGUE_PAGE_MAX = int(os.getenv("DIALOGUE_PAGE_MAX", "200"))
+
+HISTORY_COLUMNS = ("id", "sender", "content", "timestamp")
+
+
+def encode_cursor(timestamp: datetime, dialogue_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{dialogue_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    游标是不透明字符串（base64 的 "timestamp|id"），解析失败一律按 400 处理
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, dialogue_id = base64.urlsafe_b64decode(padded).decode().rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(dialogue_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def build_page(rows: Sequence, limit: int, columnar: bool = False) -> dict:
+    """
+    Turns the `limit + 1` rows of get_dialogue_page into a response page, newest first.
+
+    The columnar form sends one array per column instead of one object per message, which
+    drops the repeated keys from every item of a long history page.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor: Optional[str] = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.timestamp, last.id)
+
+    if columnar:
+        columns: dict = {name: [] for name in HISTORY_COLUMNS}
+        for row in rows:
+            columns["id"].append(row.id)
+            columns["sender"].append(row.sender)
+            columns["content"].append(row.content)
+            columns["timestamp"].append(row.timestamp.isoformat())
+        return {"columns": columns, "count": len(rows), "next_cursor": next_cursor}
+
+    items: List[dict] = [
+        {"id": row.id, "sender": row.sender, "content": row.content, "timestamp": row.timestamp.isoformat()}
+        for row in rows
+    ]
+    return {"items": items, "count": len(rows), "next_cursor": next_cursor}
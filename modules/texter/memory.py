@@ -0,0 +1,80 @@
+# modules/texter/memory.py
+import asyncio
+import json
+import logging
+import os
+from typing import List
+
+import utils.redis as redis_store
+
+MEMORY_PREFIX = "chat:history:"
+MEMORY_MAX_MESSAGES = int(os.getenv("CHAT_MEMORY_MAX_MESSAGES", "40"))
+MEMORY_TTL_SECONDS = int(os.getenv("CHAT_MEMORY_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+class ConversationMemory:
+    """
+    Per (user, character) conversation history kept in a Redis list.
+
+    Each entry is a JSON encoded {"role", "content"} message. The list is trimmed to the
+    newest `max_messages` entries and its TTL is refreshed on every append, so idle
+    conversations expire on their own. Loading is a single LRANGE and appending is one
+    pipelined RPUSH + LTRIM + EXPIRE, i.e. one round trip each per chat turn. Async callers
+    use `aload` / `aappend`, which run the blocking Redis calls in a worker thread.
+    """
+
+    def __init__(self, redis_client=None, max_messages: int = MEMORY_MAX_MESSAGES,
+                 ttl_seconds: int = MEMORY_TTL_SECONDS):
+        self._redis = redis_client
+        # 每轮写入 user + assistant 两条，保持偶数避免裁剪出半轮对话
+        self.max_messages = max_messages + (max_messages % 2)
+        self.ttl_seconds = ttl_seconds
+
+    @property
+    def redis(self):
+        # 默认每次取 utils.redis.r，这样测试里 patch 掉的 Redis 也能生效
+        return self._redis if self._redis is not None else redis_store.r
+
+    @staticmethod
+    def _key(user_id: int, character_id: int) -> str:
+        return f"{MEMORY_PREFIX}{user_id}:{character_id}"
+
+    def load(self, user_id: int, character_id: int) -> List[dict]:
+        if not self.redis:
+            return []
+        try:
+            raw = self.redis.lrange(self._key(user_id, character_id), -self.max_messages, -1)
+            return [json.loads(item) for item in raw]
+        except Exception as e:
+            logging.error(f"[Memory] Failed to load history: {e}")
+            return []
+
+    def append(self, user_id: int, character_id: int, *messages: dict):
+        if not self.redis or not messages:
+            return
+        key = self._key(user_id, character_id)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.rpush(key, *(json.dumps(m, ensure_ascii=False) for m in messages))
+            pipe.ltrim(key, -self.max_messages, -1)
+            pipe.expire(key, self.ttl_seconds)
+            pipe.execute()
+        except Exception as e:
+            logging.error(f"[Memory] Failed to append history: {e}")
+
+    async def aload(self, user_id: int, character_id: int) -> List[dict]:
+        if not self.redis:
+            return []
+        return await asyncio.to_thread(self.load, user_id, character_id)
+
+    async def aappend(self, user_id: int, character_id: int, *messages: dict):
+        if not self.redis or not messages:
+            return
+        await asyncio.to_thread(self.append, user_id, character_id, *messages)
+
+    def clear(self, user_id: int, character_id: int):
+        if self.redis:
+            self.redis.delete(self._key(user_id, character_id))
+
+
+conversation_memory = ConversationMemory()
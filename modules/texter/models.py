@@ -1,6 +1,6 @@
 #modules/texter/models.py
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 from sqlalchemy.orm import relationship
@@ -9,6 +9,8 @@ from database.base import Base
 
 class Dialogue(Base):
     __tablename__ = "dialogues"
+    # 历史分页按 (character_id, timestamp, id) 做 keyset 扫描，索引同时覆盖过滤和排序
+    __table_args__ = (Index("ix_dialogues_character_id_timestamp_id", "character_id", "timestamp", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     character_id = Column(Integer, ForeignKey("characters.id"), nullable=False)
@@ -17,3 +19,15 @@ class Dialogue(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
 
     character = relationship("Character", back_populates="dialogues")
+
+
+class DialogueSummary(Base):
+    __tablename__ = "dialogue_summaries"
+
+    # 每个角色一条滚动摘要：覆盖到 last_dialogue_id 为止的所有对话
+    character_id = Column(Integer, ForeignKey("characters.id"), primary_key=True)
+    summary = Column(Text, nullable=False, default="")
+    last_dialogue_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    character = relationship("Character", back_populates="dialogue_summary")
@@ -0,0 +1,160 @@
+# modules/texter/response_cache.py
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Sequence, Union
+
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("CHAT_RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+# 近似匹配的相似度阈值；默认 0 只做归一化后的精确匹配。字符 n-gram 分不清否定等改变语义的改写
+# （"I will go" / "I will not go"），只有换成真正的语义 embedding 后才建议开启
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("CHAT_RESPONSE_CACHE_SIMILARITY", "0"))
+EMBEDDING_DIMENSIONS = 1024
+
+Vector = Union[Dict[int, float], Sequence[float]]
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercases, strips punctuation and collapses whitespace: "Hi. How are you?" -> "hi how are you".
+    """
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def hashed_ngram_embedding(text: str, n: int = 3) -> Dict[int, float]:
+    """
+    Local, dependency free embedding: L2-normalised bag of hashed character n-grams.
+
+    Good enough to match paraphrases such as "hi how are you" / "hi, how are you doing".
+    """
+    padded = f" {text} "
+    counts: Dict[int, float] = {}
+    for i in range(max(len(padded) - n + 1, 1)):
+        bucket = zlib.crc32(padded[i:i + n].encode("utf-8")) % EMBEDDING_DIMENSIONS
+        counts[bucket] = counts.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {k: v / norm for k, v in counts.items()}
+
+
+def _as_sparse(vector: Vector) -> Dict[int, float]:
+    if isinstance(vector, dict):
+        return vector
+    return {i: float(v) for i, v in enumerate(vector) if v}
+
+
+def cosine_similarity(a: Vector, b: Vector) -> float:
+    a, b = _as_sparse(a), _as_sparse(b)
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(v * b.get(k, 0.0) for k, v in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+class ResponseCache:
+    """
+    In-process LRU + TTL cache of chat replies keyed by (persona hash, normalised input).
+
+    Exact matches are a dict lookup. When `similarity_threshold` > 0, a miss falls back to
+    comparing the input embedding against cached inputs of the same persona only, so the
+    scan stays small. `embed` can be swapped for a real local embedding model.
+    """
+
+    def __init__(self, ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 similarity_threshold: float = RESPONSE_CACHE_SIMILARITY,
+                 embed: Optional[Callable[[str], Vector]] = hashed_ngram_embedding):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()   # key -> (response, expires_at, vector)
+        self._by_persona: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def persona_key(persona: str) -> str:
+        return hashlib.sha256(normalize_text(persona).encode("utf-8")).hexdigest()
+
+    def _remove(self, key: tuple):
+        self._entries.pop(key, None)
+        keys = self._by_persona.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_persona[key[0]]
+
+    def get(self, persona: str, user_input: str) -> Optional[str]:
+        persona_hash = self.persona_key(persona)
+        text = normalize_text(user_input)
+        now = time.monotonic()
+        with self._lock:
+            key = (persona_hash, text)
+            entry = self._entries.get(key)
+            if entry is None and self.embed is not None and self.similarity_threshold > 0:
+                key, entry = self._most_similar(persona_hash, text, now)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _most_similar(self, persona_hash: str, text: str, now: float):
+        candidates = self._by_persona.get(persona_hash)
+        if not candidates:
+            return None, None
+        vector = self.embed(text)
+        best_key, best_score = None, self.similarity_threshold
+        for key in candidates:
+            _, expires_at, cached_vector = self._entries[key]
+            if expires_at <= now or cached_vector is None:
+                continue
+            score = cosine_similarity(vector, cached_vector)
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is None:
+            return None, None
+        return best_key, self._entries[best_key]
+
+    def put(self, persona: str, user_input: str, response: str):
+        if not response:
+            return
+        persona_hash = self.persona_key(persona)
+        text = normalize_text(user_input)
+        key = (persona_hash, text)
+        vector = self.embed(text) if self.embed is not None and self.similarity_threshold > 0 else None
+        with self._lock:
+            self._entries[key] = (response, time.monotonic() + self.ttl_seconds, vector)
+            self._entries.move_to_end(key)
+            self._by_persona.setdefault(persona_hash, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_persona.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+response_cache = ResponseCache()
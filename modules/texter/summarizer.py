@@ -0,0 +1,111 @@
+# modules/texter/summarizer.py
+import asyncio
+import logging
+import os
+from typing import List, Optional
+
+import utils.redis as redis_store
+from database.database import SessionLocal
+from modules.base_module import BaseModule
+from modules.texter import crud as dialogue_crud
+from tools.prompts.text_prompt import text_prompt
+from utils.llm_registry import get_llm
+
+# 未摘要的对话累计到 N 条才触发一次增量摘要
+SUMMARY_EVERY_N_DIALOGUES = int(os.getenv("CHAT_SUMMARY_EVERY_N_DIALOGUES", "20"))
+# 最近的 K 条保留原文（由会话记忆带入 prompt），不进入摘要
+SUMMARY_KEEP_RECENT = int(os.getenv("CHAT_SUMMARY_KEEP_RECENT", "10"))
+# 单次摘要最多处理的对话条数，积压过多时分多次追上
+SUMMARY_MAX_BATCH = int(os.getenv("CHAT_SUMMARY_MAX_BATCH", "200"))
+SUMMARY_LOCK_PREFIX = "chat:summary:lock:"
+SUMMARY_LOCK_SECONDS = 120
+
+
+class DialogueSummarizer(BaseModule):
+    """
+    Compresses older dialogues of a character into a rolling summary stored in `dialogue_summaries`.
+
+    The summary is updated incrementally: each run folds the dialogues after `last_dialogue_id`
+    (minus the most recent ones, which stay verbatim in the prompt) into the previous summary.
+    It runs as a background task after a chat turn, so the hot path only reads the stored text.
+    """
+
+    def __init__(self, llm=None, every_n: int = SUMMARY_EVERY_N_DIALOGUES,
+                 keep_recent: int = SUMMARY_KEEP_RECENT, max_batch: int = SUMMARY_MAX_BATCH):
+        super().__init__(llm=llm or get_llm("chat"))
+        self.every_n = every_n
+        self.keep_recent = keep_recent
+        self.max_batch = max_batch
+
+    def _load_pending(self, character_id: int):
+        db = SessionLocal()
+        try:
+            current = dialogue_crud.get_dialogue_summary(db, character_id)
+            previous = current.summary if current else ""
+            last_id = current.last_dialogue_id if current else 0
+            pending = dialogue_crud.get_dialogues_after(
+                db, character_id, last_id, limit=self.max_batch + self.keep_recent
+            )
+            if self.keep_recent:
+                pending = pending[:-self.keep_recent]
+            return previous, [(d.id, d.sender, d.content) for d in pending]
+        finally:
+            db.close()
+
+    def _save(self, character_id: int, summary: str, last_dialogue_id: int):
+        db = SessionLocal()
+        try:
+            dialogue_crud.upsert_dialogue_summary(db, character_id, summary, last_dialogue_id)
+        finally:
+            db.close()
+
+    def _acquire_lock(self, character_id: int) -> bool:
+        # 多个 worker 同时触发时只让一个去调用 LLM
+        if not redis_store.r:
+            return True
+        try:
+            return bool(redis_store.r.set(f"{SUMMARY_LOCK_PREFIX}{character_id}", 1, nx=True, ex=SUMMARY_LOCK_SECONDS))
+        except Exception:
+            return True
+
+    def _release_lock(self, character_id: int):
+        if redis_store.r:
+            try:
+                redis_store.r.delete(f"{SUMMARY_LOCK_PREFIX}{character_id}")
+            except Exception:
+                pass
+
+    def build_messages(self, previous: str, lines: List[tuple]) -> List[dict]:
+        transcript = "\n".join(f"{sender}: {content}" for _, sender, content in lines)
+        return [
+            {"role": "system", "content": text_prompt["SUMMARY_PROMPT"].strip()},
+            {"role": "user", "content": f"Previous summary:\n{previous or '(empty)'}\n\nNew dialogue:\n{transcript}"},
+        ]
+
+    async def maybe_update(self, character_id: int) -> Optional[str]:
+        """
+        Folds pending dialogues into the summary once at least `every_n` have accumulated.
+
+        Returns:
+            str: The new summary, or None when nothing was updated.
+        """
+        try:
+            # 先拿锁再读取旧摘要和待摘要对话：否则另一个 worker 可能在锁释放后拿着过期的快照覆盖新摘要
+            if not await asyncio.to_thread(self._acquire_lock, character_id):
+                return None
+            try:
+                previous, pending = await asyncio.to_thread(self._load_pending, character_id)
+                if len(pending) < self.every_n:
+                    return None
+                summary = await self.llm.chat(self.build_messages(previous, pending), prefix="Summary")
+                if not summary:
+                    return None
+                summary = summary.strip()
+                await asyncio.to_thread(self._save, character_id, summary, pending[-1][0])
+                logging.info(f"[Summary] character {character_id} summarised up to dialogue {pending[-1][0]}")
+                return summary
+            finally:
+                await asyncio.to_thread(self._release_lock, character_id)
+        except Exception as e:
+            logging.error(f"[Summary] Failed to update summary for character {character_id}: {e}")
+            return None
@@ -6,8 +6,11 @@ from pydantic import BaseModel
 from typing import List, Dict, Optional
 
 from modules.base_module import BaseModule
+from modules.texter.context import ContextBuilder, default_context_builder
+from modules.texter.memory import ConversationMemory
+from modules.texter.response_cache import ResponseCache
 from tools.prompts.text_prompt import text_prompt
-from utils.llms import Kimi
+from utils.llm_registry import get_llm
 from utils.utils import send_chat_prompts, extract_value_from_prompt
 
 # 加载 .env 配置
@@ -25,41 +28,46 @@ class GenerateTextRequest(BaseModel):
     description: List[Dict[str, str]]
 
 class TextGenerator(BaseModule):
-    def __init__(self, llm=Kimi()):
-        super().__init__(llm=llm)
+    def __init__(self, llm=None, memory: Optional[ConversationMemory] = None,
+                 context_builder: Optional[ContextBuilder] = None,
+                 response_cache: Optional[ResponseCache] = None):
+        super().__init__(llm=llm or get_llm("chat"))  # 进程内共享的多 provider 路由，首次使用时创建
         self.history: List[dict] = []            # 存纯 role+content
         self.character_name: Optional[str] = None
-
-    async def generate_text(self, dialogues, description, character_name: Optional[str] = None):
+        self.memory = memory                     # 可选：Redis 会话记忆，跨请求 / 跨 worker 共享历史
+        self.context_builder = context_builder or default_context_builder
+        self.response_cache = response_cache     # 可选：persona + 输入 的回复缓存
+
+    async def generate_text(self, dialogues, description, character_name: Optional[str] = None,
+                            user_id: Optional[int] = None, character_id: Optional[int] = None,
+                            summary: Optional[str] = None, use_cache: bool = True,
+                            persona: Optional[str] = None):
         # —— 1. 获取有效角色描述（支持轮换）
-        print("🧪 使用角色描述：", description)
+        print("🧪 使用角色：", character_name)
 
         # —— 2. 抽角色名
         if self.character_name is None and character_name:
             self.character_name = character_name
 
-        # —— 3. 构建 system prompt
-        desc_text = self.transfer_data_to_prompt(description)
-        system_content = (
-            text_prompt["SYSTEM_PROMPT"].strip()
-            + "\n\n**Persona**:\n" + desc_text
-        )
+        # —— 3. 角色设定文本（角色快照里已预先拼好时直接复用）
+        desc_text = persona if persona is not None else self.transfer_data_to_prompt(description)
 
         # —— 4. 合并所有 dialogues 为一句 user_input（也可按条塞，视你需求）
         user_input = "\n".join(d["Input"].strip() for d in dialogues if d.get("Input"))
 
-        # —— 5. 开始构建本次请求的 messages 列表
-        msgs: List[dict] = [
-            {"role": "system", "content": system_content}
-        ]
-        # 限制历史长度，假设保留最新 10 条
-        #TODO：用redis来保存记录
-        if len(self.history) > 10:
-            self.history = self.history[-10:]
-        msgs.extend(self.history)
-
-        # 加入本轮用户
-        msgs.append({"role": "user", "content": user_input})
+        # —— 5. 按 token 预算构建本次请求的 messages 列表
+        # 有会话记忆时，从 Redis 一次性取回该用户与该角色的历史
+        use_memory = self.memory is not None and user_id is not None and character_id is not None
+        if use_memory:
+            self.history = await self.memory.aload(user_id, character_id)
+        # system prompt + persona 必带，更早的对话以滚动摘要带入，最近的对话按整轮装入
+        msgs = self.context_builder.build(
+            system_prompt=text_prompt["SYSTEM_PROMPT"],
+            persona=desc_text,
+            history=self.history,
+            user_input=user_input,
+            summary=summary,
+        )
 
         # **只有最后一条**带 partial/name，符合 Moonshot Partial Mode
         msgs.append({
@@ -70,11 +78,27 @@ class TextGenerator(BaseModule):
         })
 
         # —— 6. 发送给 Kimi
-        response = await self.llm.chat(msgs, temperature=0.3, prefix="Overall")
+        # 冷启动对话（无历史、无摘要）的回复只取决于 persona + 输入，可直接命中缓存跳过 LLM
+        cacheable = (
+            use_cache and self.response_cache is not None
+            and not self.history and not summary and bool(user_input)
+        )
+        response = self.response_cache.get(desc_text, user_input) if cacheable else None
+        if response is None:
+            response = await self.llm.chat(msgs, temperature=0.3, prefix="Overall")
+            if cacheable:
+                self.response_cache.put(desc_text, user_input, response)
+        else:
+            print("⚡ 命中回复缓存，跳过 LLM")
 
         # —— 7. 更新纯净历史
-        self.history.append({"role": "user", "content": user_input})
-        self.history.append({"role": "assistant", "content": response})
+        turn = [
+            {"role": "user", "content": user_input},
+            {"role": "assistant", "content": response},
+        ]
+        self.history.extend(turn)
+        if use_memory:
+            await self.memory.aappend(user_id, character_id, *turn)
 
         # —— 8. 返回最终回答
         return self.extract_content_from_response(response)
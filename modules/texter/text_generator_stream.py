@@ -1,5 +1,6 @@
 import asyncio
 import os
+from contextlib import aclosing
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.responses import StreamingResponse
@@ -7,8 +8,10 @@ from pydantic import BaseModel
 from typing import List, Dict, Optional, AsyncGenerator
 
 from modules.base_module import BaseModule
+from modules.texter.context import ContextBuilder, default_context_builder
+from modules.texter.memory import ConversationMemory
 from tools.prompts.text_prompt import text_prompt
-from utils.llms import Kimi
+from utils.llm_registry import get_llm
 from utils.utils import send_chat_prompts, extract_value_from_prompt
 
 # 加载 .env 配置
@@ -33,34 +36,38 @@ class GenerateTextRequest(BaseModel):
     description: List[Dict[str, str]]
 
 class TextGenerator(BaseModule):
-    def __init__(self, llm=Kimi()):
-        super().__init__(llm=llm)
+    def __init__(self, llm=None, memory: Optional[ConversationMemory] = None,
+                 context_builder: Optional[ContextBuilder] = None):
+        super().__init__(llm=llm or get_llm("chat"))  # 进程内共享的多 provider 路由，首次使用时创建
         self.history: List[dict] = []
         self.character_name: Optional[str] = None
-
-    async def generate_text_stream(self, dialogues, description) -> AsyncGenerator[str, None]:
+        self.memory = memory
+        self.context_builder = context_builder or default_context_builder
+
+    async def generate_text_stream(self, dialogues, description, character_name: Optional[str] = None,
+                                   user_id: Optional[int] = None,
+                                   character_id: Optional[int] = None,
+                                   summary: Optional[str] = None,
+                                   persona: Optional[str] = None) -> AsyncGenerator[str, None]:
         if not description or description == "0":
             description = DEFAULT_DESCRIPTION
 
         if self.character_name is None:
-            self.character_name = extract_value_from_prompt(description, "Name")
-
-        desc_text = self.transfer_data_to_prompt(description)
-        system_content = (
-            text_prompt["SYSTEM_PROMPT"].strip()
-            + "\n\n**Persona**:\n" + desc_text
-        )
+            self.character_name = character_name or extract_value_from_prompt(description, "Name")
 
+        desc_text = persona if persona is not None else self.transfer_data_to_prompt(description)
         user_input = "\n".join(d["Input"].strip() for d in dialogues if d.get("Input"))
 
-        msgs: List[dict] = [
-            {"role": "system", "content": system_content}
-        ]
-        if len(self.history) > 10:
-            self.history = self.history[-10:]
-        msgs.extend(self.history)
-
-        msgs.append({"role": "user", "content": user_input})
+        use_memory = self.memory is not None and user_id is not None and character_id is not None
+        if use_memory:
+            self.history = await self.memory.aload(user_id, character_id)
+        msgs = self.context_builder.build(
+            system_prompt=text_prompt["SYSTEM_PROMPT"],
+            persona=desc_text,
+            history=self.history,
+            user_input=user_input,
+            summary=summary,
+        )
         msgs.append({
             "partial": True,
             "role": "assistant",
@@ -68,19 +75,31 @@ class TextGenerator(BaseModule):
             "content": ""
         })
 
-        async for token in self.llm.chat_stream_async(msgs, temperature=0.3):
-            yield token
-
-        self.history.append({"role": "user", "content": user_input})
-        # NOTE: 因为是流式返回，无法直接缓存完整 assistant 内容，可自行在前端拼接后补充
+        # 逐 token 拉取：消费端不读，上游也不会继续读（天然背压）；
+        # 客户端断开时生成器被取消 / aclose，上游 HTTP 流会随之关闭
+        chunks: List[str] = []
+        async with aclosing(self.llm.chat_stream_async(msgs, temperature=0.3)) as tokens:
+            async for token in tokens:
+                chunks.append(token)
+                yield token
+
+        # 只有完整读完才写入历史，中途断开的半句回复不入历史
+        turn = [
+            {"role": "user", "content": user_input},
+            {"role": "assistant", "content": "".join(chunks)},
+        ]
+        self.history.extend(turn)
+        if use_memory:
+            await self.memory.aappend(user_id, character_id, *turn)
 
 # 创建路由：POST /generate-text-stream
 @app.post("/generate-text-stream")
 async def generate_text_stream_api(request: GenerateTextRequest):
     generator = TextGenerator()
     async def token_stream():
-        async for token in generator.generate_text_stream(request.dialogues, request.description):
-            yield token
+        async with aclosing(generator.generate_text_stream(request.dialogues, request.description)) as tokens:
+            async for token in tokens:
+                yield token
     return StreamingResponse(token_stream(), media_type="text/plain")
 
 # 测试入口（仅调试用）
@@ -0,0 +1,91 @@
+# modules/users/async_crud.py
+# users/crud.py 的 AsyncSession 版本；bcrypt 是 CPU 密集操作，放到专用的有界线程池执行，不阻塞事件循环
+import asyncio
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from . import schemas
+from .session_cache import session_cache
+from utils.security import PasswordHasherBusy, password_hasher
+from utils.redis import create_session
+
+
+@contextmanager
+def _hasher_slot():
+    # 哈希队列已满时快速失败，客户端稍后重试，而不是排队拖垮其他接口
+    try:
+        yield
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Too many password operations, please retry later",
+                            headers={"Retry-After": "1"})
+
+
+# ---------------- Users ----------------
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.execute(select(models.User).filter(models.User.username == username))
+    return result.scalars().first()
+
+async def get_user_by_id(db: AsyncSession, user_id: int):
+    result = await db.execute(select(models.User).filter(models.User.id == user_id))
+    return result.scalars().first()
+
+async def register_user(db: AsyncSession, user: schemas.UserCreate):
+    db_user = await get_user_by_username(db, user.username)
+    if db_user:
+        return {"error": "Username already exists"}
+
+    with _hasher_slot():
+        hashed_pw = await password_hasher.hash(user.password)
+    new_user = models.User(
+        username=user.username,
+        hashed_password=hashed_pw,
+        email=user.email,
+        phone_number=user.phone_number,
+        avatar_url=user.avatar_url,
+        role="user"
+    )
+    db.add(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    return {"message": "User registered successfully", "user_id": new_user.id}
+
+async def login_user(db: AsyncSession, user: schemas.UserCreate):
+    db_user = await get_user_by_username(db, user.username)
+    if not db_user:
+        return {"error": "Username not found"}
+    with _hasher_slot():
+        verified, new_hash = await password_hasher.verify_and_update(user.password, db_user.hashed_password)
+    if not verified:
+        return {"error": "Incorrect password"}
+    if new_hash:
+        # BCRYPT_ROUNDS 变更后，旧哈希在登录成功时透明地按新 cost 重算
+        db_user.hashed_password = new_hash
+        await db.commit()
+
+    token = await asyncio.to_thread(create_session, user_id=db_user.id)  # Redis 写入不占用事件循环
+    return {
+        "message": "Login successful",
+        "token": token,
+        "user": {
+            "id": db_user.id,
+            "username": db_user.username,
+            "role": db_user.role
+        }
+    }
+
+# ✅ 修改密码
+async def change_password(db: AsyncSession, user_id: int, old_password: str, new_password: str):
+    user = await get_user_by_id(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    with _hasher_slot():
+        if not await password_hasher.verify(old_password, user.hashed_password):
+            raise HTTPException(status_code=400, detail="Old password is incorrect")
+        user.hashed_password = await password_hasher.hash(new_password)
+    await db.commit()
+    await asyncio.to_thread(session_cache.invalidate_user, user_id)  # 通知所有 worker 丢弃该用户的会话缓存
+    return {"message": "Password changed successfully"}
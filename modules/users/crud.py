@@ -5,9 +5,10 @@ from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from . import models
 from . import schemas
-from utils.security import hash_password, verify_password
+from utils.security import hash_password, verify_password, verify_and_update_password
 from utils.redis import create_session, delete_session
 from .models import User
+from .session_cache import session_cache
 
 
 # ---------------- Users ----------------
@@ -40,8 +41,13 @@ def login_user(db: Session, user: schemas.UserCreate):
     db_user = get_user_by_username(db, user.username)
     if not db_user:
         return {"error": "Username not found"}
-    if not verify_password(user.password, db_user.hashed_password):
+    verified, new_hash = verify_and_update_password(user.password, db_user.hashed_password)
+    if not verified:
         return {"error": "Incorrect password"}
+    if new_hash:
+        # BCRYPT_ROUNDS 变更后，旧哈希在登录成功时透明地按新 cost 重算
+        db_user.hashed_password = new_hash
+        db.commit()
 
     token = create_session(user_id=db_user.id)
     return {
@@ -65,12 +71,14 @@ def change_password(db: Session, user_id: int, old_password: str, new_password:
 
     user.hashed_password = hash_password(new_password)
     db.commit()
+    session_cache.invalidate_user(user_id)  # 通知所有 worker 丢弃该用户的会话缓存
     return {"message": "Password changed successfully"}
 
 
 # ✅ 登出：删除 Redis 中的会话
 def logout_user(token: str):
     success = delete_session(token)
+    session_cache.invalidate_token(token)
     if success:
         return {"message": "Logout successful"}
     else:
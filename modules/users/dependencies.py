@@ -2,8 +2,8 @@
 from database.database import SessionLocal
 from sqlalchemy.orm import Session
 from fastapi import Depends, Header, HTTPException
-from utils.redis import get_user_id_by_token, refresh_session
 from .models import User
+from .session_cache import UserSnapshot, session_cache
 
 def get_db():
     db = SessionLocal()
@@ -13,17 +13,28 @@ def get_db():
         db.close()
 
 
+def get_current_user_id(token: str = Header(...)) -> int:
+    """
+    只校验会话并返回 user_id，不查 users 表；用于只需要按用户限定查询范围的接口
+    """
+    session = session_cache.resolve(token)  # ✅ 本地会话缓存，TTL 按需续期
+    if session is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return session.user_id
+
+
 def get_current_user(
         token: str = Header(...),
         db: Session = Depends(get_db)
-) -> User:
-    user_id = get_user_id_by_token(token)
-    if not user_id:
+) -> UserSnapshot:
+    """
+    返回用户快照（与 User 同名属性，不含密码哈希）；同一 token 只查一次 users 表
+    """
+    session = session_cache.resolve(token)
+    if session is None:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-    refresh_session(token)  # ✅ 自动刷新 TTL
-
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = session_cache.get_user(session, lambda user_id: db.query(User).filter(User.id == user_id).first())
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
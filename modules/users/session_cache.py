@@ -0,0 +1,203 @@
+# modules/users/session_cache.py
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+import redis
+from cachetools import LRUCache
+
+import utils.redis as redis_store
+from utils.redis import SESSION_TTL_SECONDS, get_user_id_by_token, refresh_session
+
+# 本地缓存的会话多久回 Redis 复核一次（兜底：错过的 pub/sub 消息、会话自然过期）
+SESSION_CACHE_TTL_SECONDS = float(os.getenv("SESSION_CACHE_TTL_SECONDS", "60"))
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "10000"))
+# 估算的剩余 TTL 低于该值时才 EXPIRE 续期，而不是每个请求都续
+SESSION_REFRESH_THRESHOLD_SECONDS = float(os.getenv("SESSION_REFRESH_THRESHOLD_SECONDS", "3000"))
+SESSION_INVALIDATION_CHANNEL = os.getenv("SESSION_INVALIDATION_CHANNEL", "session:invalidate")
+SESSION_CACHE_PUBSUB = os.getenv("SESSION_CACHE_PUBSUB", "true").lower() in ("1", "true", "yes")
+
+
+class UserSnapshot:
+    """
+    Detached copy of the users row the auth dependencies hand to endpoints; it carries the
+    same attributes as the ORM model minus the password hash.
+    """
+    __slots__ = ("id", "username", "email", "phone_number", "role", "avatar_url", "created_at", "is_active")
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_model(cls, user) -> "UserSnapshot":
+        return cls(**{name: getattr(user, name) for name in cls.__slots__})
+
+
+class CachedSession:
+    __slots__ = ("user_id", "user", "validated_at", "refreshed_at")
+
+    def __init__(self, user_id: int, now: float, refreshed_at: float):
+        self.user_id = user_id
+        self.user: Optional[UserSnapshot] = None
+        self.validated_at = now
+        self.refreshed_at = refreshed_at
+
+
+class SessionCache:
+    """
+    Bounded in-process cache of token -> (user_id, user snapshot).
+
+    A cached token costs no Redis or database round trip. Every SESSION_CACHE_TTL_SECONDS it is
+    re-checked with one GET, and the session TTL is extended with EXPIRE only when the
+    estimated remaining TTL drops below SESSION_REFRESH_THRESHOLD_SECONDS. Logout and password
+    changes are broadcast on a Redis pub/sub channel so every worker drops its copy at once.
+    """
+
+    def __init__(self, ttl_seconds: float = SESSION_CACHE_TTL_SECONDS,
+                 max_entries: int = SESSION_CACHE_MAX_ENTRIES,
+                 session_ttl_seconds: int = SESSION_TTL_SECONDS,
+                 refresh_threshold_seconds: float = SESSION_REFRESH_THRESHOLD_SECONDS,
+                 channel: str = SESSION_INVALIDATION_CHANNEL,
+                 pubsub: bool = SESSION_CACHE_PUBSUB):
+        self.ttl_seconds = ttl_seconds
+        self.session_ttl_seconds = session_ttl_seconds
+        self.refresh_threshold_seconds = refresh_threshold_seconds
+        self.channel = channel
+        self.pubsub = pubsub
+        self._entries: LRUCache = LRUCache(maxsize=max_entries)
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.invalidations = 0
+
+    # ---------------- lookup ----------------
+    def resolve(self, token: str) -> Optional[CachedSession]:
+        """
+        Returns the cached session for `token`, or None when the session does not exist.
+        """
+        self._ensure_listener()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+
+        if entry is not None and now - entry.validated_at < self.ttl_seconds:
+            self.hits += 1
+        else:
+            self.misses += 1
+            user_id = get_user_id_by_token(token)
+            if not user_id:
+                self.invalidate_token(token, broadcast=False)
+                return None
+            if entry is None or entry.user_id != int(user_id):
+                # 首次见到的 token 不知道剩余 TTL，按原逻辑续期一次
+                entry = CachedSession(int(user_id), now, refreshed_at=now - self.session_ttl_seconds)
+            entry.validated_at = now
+            with self._lock:
+                self._entries[token] = entry
+
+        if self.session_ttl_seconds - (now - entry.refreshed_at) < self.refresh_threshold_seconds:
+            refresh_session(token, self.session_ttl_seconds)
+            entry.refreshed_at = now
+            self.refreshes += 1
+        return entry
+
+    def get_user(self, entry: CachedSession, loader: Callable[[int], Optional[object]]) -> Optional[UserSnapshot]:
+        """
+        Returns the user snapshot for a resolved session, calling `loader(user_id)` only once.
+        """
+        if entry.user is None:
+            user = loader(entry.user_id)
+            if user is None:
+                return None
+            entry.user = UserSnapshot.from_model(user)
+        return entry.user
+
+    # ---------------- invalidation ----------------
+    def invalidate_token(self, token: str, broadcast: bool = True):
+        with self._lock:
+            self._entries.pop(token, None)
+        self.invalidations += 1
+        if broadcast:
+            self._publish(f"token:{token}")
+
+    def invalidate_user(self, user_id: int, broadcast: bool = True):
+        """
+        Drops every cached session of `user_id` (password change, account update).
+        """
+        with self._lock:
+            for token in [t for t, e in self._entries.items() if e.user_id == user_id]:
+                self._entries.pop(token, None)
+        self.invalidations += 1
+        if broadcast:
+            self._publish(f"user:{user_id}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _publish(self, message: str):
+        r = redis_store.r
+        if not (self.pubsub and r):
+            return
+        try:
+            r.publish(self.channel, message)
+        except Exception as e:
+            logging.error(f"[SessionCache] Publish failed: {e}")
+
+    def _apply(self, message: str):
+        kind, _, value = message.partition(":")
+        if kind == "token":
+            self.invalidate_token(value, broadcast=False)
+        elif kind == "user" and value.isdigit():
+            self.invalidate_user(int(value), broadcast=False)
+
+    # ---------------- pub/sub ----------------
+    def _ensure_listener(self):
+        if self._listener is not None or not self.pubsub:
+            return
+        client = redis_store.r
+        # 只对真实的 Redis 客户端订阅（测试里 patch 的 MagicMock 不订阅），且 Redis 可用时才启动
+        if not isinstance(client, (redis.Redis, redis_store.LazyRedis)) or not client:
+            return
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(
+                target=self._listen, args=(client,), name="session-cache-invalidation", daemon=True
+            )
+            self._listener.start()
+
+    def _listen(self, client: redis.Redis):
+        failures = 0
+        while True:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                failures = 0
+                for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._apply(message["data"])
+            except Exception as e:
+                # 断线期间可能错过失效消息：清空本地缓存，全部回 Redis 复核
+                logging.error(f"[SessionCache] Invalidation listener failed, clearing cache: {e}")
+                self.clear()
+                failures += 1
+                time.sleep(min(30, 2 ** failures))
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "invalidations": self.invalidations,
+            "listening": self._listener is not None,
+        }
+
+
+session_cache = SessionCache()
@@ -2,7 +2,7 @@
 
 import os
 from modules.texter.text_generator_stream import TextGenerator
-from utils.llms import ElevenLabs, DeepSeek
+from utils.llm_registry import get_llm
 from utils.utils import extract_value_from_description
 
 
@@ -15,8 +15,8 @@ class VoiceGenerator:
             text_llm: A language model (e.g., DeepSeek) for generating the response
             tts_engine: A TTS engine instance (e.g., ElevenLabs)
         """
-        self.text_generator = TextGenerator(llm=DeepSeek())
-        self.tts = tts_engine or ElevenLabs()
+        self.text_generator = TextGenerator(llm=text_llm or get_llm("deepseek"))
+        self.tts = tts_engine or get_llm("elevenlabs")
 
     def generate_voice(self, description, dialogues, character_name=None, output_path=None):
         """
@@ -1,9 +1,12 @@
+import io
 import json
 
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock
+from PIL import Image as PILImage
 from main import app
+from utils.image_host import LocalHost, set_image_host
 import modules.users.models
 import modules.character.models
 import modules.texter.models
@@ -23,6 +26,7 @@ def mock_redis_methods():
     mock_r = MagicMock()
     mock_r.setex.side_effect = lambda key, ttl, value: mock_redis_store.update({key: value})
     mock_r.get.side_effect = lambda key: mock_redis_store.get(key)
+    mock_r.set.side_effect = lambda key, value, ex=None: mock_redis_store.update({key: value})
     mock_r.delete.side_effect = lambda key: mock_redis_store.pop(key, None)
     mock_r.expire.side_effect = lambda key, ttl: None
     with patch("utils.redis.r", mock_r):
@@ -132,4 +136,36 @@ def test_upload_character_image():
     assert "final_image_url" in res_data
     assert res_data["final_image_url"].startswith("http"), "返回 URL 非公网地址"
 
-    print("✅ 上传图片成功，URL:", res_data["final_image_url"])
\ No newline at end of file
+    print("✅ 上传图片成功，URL:", res_data["final_image_url"])
+# 6. 本地图床后端 + 内容哈希去重：同一张图第二次上传不再调用图床
+def test_upload_character_image_local_host_dedup(tmp_path):
+    global token
+    headers = {"token": token}
+
+    characters = client.get("/my-characters", headers=headers).json()
+    target = next((c for c in characters if c["name"] == "Test Custom Hero"), None)
+    assert target is not None, "角色 Test Custom Hero 未找到"
+
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (30, 40), (200, 120, 40)).save(buffer, format="PNG")
+    image_bytes = buffer.getvalue()
+
+    host = LocalHost(directory=str(tmp_path), base_url="http://testserver/hosted")
+    host.upload = MagicMock(wraps=host.upload)
+    set_image_host(host)
+    try:
+        urls = []
+        for _ in range(2):
+            files = {"file": ("avatar.png", io.BytesIO(image_bytes), "image/png")}
+            data = {"character_id": str(target["id"])}
+            response = client.post("/upload-character-image", headers=headers, data=data, files=files)
+            assert response.status_code == 200
+            urls.append(response.json()["final_image_url"])
+    finally:
+        set_image_host(None)
+
+    assert urls[0] == urls[1]
+    assert urls[0].startswith("http://testserver/hosted/")
+    assert host.upload.call_count == 1
+    assert len(list(tmp_path.iterdir())) == 1
+    print("✅ 本地图床去重上传成功，URL:", urls[0])
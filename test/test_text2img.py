@@ -28,6 +28,10 @@ def mock_redis_methods():
     mock_r.get.side_effect = lambda key: mock_redis_store.get(key)
     mock_r.delete.side_effect = lambda key: mock_redis_store.pop(key, None)
     mock_r.expire.side_effect = lambda key, ttl: None
+    # ✅ 任务状态使用 Redis hash（pipeline 直接复用同一个 mock）
+    mock_r.pipeline.return_value = mock_r
+    mock_r.hset.side_effect = lambda key, mapping: mock_redis_store.setdefault(key, {}).update(mapping)
+    mock_r.hgetall.side_effect = lambda key: dict(mock_redis_store.get(key, {}))
     with patch("utils.redis.r", mock_r):
         yield
 
@@ -117,4 +121,77 @@ def test_generate_text2img():
     assert any(img.image_url == data["image_url"] for img in images)
 
     print("✅ 图像生成 & 数据写入验证通过")
-    db.close()
\ No newline at end of file
+    db.close()
+
+# ✅ 5. 测试异步任务接口 /jobs/text2img + /jobs/{job_id}
+def test_generate_text2img_job():
+    global token, character_id
+    headers = {"token": token}
+
+    request_data = {
+        "description": [
+            {"Name": "ImageKnight"},
+            {"Gender": "Male"},
+            {"Personality": "Fearless"},
+            {"Appearance": "Golden armor with wings"}
+        ]
+    }
+
+    # ✅ 提交任务应立即返回 job_id
+    response = client.post("/jobs/text2img", json=request_data, headers=headers)
+    print("🧾 Job submitted:", response.text)
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    # ✅ 轮询任务状态直到结束
+    job = None
+    for _ in range(120):
+        job = client.get(f"/jobs/{job_id}", headers=headers).json()
+        if job["status"] in ("succeeded", "failed"):
+            break
+        time.sleep(2)
+
+    print("🎨 Job result:", job)
+    assert job["status"] == "succeeded"
+    assert job["result"]["character_name"] == "ImageKnight"
+    assert job["result"]["image_url"]
+
+    db = SessionLocal()
+    character = db.query(Character).filter_by(id=character_id).first()
+    assert character.final_image_url == job["result"]["image_url"]
+    print("✅ 异步图像任务验证通过")
+    db.close()
+
+# ✅ 5.1 任务只对提交者可见，webhook 不允许指向内网
+def test_job_access_and_webhook_validation():
+    headers = {"token": token}
+    request_data = {
+        "description": [{"Name": "ImageKnight"}],
+        "webhook_url": "https://127.0.0.1/hook"
+    }
+    response = client.post("/jobs/text2img", json=request_data, headers=headers)
+    assert response.status_code == 400
+
+    request_data["webhook_url"] = "http://example.com/hook"
+    assert client.post("/jobs/text2img", json=request_data, headers=headers).status_code == 400
+
+    assert client.get("/jobs/some-job-id", headers={"token": "invalid"}).status_code == 401
+    assert client.get("/jobs/some-job-id", headers=headers).status_code == 404
+
+# ✅ 6. 测试缓存指标接口 /metrics/cache
+def test_cache_metrics():
+    response = client.get("/metrics/cache")
+    assert response.status_code == 200
+    data = response.json()
+    for name in ("image_cache", "response_cache"):
+        assert {"hits", "misses", "hit_rate"} <= set(data[name])
+    print("📊 Cache metrics:", data)
+
+# ✅ 7. 测试连接池指标接口 /metrics/db
+def test_db_pool_metrics():
+    response = client.get("/metrics/db")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["checkouts"] > 0
+    assert {"pool_size", "checked_out", "wait_ms_p95", "invalidations"} <= set(data)
+    print("📊 DB pool metrics:", data)
@@ -1,4 +1,6 @@
 import json
+from datetime import datetime, timedelta
+from uuid import uuid4
 
 import pytest
 from fastapi.testclient import TestClient
@@ -122,4 +124,252 @@ def test_generate_text():
     assert any(d.content == "I'm so sad." for d in dialogues)
     assert any(d.content == generated_text for d in dialogues)
 
-    print("✅ 文本生成 & 数据写入验证通过")
\ No newline at end of file
+    print("✅ 文本生成 & 数据写入验证通过")
+
+# ✅ 5. 测试流式文本生成接口 /generate-text-stream（SSE）
+def test_generate_text_stream():
+    global token, character_id
+    headers = {"token": token}
+
+    request_data = {
+        "dialogues": [
+            {"Input": "Tell me a story."}
+        ],
+        "description": [
+            {"Name": "AI Knight"},
+            {"Gender": "Male"},
+            {"Personality": "Brave"},
+            {"Appearance": "Silver armor and blue cape"}
+        ]
+    }
+
+    response = client.post("/generate-text-stream", json=request_data, headers=headers)
+    print("🔥 Stream content:", response.text)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "x-first-token-latency-ms" in response.headers
+
+    # ✅ 解析 SSE：token 事件 + 最后的 done 事件
+    events = [block for block in response.text.split("\n\n") if block.strip()]
+    assert any(block.startswith("data: ") for block in events)
+    done = events[-1]
+    assert done.startswith("event: done")
+    result = json.loads(done.split("data: ", 1)[1])["result"]
+    assert "SampleSpeech" in result
+
+    # ✅ 后台任务写入对话
+    db = SessionLocal()
+    dialogues = db.query(Dialogue).filter_by(character_id=character_id).all()
+    assert any(d.content == "Tell me a story." for d in dialogues)
+    assert any(d.content == result["SampleSpeech"] for d in dialogues)
+    db.close()
+
+    print("✅ 流式文本生成 & 后台写入验证通过")
+
+# ✅ 6. 测试对话历史分页接口 /dialogues/{character_name}（keyset 游标）
+def test_dialogue_history_pagination():
+    global token, user_id
+    headers = {"token": token}
+    name = f"History Knight {uuid4().hex[:8]}"
+
+    db = SessionLocal()
+    character = Character(user_id=user_id, name=name, description=json.dumps([{"Name": name}]))
+    db.add(character)
+    db.commit()
+    base = datetime(2024, 1, 1)
+    # 两条消息时间戳相同，验证 id 作为同一时间戳内的次序
+    db.add_all([
+        Dialogue(character_id=character.id, sender="user", content=f"msg {i}",
+                 timestamp=base + timedelta(seconds=min(i, 3)))
+        for i in range(5)
+    ])
+    db.commit()
+    db.close()
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(f"/dialogues/{name}", params=params, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        seen.extend(item["content"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == ["msg 4", "msg 3", "msg 2", "msg 1", "msg 0"]
+
+    response = client.get(f"/dialogues/{name}", params={"limit": 3, "format": "columnar"}, headers=headers)
+    assert response.status_code == 200
+    page = response.json()
+    assert page["columns"]["content"] == ["msg 4", "msg 3", "msg 2"]
+    assert page["count"] == 3 and page["next_cursor"]
+
+    response = client.get(f"/dialogues/{name}", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert response.status_code == 400
+
+    print("✅ 对话历史分页验证通过")
+
+
+# 8. 多 provider 路由：429 自动切换到下一个 provider，Kimi 的 partial 前缀不会发给其他 provider
+def test_llm_router_failover():
+    import asyncio
+    from utils.llm_registry import LLMRegistry
+    from utils.llm_router import LLMRouter
+
+    class RateLimited(Exception):
+        status_code = 429
+
+    class FakeLLM:
+        def __init__(self, fail=False):
+            self.fail = fail
+            self.messages = None
+
+        async def chat(self, messages, temperature=0.3, prefix=""):
+            self.messages = messages
+            if self.fail:
+                raise RateLimited()
+            return "你好"
+
+    registry = LLMRegistry(providers={})
+    registry.set("kimi", FakeLLM(fail=True))
+    registry.set("deepseek", FakeLLM())
+    router = LLMRouter(["kimi", "deepseek"], registry)
+
+    messages = [
+        {"role": "user", "content": "hi"},
+        {"partial": True, "role": "assistant", "name": "Alice", "content": ""},
+    ]
+    assert asyncio.run(router.chat(messages)) == "你好"
+    assert registry.get("deepseek").messages == messages[:1]
+
+    stats = router.stats()
+    assert stats["order"] == ["deepseek", "kimi"]
+    assert stats["providers"]["kimi"]["healthy"] is False
+    assert stats["providers"]["deepseek"]["requests"] == 1
+
+    # 冷却结束后按延迟排序，不再因为曾经冷却过而排在后面
+    kimi_stats = router.provider_stats["kimi"]
+    kimi_stats.cooldown_until = 0.5
+    kimi_stats._outcomes.clear()
+    kimi_stats.record_success("chat", 0.1)
+    router.provider_stats["deepseek"].record_success("chat", 5.0)
+    assert router.ranked() == ["kimi", "deepseek"]
+
+
+# 8.1 provider 限流排队超时（RateLimitTimeout）时同样切换到下一个 provider
+def test_llm_router_fails_over_on_rate_limit_timeout():
+    import asyncio
+    from utils.llm_registry import LLMRegistry
+    from utils.llm_router import LLMRouter
+    from utils.rate_limiter import RateLimitTimeout
+
+    class SaturatedLLM:
+        async def chat(self, messages, temperature=0.3, prefix=""):
+            raise RateLimitTimeout("kimi: no rate limit slot within 30.0s")
+
+    class FakeLLM:
+        async def chat(self, messages, temperature=0.3, prefix=""):
+            return "ok"
+
+    registry = LLMRegistry(providers={})
+    registry.set("kimi", SaturatedLLM())
+    registry.set("deepseek", FakeLLM())
+    router = LLMRouter(["kimi", "deepseek"], registry)
+
+    assert asyncio.run(router.chat([{"role": "user", "content": "hi"}])) == "ok"
+    assert router.stats()["providers"]["kimi"]["failures"] == 1
+
+
+# 9. provider 限流：in-flight 上限内排队而不是失败，429 会暂停该 provider
+def test_rate_limiter_queues_requests():
+    import asyncio
+    from utils.rate_limiter import ProviderLimit, RateLimiter
+
+    limiter = RateLimiter({"kimi": ProviderLimit(rps=100, burst=2, concurrency=2, queue_timeout=5)})
+    in_flight = []
+    peak = []
+
+    async def call():
+        async with limiter.alimit("kimi"):
+            in_flight.append(1)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.02)
+            in_flight.pop()
+
+    async def run():
+        await asyncio.gather(*[call() for _ in range(6)])
+
+    asyncio.run(run())
+    stats = limiter.stats()["kimi"]
+    assert max(peak) == 2
+    assert stats["acquired"] == 6 and stats["timeouts"] == 0
+    assert stats["queued"] >= 4 and stats["wait_max_ms"] > 0
+
+    limiter.penalize("kimi", retry_after=60)
+    with pytest.raises(TimeoutError):
+        with limiter.limit("kimi", timeout=0.1):
+            pass
+    assert limiter.stats()["kimi"]["rate_limited"] == 1
+
+
+# 10. 回复缓存默认只做精确匹配：否定等改变语义的输入不能命中别的输入的回复
+def test_response_cache_negation_misses():
+    from modules.texter.response_cache import ResponseCache
+
+    cache = ResponseCache()
+    cache.put("p", "I think I will go to the beach tomorrow", "Have fun at the beach!")
+    assert cache.get("p", "I think I will not go to the beach tomorrow") is None
+    assert cache.get("p", "i think I will go to the beach, tomorrow!") == "Have fun at the beach!"
+
+
+# 10.1 回复缓存：归一化后的精确命中、TTL 过期、超过容量按 LRU 淘汰
+def test_response_cache_hits_expiry_and_eviction():
+    from modules.texter.response_cache import ResponseCache
+
+    cache = ResponseCache(ttl_seconds=60, max_entries=2)
+    cache.put("Knight persona", "Hi. How are you?", "Fine!")
+    assert cache.get("knight persona", "hi how are you") == "Fine!"
+    assert cache.get("Other persona", "hi how are you") is None
+
+    with patch("modules.texter.response_cache.time.monotonic", return_value=10 ** 9):
+        assert cache.get("Knight persona", "hi how are you") is None
+    assert cache.stats()["entries"] == 0
+
+    cache.put("p", "a", "A")
+    cache.put("p", "b", "B")
+    assert cache.get("p", "a") == "A"  # a 变为最近使用，下一次写入淘汰 b
+    cache.put("p", "c", "C")
+    assert cache.get("p", "b") is None
+    assert cache.get("p", "a") == "A" and cache.get("p", "c") == "C"
+    assert cache.stats()["entries"] == 2
+
+
+# 10.2 冷启动对话命中缓存时跳过 LLM；use_cache=False（接口的 bypass_cache）时强制调用 LLM
+def test_generate_text_response_cache_bypass():
+    import asyncio
+    from modules.texter.response_cache import ResponseCache
+    from modules.texter.text_generator import TextGenerator
+
+    class FakeLLM:
+        model_name = "fake"
+        calls = 0
+
+        async def chat(self, messages, temperature=0.3, prefix=""):
+            FakeLLM.calls += 1
+            return f'{{"SampleSpeech": "reply {FakeLLM.calls}"}}'
+
+    cache = ResponseCache()
+    description = [{"Name": "CacheKnight"}, {"Personality": "Loyal"}]
+    dialogues = [{"Input": "Hello there"}]
+
+    def generate(**kwargs):
+        generator = TextGenerator(llm=FakeLLM(), response_cache=cache)
+        return asyncio.run(generator.generate_text(dialogues, description, character_name="CacheKnight", **kwargs))
+
+    first = generate()
+    assert generate() == first and FakeLLM.calls == 1
+    assert generate(use_cache=False) != first and FakeLLM.calls == 2
+    assert cache.stats()["hits"] == 1
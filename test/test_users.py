@@ -1,3 +1,5 @@
+from uuid import uuid4
+
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock
@@ -44,6 +46,69 @@ def test_register_user():
     assert response.status_code in (200, 409)
     print("Register:", response.json())
 
+# ===== 会话缓存：重复请求不再访问 Redis，登出后立即失效 =====
+def test_session_cache_and_logout():
+    response = client.post("/login", json={
+        "username": "testuser4",
+        "password": "newpass456@"
+    })
+    assert response.status_code == 200
+    session_token = response.json()["token"]
+
+    from utils import redis as redis_store
+    redis_store.r.get.reset_mock()
+    for _ in range(3):
+        response = client.get("/protected-route", headers={"token": session_token})
+        assert response.status_code == 200
+        assert response.json()["message"] == "Hello, testuser4"
+    assert redis_store.r.get.call_count == 1
+
+    response = client.post("/logout", headers={"token": session_token})
+    assert response.status_code == 200
+    response = client.get("/protected-route", headers={"token": session_token})
+    assert response.status_code == 401
+
+# ===== 密码哈希：cost 与 BCRYPT_ROUNDS 不一致的旧哈希，登录成功后按新 cost 重算写回 =====
+def test_login_rehashes_password_with_new_cost():
+    from passlib.hash import bcrypt
+    from database.database import SessionLocal
+    from modules.users.models import User
+    from utils.security import BCRYPT_ROUNDS
+
+    username = f"rh_{uuid4().hex[:8]}"
+    response = client.post("/register", json={"username": username, "password": "oldcost123!", "role": "user"})
+    assert response.status_code == 200
+
+    old_rounds = 4 if BCRYPT_ROUNDS != 4 else 5
+    old_hash = bcrypt.using(rounds=old_rounds).hash("oldcost123!")
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter_by(username=username).first()
+        user.hashed_password = old_hash
+        db.commit()
+
+        response = client.post("/login", json={"username": username, "password": "oldcost123!"})
+        assert response.status_code == 200
+        assert "token" in response.json()
+
+        db.refresh(user)
+        assert user.hashed_password != old_hash
+        assert bcrypt.from_string(user.hashed_password).rounds == BCRYPT_ROUNDS
+    finally:
+        db.close()
+
+# ===== 密码哈希队列已满：快速返回 503，而不是排队 =====
+def test_login_returns_503_when_hash_queue_is_full():
+    from utils.security import password_hasher
+
+    client.post("/register", json={"username": "testuser4", "password": "newpass456@", "role": "user"})
+    rejected = password_hasher.rejected
+    with patch.object(password_hasher, "max_pending", 0):
+        response = client.post("/login", json={"username": "testuser4", "password": "newpass456@"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert password_hasher.rejected == rejected + 1
+
 # # ===== 登录用户 =====
 # def test_login_user():
 #     global token
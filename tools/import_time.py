@@ -0,0 +1,66 @@
+# tools/import_time.py
+"""
+Per-module import-time breakdown of the app, to keep worker boot time in check.
+
+    python -m tools.import_time                 # 按顶层包汇总 `import main` 的耗时
+    python -m tools.import_time --by module     # 按单个模块列出
+    python -m tools.import_time utils.llms -n 30
+
+Runs the import in a fresh interpreter with `-X importtime`, so nothing already imported in
+this process skews the numbers. Environment variables (e.g. DATABASEIPV4) are passed through.
+"""
+import argparse
+import re
+import subprocess
+import sys
+from collections import Counter
+from typing import List, Tuple
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(module: str = "main") -> List[Tuple[str, int, int]]:
+    """
+    Returns (module, self_us, cumulative_us) for every module imported by `import <module>`.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    if result.returncode != 0:
+        print(f"⚠️ import {module} failed; timings are partial:", file=sys.stderr)
+        print(result.stderr.strip().splitlines()[-1], file=sys.stderr)
+    return rows
+
+
+def summarize(rows: List[Tuple[str, int, int]], by: str = "package") -> Counter:
+    totals: Counter = Counter()
+    for name, self_us, _ in rows:
+        totals[name.split(".")[0] if by == "package" else name] += self_us
+    return totals
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Report import time per package / module.")
+    parser.add_argument("module", nargs="?", default="main")
+    parser.add_argument("--by", choices=("package", "module"), default="package")
+    parser.add_argument("-n", "--top", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    rows = measure(args.module)
+    totals = summarize(rows, by=args.by)
+    total_ms = sum(totals.values()) / 1000
+
+    print(f"⏱️ import {args.module}: {total_ms:.1f} ms across {len(rows)} modules")
+    for name, self_us in totals.most_common(args.top):
+        print(f"{self_us / 1000:9.1f} ms  {self_us / 1000 / total_ms:6.1%}  {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
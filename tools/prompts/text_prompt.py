@@ -51,5 +51,16 @@ text_prompt = {
     2. {"SampleSpeech": "Meow! Hello! I'm doing great, just playing around as usual! How's your day going? I hope you’re having fun!"}
     3. {"SampleSpeech": "Greetings. I am functioning at full capacity. Please describe your issue, and I will assist you in resolving it efficiently."}
     4. {"SampleSpeech": "ROAR! Me Raxx! Me strong! Me feel great! You no need worry! Me help you with whatever you need, no problem!"}
+    ''',
+    "SUMMARY_PROMPT": '''
+    You maintain a running memory of a role-play chat between a user and a character.
+
+    Please follow these directives:
+    1. You receive the previous summary (may be empty) and the newest dialogue lines, each prefixed with the speaker.
+    2. Merge them into one updated summary written in third person.
+    3. Keep facts the character should remember: the user's name, preferences, feelings, promises, plans and recurring topics.
+    4. Drop greetings, small talk and anything already covered unless it changed.
+    5. Keep the summary under 200 words, in the language the user mainly uses.
+    6. Only return the summary text, no explanations, no extra text.
     '''
 }
\ No newline at end of file
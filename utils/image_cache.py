@@ -0,0 +1,207 @@
+# utils/image_cache.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import utils.redis as redis_store
+
+IMAGE_CACHE_PREFIX = "sdimg:"
+# 缓存自己写入的本地文件索引：zset path -> 最近使用时间，hash path -> 字节数，以及总字节数
+IMAGE_FILES_KEY = f"{IMAGE_CACHE_PREFIX}files"
+IMAGE_FILE_SIZES_KEY = f"{IMAGE_CACHE_PREFIX}file_sizes"
+IMAGE_FILE_BYTES_KEY = f"{IMAGE_CACHE_PREFIX}file_bytes"
+IMAGE_CACHE_TTL_SECONDS = int(os.getenv("SD_IMAGE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# 缓存写入的本地图片副本总大小上限，超出后按最近使用时间淘汰（只删缓存自己记录的文件）
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("SD_IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# 决定生成结果的参数；api key、webhook 等与内容无关的字段不参与 key
+KEY_FIELDS = ("model_id", "prompt", "negative_prompt", "width", "height", "num_inference_steps",
+              "seed", "guidance_scale", "scheduler", "strength")
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageCache:
+    """
+    Content-addressed cache of Stable Diffusion results: sha256(generation params) -> {url, path}.
+
+    Entries live in Redis (`sdimg:{key}`, with TTL) so all workers share them, falling back to an
+    in-process dict when Redis is unavailable. The local copies the cache wrote are tracked in an
+    index with their sizes and a running total, and kept below `max_bytes` by deleting the least
+    recently used ones; other files in assets/images are never touched. An entry whose file was
+    evicted still returns the remote URL.
+    """
+
+    def __init__(self, redis_client=None, ttl_seconds: int = IMAGE_CACHE_TTL_SECONDS,
+                 max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self._redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._local: dict = {}
+        self._files: "OrderedDict[str, int]" = OrderedDict()  # Redis 不可用时的本地文件索引
+        self._file_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    @property
+    def redis(self):
+        return self._redis if self._redis is not None else redis_store.r
+
+    @staticmethod
+    def make_key(mode: str, payload: dict, init_image_hash: Optional[str] = None) -> str:
+        fields = {name: payload.get(name) for name in KEY_FIELDS}
+        fields["mode"] = mode
+        fields["init_image"] = init_image_hash
+        raw = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = None
+        if self.redis:
+            try:
+                entry = json.loads(self.redis.get(f"{IMAGE_CACHE_PREFIX}{key}"))
+            except Exception:
+                entry = None
+        if not isinstance(entry, dict):
+            with self._lock:
+                entry = self._local.get(key)
+
+        if not entry or not entry.get("url"):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        path = entry.get("path")
+        if path and os.path.exists(path):
+            self._touch(path)   # 刷新 LRU 顺序
+        else:
+            entry["path"] = None
+        return entry
+
+    def put(self, key: str, url: str, path: Optional[str] = None):
+        entry = {"url": url, "path": path}
+        stored = False
+        if self.redis:
+            try:
+                self.redis.set(f"{IMAGE_CACHE_PREFIX}{key}", json.dumps(entry), ex=self.ttl_seconds)
+                stored = True
+            except Exception as e:
+                logging.error(f"[ImageCache] Redis write failed, caching in memory: {e}")
+        if not stored:
+            with self._lock:
+                self._local[key] = entry
+        if path:
+            if self._track(path) > self.max_bytes:
+                self.evict_local()
+
+    # ---------------- 本地文件索引 ----------------
+    def _track(self, path: str) -> int:
+        """
+        Adds a file written by the cache to the index; returns the indexed total in bytes.
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return 0
+        if self.redis:
+            try:
+                previous = int(self.redis.hget(IMAGE_FILE_SIZES_KEY, path) or 0)
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.zadd(IMAGE_FILES_KEY, {path: time.time()})
+                pipe.hset(IMAGE_FILE_SIZES_KEY, path, size)
+                pipe.incrby(IMAGE_FILE_BYTES_KEY, size - previous)
+                return int(pipe.execute()[-1])
+            except Exception as e:
+                logging.error(f"[ImageCache] Redis index write failed, tracking locally: {e}")
+        with self._lock:
+            self._file_bytes += size - self._files.pop(path, 0)
+            self._files[path] = size
+            return self._file_bytes
+
+    def _touch(self, path: str):
+        if self.redis:
+            try:
+                self.redis.zadd(IMAGE_FILES_KEY, {path: time.time()}, xx=True)
+                return
+            except Exception:
+                pass
+        with self._lock:
+            if path in self._files:
+                self._files.move_to_end(path)
+
+    def _pop_oldest(self) -> Optional[str]:
+        """
+        Removes the least recently used file from the index and returns its path (None if empty).
+        """
+        if self.redis:
+            try:
+                popped = self.redis.zpopmin(IMAGE_FILES_KEY, 1)
+                if not popped:
+                    return None
+                path = popped[0][0]
+                size = int(self.redis.hget(IMAGE_FILE_SIZES_KEY, path) or 0)
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.hdel(IMAGE_FILE_SIZES_KEY, path)
+                pipe.decrby(IMAGE_FILE_BYTES_KEY, size)
+                pipe.execute()
+                return path
+            except Exception as e:
+                logging.error(f"[ImageCache] Redis index read failed: {e}")
+                return None
+        with self._lock:
+            if not self._files:
+                return None
+            path, size = self._files.popitem(last=False)
+            self._file_bytes -= size
+            return path
+
+    def _indexed_bytes(self) -> int:
+        if self.redis:
+            try:
+                return int(self.redis.get(IMAGE_FILE_BYTES_KEY) or 0)
+            except Exception:
+                pass
+        return self._file_bytes
+
+    def evict_local(self) -> int:
+        """
+        Deletes the least recently used files the cache wrote until the indexed total fits
+        `max_bytes`. Returns the number of files removed.
+        """
+        removed = 0
+        while self._indexed_bytes() > self.max_bytes:
+            path = self._pop_oldest()
+            if path is None:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"[ImageCache] Failed to evict {path}: {e}")
+        if removed:
+            self.evicted += removed
+            logging.info(f"[ImageCache] Evicted {removed} local images")
+        return removed
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "evicted": self.evicted}
+
+
+image_cache = ImageCache()
@@ -0,0 +1,150 @@
+# utils/image_host.py
+import logging
+import os
+import shutil
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import requests
+from dotenv import load_dotenv
+
+import utils.redis as redis_store
+from utils.image_cache import file_sha256
+from utils.rate_limiter import rate_limiter, retry_after_seconds
+
+load_dotenv()
+# imgbb | local
+IMAGE_HOST_BACKEND = os.getenv("IMAGE_HOST_BACKEND", "imgbb")
+IMAGE_HOST_CACHE_PREFIX = "imghost:"
+IMAGE_HOST_CACHE_TTL_SECONDS = int(os.getenv("IMAGE_HOST_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+IMGBB_UPLOAD_URL = "https://api.imgbb.com/1/upload"
+IMGBB_TIMEOUT = float(os.getenv("IMGBB_TIMEOUT", "60"))
+# local 后端：文件落到 LOCAL_IMAGE_HOST_DIR，由 main 挂载到 /hosted 静态路由
+LOCAL_IMAGE_HOST_DIR = os.getenv(
+    "LOCAL_IMAGE_HOST_DIR",
+    os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), "assets", "hosted")
+)
+LOCAL_IMAGE_HOST_BASE_URL = os.getenv("LOCAL_IMAGE_HOST_BASE_URL", "http://localhost:8000/hosted")
+
+
+class ImageHost(ABC):
+    """
+    Backend that turns a local image file into a publicly reachable URL.
+    """
+    name = "base"
+
+    @abstractmethod
+    def upload(self, image_path: str, content_hash: Optional[str] = None) -> Optional[str]:
+        """Returns the public URL, or None if the upload failed."""
+
+
+class ImgbbHost(ImageHost):
+    name = "imgbb"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("UPLOAD_API_KEY")
+
+    def upload(self, image_path: str, content_hash: Optional[str] = None) -> Optional[str]:
+        try:
+            with open(image_path, "rb") as file, rate_limiter.limit("imgbb"):
+                response = requests.post(
+                    IMGBB_UPLOAD_URL,
+                    params={"key": self.api_key},
+                    files={"image": file},
+                    timeout=IMGBB_TIMEOUT
+                )
+            if response.status_code == 429:
+                rate_limiter.penalize("imgbb", retry_after_seconds(response.headers))
+            result = response.json()
+            if result.get("status") == 200:
+                return result["data"]["url"]
+            else:
+                print("❌ Upload failed:", result.get("error"))
+                return None
+        except Exception as e:
+            print("❌ Exception during upload:", str(e))
+            return None
+
+
+class LocalHost(ImageHost):
+    """
+    Stand-in for tests and air-gapped deployments: stores the file under its content hash
+    and serves it from the app's /hosted static route.
+    """
+    name = "local"
+
+    def __init__(self, directory: str = LOCAL_IMAGE_HOST_DIR, base_url: str = LOCAL_IMAGE_HOST_BASE_URL):
+        self.directory = directory
+        self.base_url = base_url.rstrip("/")
+
+    def upload(self, image_path: str, content_hash: Optional[str] = None) -> Optional[str]:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            ext = os.path.splitext(image_path)[-1].lower() or ".png"
+            filename = f"{content_hash or file_sha256(image_path)}{ext}"
+            target = os.path.join(self.directory, filename)
+            if not os.path.exists(target):
+                shutil.copyfile(image_path, target)
+            return f"{self.base_url}/{filename}"
+        except Exception as e:
+            print("❌ Exception during local upload:", str(e))
+            return None
+
+
+HOST_BACKENDS = {
+    ImgbbHost.name: ImgbbHost,
+    LocalHost.name: LocalHost,
+}
+
+_image_host: Optional[ImageHost] = None
+
+
+def get_image_host() -> ImageHost:
+    global _image_host
+    if _image_host is None:
+        backend = HOST_BACKENDS.get(IMAGE_HOST_BACKEND)
+        if backend is None:
+            raise ValueError(f"Unknown IMAGE_HOST_BACKEND: {IMAGE_HOST_BACKEND}")
+        _image_host = backend()
+    return _image_host
+
+
+def set_image_host(host: Optional[ImageHost]):
+    """
+    Swaps the hosting backend (e.g. LocalHost in tests); None restores the configured default.
+    """
+    global _image_host
+    _image_host = host
+
+
+def upload_image(image_path: str, content_hash: Optional[str] = None,
+                 host: Optional[ImageHost] = None) -> Optional[str]:
+    """
+    Uploads through the configured host, skipping the upload when the same content was
+    already uploaded: content sha256 -> public URL is cached in Redis with a TTL.
+    """
+    host = host or get_image_host()
+    try:
+        content_hash = content_hash or file_sha256(image_path)
+    except OSError as e:
+        print("❌ Exception during upload:", str(e))
+        return None
+    key = f"{IMAGE_HOST_CACHE_PREFIX}{host.name}:{content_hash}"
+
+    r = redis_store.r
+    if r:
+        try:
+            cached = r.get(key)
+            if isinstance(cached, str) and cached.startswith("http"):
+                print("⚡ 命中图床缓存，跳过上传：", cached)
+                return cached
+        except Exception as e:
+            logging.error(f"[ImageHost] Redis read failed: {e}")
+
+    url = host.upload(image_path, content_hash=content_hash)
+    if url and r:
+        try:
+            r.set(key, url, ex=IMAGE_HOST_CACHE_TTL_SECONDS)
+        except Exception as e:
+            logging.error(f"[ImageHost] Redis write failed: {e}")
+    return url
@@ -0,0 +1,126 @@
+# utils/llm_registry.py
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from utils.llms import DeepSeek, ElevenLabs, Kimi, OpenAI, StableDiffusion
+
+# >0 时每隔 N 秒重新读取 .env，key / 模型名变化的客户端在下次使用时重建；0 表示只在 reload() 时重载
+LLM_REGISTRY_RELOAD_SECONDS = float(os.getenv("LLM_REGISTRY_RELOAD_SECONDS", "0"))
+
+def _chat_router():
+    from utils.llm_router import LLMRouter  # 延迟导入：llm_router 依赖本模块
+    return LLMRouter()
+
+
+# 名称 -> (工厂函数, 决定该客户端配置的环境变量)
+PROVIDERS: Dict[str, Tuple[Callable[[], Any], Tuple[str, ...]]] = {
+    "kimi": (Kimi, ("KIMI_API_KEY", "KIMI_MODEL_NAME")),
+    "deepseek": (DeepSeek, ("DS_API_KEY", "DS_MODEL_NAME")),
+    "openai": (OpenAI, ("OPENAI_API_KEY", "MODEL_NAME", "OPENAI_BASE_URL")),
+    "elevenlabs": (ElevenLabs, ("VOICE_API_KEY", "VOICE_MODEL_NAME", "VOICE_ID", "ELEVENLABS_OUTPUT_FORMAT")),
+    "sd_text2img": (lambda: StableDiffusion(mode="text2img"), ("SD_API_KEY", "SD_MODEL_NAME")),
+    "sd_img2img": (lambda: StableDiffusion(mode="img2img"), ("SD_API_KEY", "SD_MODEL_NAME")),
+    # 对话用的多 provider 路由（见 utils/llm_router.py），按 LLM_ROUTER_PROVIDERS 在上面几个之间切换
+    "chat": (_chat_router, ("LLM_ROUTER_PROVIDERS", "LLM_HEDGE_DELAY_SECONDS")),
+}
+
+# BaseModule 的 MODEL_TYPE 取值 -> 注册名
+MODEL_TYPES = {
+    "OpenAI": "openai",
+    "DeepSeek": "deepseek",
+    "ElevenLabs": "elevenlabs",
+    "Kimi": "kimi",
+    "Router": "chat",
+}
+
+
+class LLMRegistry:
+    """
+    Process-wide, lazily built provider clients.
+
+    Each client is constructed on first `get` and then shared; the OpenAI-compatible ones already
+    share the per-loop connection pool, so a request only pays for a dict lookup. A client whose
+    environment (key, model name) changed is rebuilt on the next `get` after `reload()`.
+    Tests swap in fakes with `set(name, instance)`.
+    """
+
+    def __init__(self, providers: Optional[Dict[str, Tuple[Callable[[], Any], Tuple[str, ...]]]] = None,
+                 reload_seconds: float = LLM_REGISTRY_RELOAD_SECONDS):
+        self._providers = dict(providers or PROVIDERS)
+        self.reload_seconds = reload_seconds
+        self._instances: Dict[str, Any] = {}
+        self._fingerprints: Dict[str, tuple] = {}
+        self._overrides: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._last_reload = time.monotonic()
+
+    def _fingerprint(self, name: str) -> tuple:
+        return tuple(os.getenv(var) for var in self._providers[name][1])
+
+    def get(self, name: str):
+        if name in self._overrides:
+            return self._overrides[name]
+        if self.reload_seconds > 0 and time.monotonic() - self._last_reload >= self.reload_seconds:
+            self.reload()
+
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        if name not in self._providers:
+            raise ValueError(f"Unknown LLM provider: {name}")
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                factory, _ = self._providers[name]
+                instance = factory()
+                self._instances[name] = instance
+                self._fingerprints[name] = self._fingerprint(name)
+                logging.info(f"[LLMRegistry] Built {name} client")
+        return instance
+
+    def register(self, name: str, factory: Callable[[], Any], env: Tuple[str, ...] = ()):
+        with self._lock:
+            self._providers[name] = (factory, tuple(env))
+            self._instances.pop(name, None)
+
+    def set(self, name: str, instance: Optional[Any]):
+        """
+        Injects `instance` for `name` (e.g. a fake in tests); None restores the real client.
+        """
+        if instance is None:
+            self._overrides.pop(name, None)
+        else:
+            self._overrides[name] = instance
+
+    def reload(self, dotenv_path: Optional[str] = None) -> list:
+        """
+        Re-reads .env and drops the clients whose environment changed; returns their names.
+        """
+        load_dotenv(dotenv_path=dotenv_path, override=True)
+        with self._lock:
+            self._last_reload = time.monotonic()
+            stale = [name for name in self._instances if self._fingerprints.get(name) != self._fingerprint(name)]
+            for name in stale:
+                self._instances.pop(name, None)
+                self._fingerprints.pop(name, None)
+        if stale:
+            logging.info(f"[LLMRegistry] Reloaded: {', '.join(stale)}")
+        return stale
+
+    def reset(self):
+        with self._lock:
+            self._instances.clear()
+            self._fingerprints.clear()
+            self._overrides.clear()
+
+
+llm_registry = LLMRegistry()
+
+
+def get_llm(name: str):
+    return llm_registry.get(name)
@@ -0,0 +1,287 @@
+# utils/llm_router.py
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from utils.llm_registry import LLMRegistry, llm_registry
+from utils.rate_limiter import RateLimitTimeout
+
+# 参与路由的 provider（llm_registry 中的名称），按优先级排列；只配一个时等价于原来的单 provider
+LLM_ROUTER_PROVIDERS = [name.strip() for name in os.getenv("LLM_ROUTER_PROVIDERS", "kimi").split(",") if name.strip()]
+# 首选 provider 超过该时间仍未返回（流式：未出首 token）时，向下一个 provider 发对冲请求；0 表示不对冲
+LLM_HEDGE_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "0"))
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+# 窗口内错误率超过阈值（且样本足够）时，暂时把该 provider 排到最后
+LLM_MAX_ERROR_RATE = float(os.getenv("LLM_MAX_ERROR_RATE", "0.5"))
+LLM_MIN_SAMPLES = int(os.getenv("LLM_MIN_SAMPLES", "5"))
+LLM_ERROR_COOLDOWN_SECONDS = float(os.getenv("LLM_ERROR_COOLDOWN_SECONDS", "30"))
+LLM_RATE_LIMIT_COOLDOWN_SECONDS = float(os.getenv("LLM_RATE_LIMIT_COOLDOWN_SECONDS", "10"))
+
+# 支持 Moonshot Partial Mode（末尾 partial assistant 消息）的 provider
+PARTIAL_MODE_PROVIDERS = {"kimi"}
+
+
+class LLMUnavailable(RuntimeError):
+    """Raised when every provider failed with a retryable error."""
+
+
+class EmptyResponse(RuntimeError):
+    """A provider returned no content (e.g. OpenAI.chat swallowing a connection error)."""
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    429、5xx、连接 / 超时错误换一个 provider 重试；4xx 之类的请求错误原样抛出
+    """
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    # RateLimitTimeout（限流排队超时）是内置 TimeoutError；Python 3.10 上它和 asyncio.TimeoutError 不是同一个类
+    if isinstance(exc, (EmptyResponse, RateLimitTimeout, httpx.TransportError, asyncio.TimeoutError,
+                        TimeoutError, ConnectionError)):
+        return True
+    # openai 的 APIConnectionError / APITimeoutError 没有 status_code；按名字判断，避免导入 SDK
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def adapt_messages(provider: str, messages: List[dict]) -> List[dict]:
+    """
+    Kimi 的 partial 前缀消息其他 provider 不认识：空前缀直接去掉，非空的去掉 partial 标记。
+    """
+    if provider in PARTIAL_MODE_PROVIDERS:
+        return messages
+    adapted = []
+    for message in messages:
+        if message.get("partial"):
+            if not message.get("content"):
+                continue
+            message = {key: value for key, value in message.items() if key != "partial"}
+        adapted.append(message)
+    return adapted
+
+
+class ProviderStats:
+    """
+    Rolling latency (per call kind: "chat" total time, "stream" time to first token) and
+    outcome window for one provider.
+    """
+
+    def __init__(self, window: int = LLM_LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {"chat": deque(maxlen=window), "stream": deque(maxlen=window)}
+        self._outcomes: deque = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.hedge_wins = 0
+        self.cooldown_until = 0.0
+
+    def record_success(self, kind: str, seconds: float):
+        with self._lock:
+            self.requests += 1
+            self._latencies[kind].append(seconds)
+            self._outcomes.append(True)
+
+    def record_failure(self, exc: BaseException):
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self._outcomes.append(False)
+            if _status_code(exc) == 429:
+                self.cooldown_until = max(self.cooldown_until, now + LLM_RATE_LIMIT_COOLDOWN_SECONDS)
+            elif len(self._outcomes) >= LLM_MIN_SAMPLES and self.error_rate() > LLM_MAX_ERROR_RATE:
+                self.cooldown_until = max(self.cooldown_until, now + LLM_ERROR_COOLDOWN_SECONDS)
+                self._outcomes.clear()  # 冷却结束后重新统计，避免旧错误让它一直被判为不健康
+
+    def error_rate(self) -> float:
+        outcomes = list(self._outcomes)
+        return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    def percentile(self, kind: str, p: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies[kind])
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+    def healthy(self, now: Optional[float] = None) -> bool:
+        return (now or time.monotonic()) >= self.cooldown_until
+
+    def snapshot(self) -> dict:
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate(), 3),
+            "hedge_wins": self.hedge_wins,
+            "healthy": self.healthy(),
+            "chat_p50_ms": ms(self.percentile("chat", 0.5)),
+            "chat_p95_ms": ms(self.percentile("chat", 0.95)),
+            "ttft_p50_ms": ms(self.percentile("stream", 0.5)),
+            "ttft_p95_ms": ms(self.percentile("stream", 0.95)),
+        }
+
+
+class LLMRouter:
+    """
+    Chat client that spreads requests over several providers from the registry.
+
+    - each call goes to the healthy provider with the lowest error rate, then the lowest rolling
+      p50 (providers without samples yet are tried first); unhealthy ones are a last resort;
+    - if the first provider has not answered (streams: not produced a first token) within
+      `hedge_delay`, the same request is sent to the next one and the first answer wins;
+    - 429 / 5xx / connection errors fail over to the next provider; a 429 also puts the
+      provider in a short cooldown.
+
+    Exposes the same `chat` / `chat_stream_async` interface as the provider classes.
+    """
+
+    def __init__(self, providers: Sequence[str] = None, registry: LLMRegistry = llm_registry,
+                 hedge_delay: float = LLM_HEDGE_DELAY_SECONDS):
+        self.providers = list(providers or LLM_ROUTER_PROVIDERS)
+        if not self.providers:
+            raise ValueError("LLM_ROUTER_PROVIDERS is empty")
+        self.registry = registry
+        self.hedge_delay = hedge_delay
+        self.provider_stats: Dict[str, ProviderStats] = {name: ProviderStats() for name in self.providers}
+        self.hedges = 0
+
+    @property
+    def model_name(self) -> str:
+        return f"router({', '.join(self.providers)})"
+
+    def ranked(self, kind: str = "chat") -> List[str]:
+        now = time.monotonic()
+
+        def key(name):
+            stats = self.provider_stats[name]
+            p50 = stats.percentile(kind, 0.5)
+            healthy = stats.healthy(now)
+            # 冷却中的按冷却结束时间排在最后；健康的错误率按 10% 分档，同档内再比延迟
+            return (not healthy, 0.0 if healthy else stats.cooldown_until, round(stats.error_rate(), 1),
+                    p50 if p50 is not None else 0.0, self.providers.index(name))
+
+        return sorted(self.providers, key=key)
+
+    async def _race(self, kind: str, start: Callable[[str], Awaitable], discard: Callable = None) -> Tuple[str, object]:
+        """
+        Runs `start(provider)` down the ranked list with hedging and failover; returns the
+        first successful (provider, result).
+        """
+        order = self.ranked(kind)
+        pending: Dict[asyncio.Task, Tuple[str, float]] = {}
+        errors: List[str] = []
+        next_index = 0
+        hedged = False
+
+        def launch():
+            nonlocal next_index
+            name = order[next_index]
+            next_index += 1
+            pending[asyncio.create_task(start(name))] = (name, time.perf_counter())
+
+        launch()
+        try:
+            while pending:
+                can_hedge = self.hedge_delay > 0 and not hedged and next_index < len(order)
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.hedge_delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    self.hedges += 1
+                    logging.info(f"[LLMRouter] {kind} slower than {self.hedge_delay}s, hedging to {order[next_index]}")
+                    launch()
+                    continue
+
+                winner = None
+                for task in done:
+                    name, started = pending.pop(task)
+                    exc = task.exception()
+                    if exc is None:
+                        if winner is None:
+                            self.provider_stats[name].record_success(kind, time.perf_counter() - started)
+                            if hedged and name != order[0]:
+                                self.provider_stats[name].hedge_wins += 1
+                            winner = (name, task.result())
+                        elif discard is not None:
+                            await discard(task.result())
+                        continue
+                    if not is_retryable(exc):
+                        raise exc
+                    self.provider_stats[name].record_failure(exc)
+                    errors.append(f"{name}: {exc!r}")
+                    logging.warning(f"[LLMRouter] {name} failed ({exc!r}), failing over")
+                if winner is not None:
+                    return winner
+                if not pending and next_index < len(order):
+                    launch()
+            raise LLMUnavailable("All LLM providers failed: " + "; ".join(errors))
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def chat(self, messages: List[dict], temperature=0.3, prefix="") -> str:
+        async def start(name):
+            content = await self.registry.get(name).chat(
+                adapt_messages(name, messages), temperature=temperature, prefix=prefix
+            )
+            if content is None:
+                raise EmptyResponse(f"{name} returned no content")
+            return content
+
+        _, content = await self._race("chat", start)
+        return content
+
+    async def chat_stream_async(self, messages: List[dict], temperature=0.3) -> AsyncGenerator[str, None]:
+        """
+        Streams from the provider that produces the first token first. Failover and hedging
+        only apply before the first token; after that the stream is committed to one provider.
+        """
+        async def start(name):
+            tokens = self.registry.get(name).chat_stream_async(adapt_messages(name, messages), temperature=temperature)
+            try:
+                return tokens, await anext(tokens)
+            except StopAsyncIteration:
+                return tokens, None
+            except BaseException:
+                await tokens.aclose()  # 对冲失败或被取消：关闭上游 HTTP 流
+                raise
+
+        async def discard(result):
+            await result[0].aclose()
+
+        _, (tokens, first) = await self._race("stream", start, discard)
+        try:
+            if first is not None:
+                yield first
+                async for token in tokens:
+                    yield token
+        finally:
+            await tokens.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "providers": {name: stats.snapshot() for name, stats in self.provider_stats.items()},
+            "order": self.ranked(),
+            "hedge_delay_seconds": self.hedge_delay,
+            "hedges": self.hedges,
+        }
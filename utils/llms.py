@@ -1,22 +1,26 @@
 from datetime import datetime
-from typing import AsyncGenerator
+from typing import TYPE_CHECKING, AsyncGenerator, Optional
 
-import openai
+import asyncio
 import logging
 import os
 import time
+import weakref
 import requests
 import json
-import openai
 from dotenv import load_dotenv
-from openai import OpenAI as DeepSeekClient, AsyncOpenAI
-from openai import OpenAI as KimiClient
-from elevenlabs.client import ElevenLabs as ElevenLabsClient
-from requests import RequestException, ReadTimeout
-from tqdm import tqdm
+import httpx
+from concurrent.futures import Future
 
+from utils.image_cache import image_cache
+from utils.poller import get_poll_scheduler
+from utils.rate_limiter import RateLimitTimeout, rate_limiter, retry_after_seconds
 from utils.utils import upload_to_imgbb, convert_image_to_png
 
+# openai / elevenlabs SDK 导入很重（~0.5s），在首次创建客户端时才导入，加快 worker 启动
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
 load_dotenv()
 API_KEY = os.getenv('OPENAI_API_KEY')
 DS_API_KEY = os.getenv('DS_API_KEY')
@@ -38,12 +42,108 @@ proxies = {
 # add
 MODEL_SERVER = os.getenv('MODEL_SERVER')
 
-import openai
-import os
-import logging
-import requests
+# —— LLM 连接池配置（每个进程共享一套 keep-alive 连接）——
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "50"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+# Modelslab 返回 429 后最多排队重发几次（不计入 post_retry）
+SD_RATE_LIMIT_RETRIES = int(os.getenv("SD_RATE_LIMIT_RETRIES", "3"))
+
+# 连接池与事件循环绑定：uvicorn worker 只有一个循环，因此每个进程只有一套连接池；
+# 测试 / 脚本里多次 asyncio.run() 时会按循环各建一套，避免跨循环复用连接。
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_api_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+
+def _current_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns the process-wide pooled async HTTP client for the running event loop.
+
+    All LLM providers share this client, so concurrent chat completions reuse the same
+    keep-alive connections instead of opening a new TCP/TLS session per request.
+    """
+    loop = _current_loop()
+    client = _http_clients.get(loop) if loop is not None else None
+    if client is None or client.is_closed:
+        from openai import DefaultAsyncHttpxClient
+
+        client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(LLM_REQUEST_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+        if loop is not None:
+            _http_clients[loop] = client
+            _api_clients.pop(loop, None)
+    return client
+
+
+def get_async_openai_client(api_key: Optional[str], base_url: Optional[str] = None) -> "AsyncOpenAI":
+    """
+    Returns a cached AsyncOpenAI client for (api_key, base_url) bound to the shared connection pool.
+
+    Kimi and DeepSeek expose OpenAI-compatible APIs, so they only differ by key and base URL.
+    """
+    from openai import AsyncOpenAI
+
+    loop = _current_loop()
+    http_client = get_async_http_client()
+    if loop is None:
+        return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+
+    clients = _api_clients.setdefault(loop, {})
+    key = (api_key, base_url)
+    if key not in clients:
+        clients[key] = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+    return clients[key]
+
+
+async def close_async_http_client():
+    """
+    Closes the pooled HTTP client of the running event loop (call on application shutdown).
+    """
+    loop = _current_loop()
+    if loop is None:
+        return
+    _api_clients.pop(loop, None)
+    client = _http_clients.pop(loop, None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+async def stream_chat_completion(client: "AsyncOpenAI", **kwargs) -> AsyncGenerator[str, None]:
+    """
+    Yields content deltas from a streaming chat completion.
+
+    The upstream response is read only when the consumer asks for the next token, so a slow
+    client applies backpressure all the way down to the socket. When the consumer stops early
+    (client disconnect, task cancellation, ``aclose()``) the HTTP stream is closed immediately
+    and the pooled connection is released instead of draining the rest of the completion.
+    """
+    stream = await client.chat.completions.create(stream=True, **kwargs)
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta and delta.content:
+                yield delta.content
+    finally:
+        await stream.close()
+
 
-client = AsyncOpenAI()
 class OpenAI:
     """
     A class for interacting with the OpenAI API, allowing for chat completion requests.
@@ -61,6 +161,8 @@ class OpenAI:
                             `OPENAI_ORGANIZATION` global variable.
     """
 
+    rate_limit_key = "openai"  # utils.rate_limiter 中的 provider 名
+
     def __init__(self):
         """
         Initializes the OpenAI object with the given configuration.
@@ -68,11 +170,16 @@ class OpenAI:
         MODEL_NAME = os.getenv('MODEL_NAME')
         self.model_name = MODEL_NAME
         self.api_key = os.getenv('OPENAI_API_KEY')  # Ensure the API key is loaded
+        self.base_url = os.getenv('OPENAI_BASE_URL', BASE_URL)
         self.proxies = proxies or {}
         if not self.api_key:
             raise ValueError("API key is not provided.")
+        import openai
         openai.api_key = self.api_key
-        self.client = AsyncOpenAI()
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        return get_async_openai_client(self.api_key, self.base_url)
 
     async def chat(self, messages, temperature=0, prefix=""):
         """
@@ -89,12 +196,15 @@ class OpenAI:
         Returns:
             str: The content of the first message in the response from the OpenAI API.
         """
+        import openai
+
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                temperature=temperature
-            )
+            async with rate_limiter.alimit(self.rate_limit_key):
+                response = await self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    temperature=temperature
+                )
             content = response.choices[0].message.content
 
             if len(prefix) > 0 and prefix[-1] != " ":
@@ -103,10 +213,23 @@ class OpenAI:
 
             return content
 
-        except requests.exceptions.RequestException as e:
+        except (openai.APIConnectionError, requests.exceptions.RequestException) as e:
             logging.error(f"APIConnectionError: {e}")
             return None
 
+    async def chat_stream_async(self, messages, temperature=0) -> AsyncGenerator[str, None]:
+        """
+        Streams the chat completion token by token without blocking the event loop.
+        """
+        async with rate_limiter.alimit(self.rate_limit_key):
+            async for token in stream_chat_completion(
+                self.client,
+                model=self.model_name,
+                messages=messages,
+                temperature=temperature
+            ):
+                yield token
+
     def set_model_name(self, model_name):
         self.model_name = model_name
 
@@ -129,6 +252,8 @@ class DeepSeek:
                             `OPENAI_ORGANIZATION` global variable.
     """
 
+    rate_limit_key = "deepseek"
+
     def __init__(self):
         """
         Initializes the OpenAI object with the given configuration.
@@ -136,11 +261,14 @@ class DeepSeek:
         MODEL_NAME = os.getenv('DS_MODEL_NAME')
         self.model_name = MODEL_NAME
 
-        self.api_key = DS_API_KEY
-        self.client = DeepSeekClient(api_key=self.api_key, base_url="https://api.deepseek.com")
+        self.api_key = os.getenv('DS_API_KEY', DS_API_KEY)
+        self.base_url = "https://api.deepseek.com"
 
+    @property
+    def client(self) -> "AsyncOpenAI":
+        return get_async_openai_client(self.api_key, self.base_url)
 
-    def chat(self, messages, temperature=0, prefix=""):
+    async def chat(self, messages, temperature=0, prefix=""):
         """
         Sends a chat completion request to the DeepSeek API.
 
@@ -152,11 +280,12 @@ class DeepSeek:
         Returns:
             str: The response content from DeepSeek
         """
-        response = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=messages,
-            temperature=temperature
-        )
+        async with rate_limiter.alimit(self.rate_limit_key):
+            response = await self.client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=temperature
+            )
 
         if prefix and not prefix.endswith(" "):
             prefix += " "
@@ -164,6 +293,19 @@ class DeepSeek:
         logging.info(f"{prefix}DeepSeek response: {response.choices[0].message.content}")
         return response.choices[0].message.content
 
+    async def chat_stream_async(self, messages, temperature=0) -> AsyncGenerator[str, None]:
+        """
+        Streams the DeepSeek completion token by token without blocking the event loop.
+        """
+        async with rate_limiter.alimit(self.rate_limit_key):
+            async for token in stream_chat_completion(
+                self.client,
+                model=self.model_name,
+                messages=messages,
+                temperature=temperature
+            ):
+                yield token
+
     def set_model_name(self, model_name):
         self.model_name = model_name
 
@@ -173,15 +315,18 @@ class Kimi:
     A class for interacting with the Moonshot (Kimi) API, supporting both standard and partial (role-playing) modes.
     """
 
+    rate_limit_key = "kimi"
+
     def __init__(self):
         MODEL_NAME = os.getenv('KIMI_MODEL_NAME')
         API_KEY = os.getenv('KIMI_API_KEY')
         self.model_name = MODEL_NAME
         self.api_key = API_KEY
-        self.client = KimiClient(
-            api_key=self.api_key,
-            base_url="https://api.moonshot.cn/v1"
-        )
+        self.base_url = "https://api.moonshot.cn/v1"
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        return get_async_openai_client(self.api_key, self.base_url)
 
     async def chat(self, messages: list[dict], temperature=0.3, prefix="") -> str:
         """
@@ -193,12 +338,13 @@ class Kimi:
         Returns:
             str: The generated response content.
         """
-        response = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=4096
-        )
+        async with rate_limiter.alimit(self.rate_limit_key):
+            response = await self.client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=4096
+            )
 
         content = response.choices[0].message.content
 
@@ -208,22 +354,24 @@ class Kimi:
 
         return content
 
-    def chat_stream(self, messages: list[dict], temperature=0.3):
-        response = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=4096,
-            stream=True
-        )
-        for chunk in response:
-            delta = chunk.choices[0].delta
-            if delta and delta.content:
-                yield delta.content
-
-    async def chat_stream_async(self, messages: list[dict], temperature=0.3):
-        for token in self.chat_stream(messages, temperature):
-            yield token  # 在 async def 中直接 yield → 是合法 async generator
+    async def chat_stream_async(self, messages: list[dict], temperature=0.3) -> AsyncGenerator[str, None]:
+        """
+        Streams the Kimi response token by token on the event loop.
+        Args:
+            messages (list): Full conversation history.
+            temperature (float): Controls randomness.
+        Yields:
+            str: Content deltas as they arrive.
+        """
+        async with rate_limiter.alimit(self.rate_limit_key):
+            async for token in stream_chat_completion(
+                self.client,
+                model=self.model_name,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=4096
+            ):
+                yield token
 
 
 class ElevenLabs:
@@ -240,30 +388,34 @@ class ElevenLabs:
         output_format (str): Format of the generated audio file (e.g., 'mp3_44100_128').
     """
 
+    rate_limit_key = "elevenlabs"
+
     def __init__(self):
         """
         Initializes the ElevenLabs object with API credentials and voice/model configuration.
         """
         MODEL_NAME = os.getenv('VOICE_MODEL_NAME')
-        self.api_key = VOICE_API_KEY
+        self.api_key = os.getenv('VOICE_API_KEY', VOICE_API_KEY)
         self.model_id = MODEL_NAME
         self.voice_id = os.getenv("VOICE_ID")  # 默认 Rachel
         self.output_format = os.getenv("ELEVENLABS_OUTPUT_FORMAT")
 
+        from elevenlabs.client import ElevenLabs as ElevenLabsClient
+
         self.client = ElevenLabsClient(api_key=self.api_key)
 
     def synthesize(self, text, character_name="default", output_path=None):
         logging.info(f"[ElevenLabs] Synthesizing text: {text[:30]}...")
 
         try:
-            audio = self.client.text_to_speech.convert(
-                voice_id=self.voice_id,
-                output_format=self.output_format,
-                text=text,
-                model_id=self.model_id
-            )
-
-            audio_bytes = b"".join(audio)
+            with rate_limiter.limit(self.rate_limit_key):
+                audio = self.client.text_to_speech.convert(
+                    voice_id=self.voice_id,
+                    output_format=self.output_format,
+                    text=text,
+                    model_id=self.model_id
+                )
+                audio_bytes = b"".join(audio)  # 流式返回，读完才释放 in-flight 名额
 
             if output_path is None:
                 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -302,9 +454,11 @@ class StableDiffusion:
         mode (str): 'text2img' or 'img2img'.
     """
 
+    rate_limit_key = "modelslab"
+
     def __init__(self, mode="text2img"):
         MODEL_NAME = os.getenv('SD_MODEL_NAME')
-        self.api_key = SD_API_KEY
+        self.api_key = os.getenv('SD_API_KEY', SD_API_KEY)
         self.model_id = MODEL_NAME
         self.mode = mode
         print(f"✅ self.api_key = {self.api_key} (length={len(self.api_key) if self.api_key else 0})")
@@ -316,19 +470,7 @@ class StableDiffusion:
         if not self.endpoint:
             raise ValueError("mode must be 'text2img' or 'img2img'")
 
-    def generate(
-            self,
-            prompt,
-            character_name="default",
-            init_image_url=None,
-            output_path=None,
-            max_retries=30,
-            retry_delay=6,
-            request_timeout=60,  # 新增：请求超时阈值（秒）
-            post_retry=1
-    ):
-        logging.info(f"[StableDiffusion] Generating {self.mode} for {character_name}...")
-
+    def _build_payload(self, prompt, init_image_url=None):
         payload = {
             "key": self.api_key,
             "model_id": self.model_id,
@@ -362,33 +504,108 @@ class StableDiffusion:
                 raise ValueError("init_image_url is required for img2img mode.")
             payload["init_image"] = init_image_url
             payload["strength"] = 0.7
+        return payload
 
+    def generate(
+            self,
+            prompt,
+            character_name="default",
+            init_image_url=None,
+            output_path=None,
+            max_retries=30,
+            retry_delay=6,
+            request_timeout=60,  # 新增：请求超时阈值（秒）
+            post_retry=1,
+            init_image_hash=None,
+            use_cache=True
+    ):
+        """
+        同步接口：阻塞当前线程直到拿到远端图片 URL（失败返回 None）。
+        轮询本身在 PollScheduler 的事件循环中进行，不再 time.sleep 占线程。
+        """
+        return self.generate_future(
+            prompt, character_name, init_image_url, output_path,
+            max_retries, retry_delay, request_timeout, post_retry,
+            init_image_hash=init_image_hash, use_cache=use_cache
+        ).result()
+
+    def generate_future(
+            self,
+            prompt,
+            character_name="default",
+            init_image_url=None,
+            output_path=None,
+            max_retries=30,
+            retry_delay=6,
+            request_timeout=60,
+            post_retry=1,
+            init_image_hash=None,
+            use_cache=True
+    ) -> Future:
+        """
+        非阻塞接口：返回 concurrent.futures.Future，完成时结果为远端图片 URL（失败为 None）。
+
+        相同生成参数（含 init image 内容哈希）命中 image_cache 时直接返回已有 URL，不再消耗 Modelslab 额度。
+        use_cache=False（用户要求重新生成）时跳过查询，但新结果仍写回缓存，替换旧图。
+        """
+        payload = self._build_payload(prompt, init_image_url)
+        cache_key = image_cache.make_key(self.mode, payload, init_image_hash or init_image_url)
+        if use_cache:
+            cached = image_cache.get(cache_key)
+            if cached:
+                print(f"⚡ 命中图像缓存，跳过 Modelslab：{cached['url']}")
+                future: Future = Future()
+                future.set_result(cached["url"])
+                return future
+
+        return get_poll_scheduler().submit(self._generate_async(
+            payload, character_name, output_path, max_retries, retry_delay, request_timeout, post_retry,
+            cache_key
+        ))
+
+    async def _generate_async(self, payload, character_name, output_path, max_retries, retry_delay,
+                              request_timeout, post_retry, cache_key=None):
+        logging.info(f"[StableDiffusion] Generating {self.mode} for {character_name}...")
+        scheduler = get_poll_scheduler()
         headers = {
             "Content-Type": "application/json",
             "User-Agent": "Mozilla/5.0"  # 防止被 Cloudflare 拦截
         }
 
-        # --- 第一次请求 + ReadTimeout 重试 ---
-        for attempt in range(post_retry + 1):
+        # --- 第一次请求 + ReadTimeout 重试；429 时暂停所有 worker 的 Modelslab 请求后排队重发 ---
+        result = None
+        attempt = 0
+        rate_limited = 0
+        while attempt <= post_retry:
             try:
                 print(f"[Attempt {attempt + 1}] POST to {self.endpoint} (timeout={request_timeout}s)")
-                resp = requests.post(
-                    self.endpoint,
-                    headers=headers,
-                    data=json.dumps(payload),
-                    timeout=request_timeout
-                )
+                async with rate_limiter.alimit(self.rate_limit_key):
+                    resp = await scheduler.http.post(
+                        self.endpoint,
+                        headers=headers,
+                        content=json.dumps(payload),
+                        timeout=request_timeout
+                    )
+                if resp.status_code == 429 and rate_limited < SD_RATE_LIMIT_RETRIES:
+                    rate_limited += 1
+                    await rate_limiter.apenalize(self.rate_limit_key, retry_after_seconds(resp.headers))
+                    continue
                 result = resp.json()
                 break  # 成功拿到 result，跳出重试循环
 
-            except ReadTimeout:
+            except RateLimitTimeout as e:
+                logging.error(f"[StableDiffusion] {e}")
+                return None
+
+            except httpx.ReadTimeout:
                 logging.warning(f"[StableDiffusion] Request timed out on attempt {attempt + 1}.")
                 if attempt == post_retry:
                     logging.error("[StableDiffusion] All retries exhausted. Aborting.")
                     return None
-                time.sleep(2)  # 小的间隔后再试
+                attempt += 1
+                await asyncio.sleep(2)  # 小的间隔后再试
 
-            except RequestException as e:
+            except (httpx.HTTPError, ValueError) as e:
                 logging.error(f"[StableDiffusion] Request failed: {e}")
                 return None
 
@@ -397,42 +614,63 @@ class StableDiffusion:
         # --- ① 立即成功 ---
         if result.get("status") == "success":
             image_url = result["output"][0]
-            # ✅ 先保存本地
-            self._download_image(image_url, character_name, output_path)
+            # ✅ 先保存本地并写入缓存
+            await self._save_result(image_url, character_name, output_path, cache_key)
             # 🎯 直接返回远端 URL
             return image_url
 
-        # --- ② 后台处理，轮询 fetch_result ---
+        # --- ② 后台处理，由调度器按退避策略轮询 fetch_result ---
         if result.get("status") == "processing" and result.get("fetch_result"):
             fetch_url = result["fetch_result"]
             logging.info(f"[StableDiffusion] processing, will fetch: {fetch_url}")
-            for i in range(1, max_retries + 1):
-                time.sleep(retry_delay)
-                try:
-                    fr = requests.get(fetch_url, headers=headers, timeout=request_timeout).json()
-                except Exception as e:
-                    logging.warning(f"[Fetch] attempt {i} error: {e}")
-                    continue
+            try:
+                fr = await scheduler.poll(
+                    self._fetch_check(fetch_url, headers, request_timeout),
+                    provider="modelslab",
+                    initial_delay=retry_delay,
+                    base_delay=retry_delay,
+                    max_attempts=max_retries,
+                    timeout=max_retries * retry_delay
+                )
+            except Exception as e:
+                logging.error(f"[StableDiffusion] fetch loop exhausted without success: {e}")
+                return None
 
-                status = fr.get("status")
-                logging.info(f"[Fetch] attempt {i}/{max_retries}, status={status}")
-                if status == "success":
-                    image_url = fr["output"][0]
-                    # ✅ 先保存本地
-                    self._download_image(image_url, character_name, output_path)
-                    # 🎯 再返回远端 URL
-                    return image_url
-                if status not in ("processing", "error"):
-                    break
-
-            logging.error("[StableDiffusion] fetch loop exhausted without success")
-            return None
+            image_url = fr["output"][0]
+            # ✅ 先保存本地并写入缓存
+            await self._save_result(image_url, character_name, output_path, cache_key)
+            # 🎯 再返回远端 URL
+            return image_url
 
             # 其他错误
         msg = result.get("message") or result.get("messege") or "Unknown error"
         logging.error(f"[StableDiffusion] Generation failed: {msg}")
         return None
 
+    async def _save_result(self, image_url, character_name, output_path, cache_key):
+        local_path = await self._download_image(image_url, character_name, output_path)
+        if cache_key:
+            await asyncio.to_thread(image_cache.put, cache_key, image_url, local_path)
+
+    @staticmethod
+    def _fetch_check(fetch_url, headers, request_timeout):
+        async def check(http: httpx.AsyncClient):
+            try:
+                resp = await http.get(fetch_url, headers=headers, timeout=request_timeout)
+                fr = resp.json()
+            except Exception as e:
+                logging.warning(f"[Fetch] error: {e}")
+                return False, None
+
+            status = fr.get("status")
+            logging.info(f"[Fetch] status={status}")
+            if status == "success":
+                return True, fr
+            if status not in ("processing", "error"):
+                raise RuntimeError(f"fetch_result returned status={status}")
+            return False, None
+        return check
+
     @staticmethod
     def build_front_facing_prompt(description: list) -> str:
         """
@@ -490,7 +728,7 @@ class StableDiffusion:
         )
         return prompt
 
-    def _download_image(self, image_url, character_name="default", output_path=None, max_retries=10, retry_delay=3):
+    async def _download_image(self, image_url, character_name="default", output_path=None, max_retries=10, retry_delay=3):
         # ✅ 替换转义符
         image_url = image_url.replace("\\/", "/")
         print(f"[Debug] Cleaned image_url = {image_url}")
@@ -504,33 +742,38 @@ class StableDiffusion:
             filename = f"{character_name.lower()}_{timestamp}.jpg"
             output_path = os.path.join(output_dir, filename)
 
-        headers = {
-            "User-Agent": "Mozilla/5.0"
-        }
-
-        for attempt in tqdm(range(1, max_retries + 1), desc="⏳ Waiting for image to be ready", unit="try"):
+        async def check(http: httpx.AsyncClient):
             try:
-                response = requests.get(image_url, headers=headers, stream=True, timeout=15)
-                content_type = response.headers.get("Content-Type", "")
-                print(f"[Debug] Attempt {attempt}/{max_retries} - Content-Type: {content_type}")
+                response = await http.get(image_url, timeout=15)
+            except Exception as e:
+                logging.error(f"[StableDiffusion] ❌ Download failed: {str(e)}")
+                return False, None
 
-                if "image" in content_type:
-                    with open(output_path, "wb") as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
-                    logging.info(f"[StableDiffusion] ✅ Image saved to: {output_path}")
-                    return output_path
+            content_type = response.headers.get("Content-Type", "")
+            print(f"[Debug] Content-Type: {content_type}")
+            if "image" not in content_type:
+                print(f"[⏳] Not ready yet, polling again...")
+                return False, None
 
-                print(f"[⏳] Not ready yet, waiting {retry_delay}s...")
-                time.sleep(retry_delay)
+            await asyncio.to_thread(self._write_file, output_path, response.content)
+            logging.info(f"[StableDiffusion] ✅ Image saved to: {output_path}")
+            return True, output_path
 
-            except Exception as e:
-                logging.error(f"[StableDiffusion] ❌ Download failed (attempt {attempt}): {str(e)}")
-                time.sleep(retry_delay)
+        try:
+            return await get_poll_scheduler().poll(
+                check,
+                provider="modelslab_cdn",
+                base_delay=retry_delay,
+                max_attempts=max_retries
+            )
+        except Exception as e:
+            logging.error(f"[StableDiffusion] ❌ Image download failed after max retries: {e}")
+            return None
 
-        logging.error("[StableDiffusion] ❌ Image download failed after max retries.")
-        return None
+    @staticmethod
+    def _write_file(path, data: bytes):
+        with open(path, "wb") as f:
+            f.write(data)
 
 def main():
     # start_time = time.time()
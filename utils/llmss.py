@@ -9,8 +9,10 @@ import json
 from dotenv import load_dotenv
 import requests
 from requests import RequestException, ReadTimeout
-from tqdm import tqdm
+from concurrent.futures import Future
 
+from utils.poller import get_poll_scheduler, PollTimeout
+from utils.rate_limiter import rate_limiter, retry_after_seconds
 from utils.utils import upload_to_imgbb, convert_image_to_png
 import time
 import base64
@@ -90,7 +92,8 @@ class VisionStory:
         try:
             # 尝试访问一个简单的API端点来验证密钥
             test_url = "https://openapi.visionstory.ai/api/v1/avatar"
-            resp = requests.get(test_url, headers=self.headers)
+            with rate_limiter.limit("visionstory"):
+                resp = requests.get(test_url, headers=self.headers)
             print(f"[VisionStory] API key test response: {resp.status_code}")
             if resp.status_code == 200:
                 print("[VisionStory] API key is valid")
@@ -126,7 +129,10 @@ class VisionStory:
         print(f"[VisionStory] Headers: {self.headers}")
         
         try:
-            resp = requests.post(self.avatar_url, json=payload, headers=self.headers)
+            with rate_limiter.limit("visionstory"):
+                resp = requests.post(self.avatar_url, json=payload, headers=self.headers)
+            if resp.status_code == 429:
+                rate_limiter.penalize("visionstory", retry_after_seconds(resp.headers))
             print(f"[VisionStory] Upload avatar response: {resp.status_code}")
             print(f"[VisionStory] Response text: {resp.text}")
             
@@ -168,8 +174,9 @@ class VisionStory:
             "aspect_ratio": aspect_ratio,
             "resolution": resolution
         }
-        resp = requests.post(self.video_url, json=payload, headers=self.headers)
-        resp.raise_for_status()
+        with rate_limiter.limit("visionstory"):
+            resp = requests.post(self.video_url, json=payload, headers=self.headers)
+            resp.raise_for_status()
         return resp.json()["data"]["video_id"]
 
     def generate_video_with_audio(self, audio_path, voice_id="Alice", model_id="vs_talk_v1", avatar_id="4321918387609092991", aspect_ratio="9:16", resolution="480p"):
@@ -188,28 +195,48 @@ class VisionStory:
             "aspect_ratio": aspect_ratio,
             "resolution": resolution
         }
-        resp = requests.post(self.video_url, json=payload, headers=self.headers)
-        resp.raise_for_status()
+        with rate_limiter.limit("visionstory"):
+            resp = requests.post(self.video_url, json=payload, headers=self.headers)
+            resp.raise_for_status()
         return resp.json()["data"]["video_id"]
 
     def poll_video_status(self, video_id, timeout=120):
-        wait_time = 0
-        while wait_time <= timeout:
-            time.sleep(5)
-            wait_time += 5
+        """
+        阻塞直到视频生成完成；轮询交给 PollScheduler，不再每个任务占一个 sleep 线程。
+        """
+        try:
+            return self.poll_video_status_future(video_id, timeout).result()
+        except PollTimeout:
+            raise TimeoutError("Video generation timed out.")
+
+    def poll_video_status_future(self, video_id, timeout=120) -> Future:
+        """
+        非阻塞版本：返回 Future，视频状态变为 created 时结果为 data 字典。
+        """
+        params = {"video_id": video_id}
+        headers = self.headers
+
+        async def check(http):
             try:
-                params = {"video_id": video_id}
-                resp = requests.get(self.video_url, params=params, headers=self.headers)
+                resp = await http.get(self.video_url, params=params, headers=headers)
                 resp.raise_for_status()
-                resp_json = resp.json()
-                data = resp_json.get("data", {})
-                status = data.get("status", "")
-                if status == "created":
-                    return data
-                print(f"[Polling] Waiting for video_id {video_id}... status = {status}")
+                data = resp.json().get("data", {})
             except Exception as e:
                 print(f"[Polling Error] {str(e)}")
-        raise TimeoutError("Video generation timed out.")
+                return False, None
+            status = data.get("status", "")
+            if status == "created":
+                return True, data
+            print(f"[Polling] Waiting for video_id {video_id}... status = {status}")
+            return False, None
+
+        return get_poll_scheduler().schedule(
+            check,
+            provider="visionstory",
+            initial_delay=5,
+            base_delay=5,
+            timeout=timeout
+        )
 
     def generate_video_from_prompt(self, dialogues, description, avatar_name="Custom Avatar"):
         """
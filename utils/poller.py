@@ -0,0 +1,247 @@
+# utils/poller.py
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+from concurrent.futures import Future, Executor
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+import httpx
+
+POLL_MAX_CONCURRENCY = int(os.getenv("POLL_MAX_CONCURRENCY", "16"))
+POLL_HTTP_TIMEOUT = float(os.getenv("POLL_HTTP_TIMEOUT", "60"))
+
+# check(http) -> (done, value)；抛异常表示任务失败
+PollCheck = Callable[[httpx.AsyncClient], Awaitable[Tuple[bool, Any]]]
+
+
+class PollTimeout(TimeoutError):
+    """Raised when a remote task is still pending after its attempt / time budget."""
+
+
+class _PollTask:
+    __slots__ = ("check", "provider", "future", "delay", "factor", "max_delay", "jitter",
+                 "attempts", "max_attempts", "deadline")
+
+    def __init__(self, check, provider, future, delay, factor, max_delay, jitter, max_attempts, deadline):
+        self.check = check
+        self.provider = provider
+        self.future = future
+        self.delay = delay
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.attempts = 0
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+
+    def next_delay(self) -> float:
+        delay = min(self.delay * (self.factor ** self.attempts), self.max_delay)
+        return max(0.0, delay * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+
+class PollScheduler:
+    """
+    Drives polling of remote long-running tasks (Modelslab fetch, image readiness, VisionStory
+    video status) from a single event loop running in a daemon thread.
+
+    Pending tasks wait in a timer heap, so thousands of them cost no threads; each due check
+    runs as a coroutine limited by a per-provider semaphore and is rescheduled with jittered
+    exponential backoff until it reports done, fails, or runs out of attempts / time. Results
+    are delivered through thread-safe `concurrent.futures.Future`s, usable from sync code via
+    `.result()` and from async code via `asyncio.wrap_future`.
+    """
+
+    def __init__(self, max_concurrency: int = POLL_MAX_CONCURRENCY, provider_limits: Optional[dict] = None):
+        self.max_concurrency = max_concurrency
+        self.provider_limits = provider_limits or {}
+        self._heap: list = []
+        self._counter = itertools.count()
+        self._semaphores: dict = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._http: Optional[httpx.AsyncClient] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+
+    # ---------------- lifecycle ----------------
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._started.clear()
+            self._thread = threading.Thread(target=self._run_loop, name="poll-scheduler", daemon=True)
+            self._thread.start()
+        self._started.wait()
+
+    def _run_loop(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._http = httpx.AsyncClient(timeout=POLL_HTTP_TIMEOUT, headers={"User-Agent": "Mozilla/5.0"})
+        loop.create_task(self._dispatch())
+        self._started.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(self._http.aclose())
+            loop.close()
+
+    def stop(self):
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        return self._http
+
+    @property
+    def pending(self) -> int:
+        return len(self._heap)
+
+    def _semaphore(self, provider: str) -> asyncio.Semaphore:
+        if provider not in self._semaphores:
+            limit = self.provider_limits.get(provider) or int(
+                os.getenv(f"POLL_CONCURRENCY_{provider.upper()}", str(self.max_concurrency))
+            )
+            self._semaphores[provider] = asyncio.Semaphore(limit)
+        return self._semaphores[provider]
+
+    # ---------------- public API ----------------
+    def submit(self, coro: Awaitable) -> Future:
+        """
+        Runs a coroutine on the scheduler loop (e.g. a full submit -> poll -> download flow).
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def schedule(
+        self,
+        check: PollCheck,
+        provider: str = "default",
+        initial_delay: float = 0.0,
+        base_delay: float = 2.0,
+        factor: float = 1.5,
+        max_delay: float = 30.0,
+        jitter: float = 0.2,
+        max_attempts: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> Future:
+        """
+        Schedules a polling task from any thread and returns a Future with the final value.
+        """
+        self.start()
+        future: Future = Future()
+        self._loop.call_soon_threadsafe(
+            self._push_new, check, provider, future, initial_delay, base_delay,
+            factor, max_delay, jitter, max_attempts, timeout
+        )
+        return future
+
+    async def poll(self, check: PollCheck, provider: str = "default", **kwargs) -> Any:
+        """
+        Awaitable version of `schedule` for coroutines already running on the scheduler loop.
+        """
+        return await asyncio.wrap_future(self.schedule(check, provider, **kwargs))
+
+    # ---------------- internals ----------------
+    def _push_new(self, check, provider, future, initial_delay, base_delay, factor, max_delay,
+                  jitter, max_attempts, timeout):
+        now = self._loop.time()
+        deadline = now + timeout if timeout else None
+        task = _PollTask(check, provider, future, base_delay, factor, max_delay, jitter, max_attempts, deadline)
+        self._push(task, now + initial_delay)
+
+    def _push(self, task: _PollTask, due: float):
+        heapq.heappush(self._heap, (due, next(self._counter), task))
+        self._wakeup.set()
+
+    async def _dispatch(self):
+        while True:
+            now = self._loop.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, task = heapq.heappop(self._heap)
+                if task.future.cancelled():
+                    continue
+                self._loop.create_task(self._run_check(task))
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_check(self, task: _PollTask):
+        try:
+            async with self._semaphore(task.provider):
+                done, value = await task.check(self._http)
+        except Exception as e:
+            if not task.future.done():
+                task.future.set_exception(e)
+            return
+
+        if task.future.done():
+            return
+        if done:
+            task.future.set_result(value)
+            return
+
+        task.attempts += 1
+        now = self._loop.time()
+        if (task.max_attempts is not None and task.attempts >= task.max_attempts) or \
+                (task.deadline is not None and now >= task.deadline):
+            logging.warning(f"[Poller] {task.provider} task gave up after {task.attempts} attempts")
+            task.future.set_exception(PollTimeout(f"{task.provider} task still pending after {task.attempts} attempts"))
+            return
+        self._push(task, now + task.next_delay())
+
+
+def chain_future(future: Future, fn: Callable[[Any], Any], executor: Optional[Executor] = None) -> Future:
+    """
+    Returns a Future resolved with fn(result) once `future` completes.
+
+    `fn` runs on `executor` when given (use it for blocking work such as DB writes, so it does
+    not stall the poll loop); exceptions from either stage propagate to the returned Future.
+    """
+    chained: Future = Future()
+
+    def _apply(value):
+        try:
+            chained.set_result(fn(value))
+        except Exception as e:
+            chained.set_exception(e)
+
+    def _on_done(done: Future):
+        if done.cancelled():
+            chained.cancel()
+            return
+        error = done.exception()
+        if error is not None:
+            chained.set_exception(error)
+        elif executor is not None:
+            executor.submit(_apply, done.result())
+        else:
+            _apply(done.result())
+
+    future.add_done_callback(_on_done)
+    return chained
+
+
+_scheduler: Optional[PollScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_poll_scheduler() -> PollScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PollScheduler()
+        return _scheduler
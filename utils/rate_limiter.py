@@ -0,0 +1,416 @@
+# utils/rate_limiter.py
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional, Tuple
+from uuid import uuid4
+
+import redis
+
+import utils.redis as redis_store
+
+RATE_LIMIT_PREFIX = "ratelimit:"
+# 拿不到额度时最多排队多久，超时抛 RateLimitTimeout；可按 provider 用 RATE_LIMIT_<P>_QUEUE_TIMEOUT 覆盖
+RATE_LIMIT_QUEUE_TIMEOUT = float(os.getenv("RATE_LIMIT_QUEUE_TIMEOUT", "30"))
+# in-flight 满时的重试间隔；令牌不足时按令牌补充时间等待
+RATE_LIMIT_POLL_SECONDS = float(os.getenv("RATE_LIMIT_POLL_SECONDS", "0.05"))
+# in-flight 租约的过期时间：进程崩溃没来得及释放的名额最多占用这么久
+RATE_LIMIT_LEASE_SECONDS = float(os.getenv("RATE_LIMIT_LEASE_SECONDS", "600"))
+# 429 没带 Retry-After 时暂停该 provider 的时长
+RATE_LIMIT_DEFAULT_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_DEFAULT_BACKOFF_SECONDS", "5"))
+RATE_LIMIT_WAIT_WINDOW = int(os.getenv("RATE_LIMIT_WAIT_WINDOW", "500"))
+
+# provider -> (每秒请求数, 突发容量, 最大 in-flight)；0 表示不限。
+# 每项都可用 RATE_LIMIT_<PROVIDER>_RPS / _BURST / _CONCURRENCY 覆盖
+DEFAULT_LIMITS: Dict[str, Tuple[float, int, int]] = {
+    "kimi": (3, 10, 50),
+    "deepseek": (0, 0, 64),
+    "openai": (5, 20, 50),
+    "elevenlabs": (0, 0, 5),
+    "modelslab": (1, 5, 5),
+    "visionstory": (1, 3, 3),
+    "imgbb": (1, 5, 4),
+}
+
+# KEYS: 令牌桶 hash、in-flight 租约 zset、暂停标记
+# ARGV: rps, burst, concurrency, lease_id, lease_ms
+# 返回 0 = 拿到名额；>0 = 需等待的毫秒数；-1 = in-flight 已满
+ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local paused = redis.call('PTTL', KEYS[3])
+if paused > 0 then
+  return paused
+end
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local concurrency = tonumber(ARGV[3])
+local lease_ms = tonumber(ARGV[5])
+if concurrency > 0 then
+  redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+  if redis.call('ZCARD', KEYS[2]) >= concurrency then
+    return -1
+  end
+end
+if rate > 0 then
+  local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+  local tokens = tonumber(bucket[1]) or burst
+  local ts = tonumber(bucket[2]) or now
+  tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+  if tokens < 1 then
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    return math.ceil((1 - tokens) * 1000 / rate)
+  end
+  redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'ts', now)
+  redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+end
+if concurrency > 0 then
+  redis.call('ZADD', KEYS[2], now + lease_ms, ARGV[4])
+  redis.call('PEXPIRE', KEYS[2], lease_ms)
+end
+return 0
+"""
+
+
+class RateLimitTimeout(TimeoutError):
+    """Raised when a request could not get a slot within its queue deadline."""
+
+
+class ProviderLimit:
+    __slots__ = ("rps", "burst", "concurrency", "queue_timeout")
+
+    def __init__(self, rps: float = 0, burst: int = 0, concurrency: int = 0,
+                 queue_timeout: float = RATE_LIMIT_QUEUE_TIMEOUT):
+        self.rps = rps
+        self.burst = max(burst, 1) if rps > 0 else burst
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+
+    @classmethod
+    def from_env(cls, provider: str) -> "ProviderLimit":
+        rps, burst, concurrency = DEFAULT_LIMITS.get(provider, (0, 0, 0))
+        env = f"RATE_LIMIT_{provider.upper()}_"
+        return cls(
+            rps=float(os.getenv(env + "RPS", str(rps))),
+            burst=int(os.getenv(env + "BURST", str(burst))),
+            concurrency=int(os.getenv(env + "CONCURRENCY", str(concurrency))),
+            queue_timeout=float(os.getenv(env + "QUEUE_TIMEOUT", str(RATE_LIMIT_QUEUE_TIMEOUT))),
+        )
+
+
+class _LocalBucket:
+    """
+    In-process fallback with the same semantics as ACQUIRE_SCRIPT, used while Redis is down.
+    """
+
+    def __init__(self, limit: ProviderLimit):
+        self.limit = limit
+        self.tokens = float(limit.burst)
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.limit.concurrency > 0 and self.in_flight >= self.limit.concurrency:
+                return -1
+            if self.limit.rps > 0:
+                self.tokens = min(self.limit.burst, self.tokens + (now - self.updated) * self.limit.rps)
+                self.updated = now
+                if self.tokens < 1:
+                    return (1 - self.tokens) / self.limit.rps
+                self.tokens -= 1
+            self.in_flight += 1
+            return 0
+
+    def release(self):
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class _ProviderStats:
+    def __init__(self, window: int = RATE_LIMIT_WAIT_WINDOW):
+        self.waits: deque = deque(maxlen=window)
+        self.acquired = 0
+        self.queued = 0
+        self.timeouts = 0
+        self.rate_limited = 0
+        self.waiting = 0
+        self.in_flight = 0
+
+    def snapshot(self) -> dict:
+        waits = sorted(self.waits)
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 1) if waits else None
+
+        return {
+            "acquired": self.acquired,
+            "queued": self.queued,
+            "timeouts": self.timeouts,
+            "rate_limited": self.rate_limited,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "wait_p50_ms": pct(0.5),
+            "wait_p95_ms": pct(0.95),
+            "wait_max_ms": round(waits[-1] * 1000, 1) if waits else None,
+        }
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    try:
+        value = headers.get("retry-after") if headers is not None else None
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    return retry_after_seconds(getattr(getattr(exc, "response", None), "headers", None))
+
+
+class RateLimiter:
+    """
+    Per-provider token bucket plus max-in-flight governor, shared by all workers through Redis.
+
+    `limit(provider)` / `alimit(provider)` wait (up to the provider's queue deadline) until both a
+    token and an in-flight slot are free, hold the slot for the duration of the block, and turn a
+    429 raised inside the block into a pause of the provider for every worker. When Redis is
+    unreachable each process falls back to its own bucket with the same limits.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, ProviderLimit]] = None,
+                 poll_seconds: float = RATE_LIMIT_POLL_SECONDS, lease_seconds: float = RATE_LIMIT_LEASE_SECONDS):
+        self._limits: Dict[str, ProviderLimit] = dict(limits or {})
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self._local: Dict[str, _LocalBucket] = {}
+        self._stats: Dict[str, _ProviderStats] = {}
+        self._lock = threading.Lock()
+
+    def get_limit(self, provider: str) -> ProviderLimit:
+        limit = self._limits.get(provider)
+        if limit is None:
+            limit = self._limits.setdefault(provider, ProviderLimit.from_env(provider))
+        return limit
+
+    def set_limit(self, provider: str, limit: ProviderLimit):
+        with self._lock:
+            self._limits[provider] = limit
+            self._local.pop(provider, None)
+
+    def _bucket(self, provider: str) -> _LocalBucket:
+        bucket = self._local.get(provider)
+        if bucket is None:
+            with self._lock:
+                bucket = self._local.setdefault(provider, _LocalBucket(self.get_limit(provider)))
+        return bucket
+
+    def _stats_for(self, provider: str) -> _ProviderStats:
+        stats = self._stats.get(provider)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(provider, _ProviderStats())
+        return stats
+
+    @staticmethod
+    def _client():
+        client = redis_store.r
+        # 只对真实的 Redis 客户端走共享限流（测试里 patch 的 MagicMock 用进程内的桶）
+        return client if isinstance(client, (redis.Redis, redis_store.LazyRedis)) else None
+
+    @staticmethod
+    def _keys(provider: str) -> list:
+        return [f"{RATE_LIMIT_PREFIX}{provider}:bucket", f"{RATE_LIMIT_PREFIX}{provider}:inflight",
+                f"{RATE_LIMIT_PREFIX}{provider}:pause"]
+
+    # ---------------- acquire / release ----------------
+    def _try_acquire(self, provider: str, client) -> Tuple[float, Optional[str]]:
+        """
+        One attempt. Returns (0, lease) on success, otherwise (seconds to wait or -1, None).
+        The lease is a Redis member id, or "" for the local bucket.
+        """
+        limit = self.get_limit(provider)
+        if limit.rps <= 0 and limit.concurrency <= 0:
+            return 0, ""
+        if client:
+            lease = uuid4().hex
+            try:
+                result = int(client.eval(
+                    ACQUIRE_SCRIPT, 3, *self._keys(provider),
+                    limit.rps, limit.burst, limit.concurrency, lease, int(self.lease_seconds * 1000)
+                ))
+                return (0, lease) if result == 0 else (result / 1000 if result > 0 else -1, None)
+            except redis.RedisError as e:
+                logging.warning(f"[RateLimiter] Redis unavailable for {provider}, using local bucket: {e}")
+        wait = self._bucket(provider).try_acquire()
+        return (0, "") if wait == 0 else (wait, None)
+
+    def _release(self, provider: str, lease: str, client):
+        if lease == "":
+            limit = self.get_limit(provider)
+            if limit.rps > 0 or limit.concurrency > 0:
+                self._bucket(provider).release()
+            return
+        try:
+            client.zrem(self._keys(provider)[1], lease)
+        except redis.RedisError as e:
+            # 释放失败时租约会在 RATE_LIMIT_LEASE_SECONDS 后自动过期
+            logging.warning(f"[RateLimiter] Failed to release {provider} slot: {e}")
+
+    def _sleep_for(self, wait: float, deadline: float) -> float:
+        delay = self.poll_seconds if wait < 0 else wait
+        delay = delay * (1 + random.random() * 0.2)  # 抖动，避免各 worker 同时醒来抢同一个令牌
+        return max(0.0, min(delay, deadline - time.monotonic()))
+
+    @staticmethod
+    def _timed_out(stats: _ProviderStats, provider: str, timeout: float):
+        stats.waiting -= 1
+        stats.timeouts += 1
+        raise RateLimitTimeout(f"{provider}: no rate limit slot within {timeout:.1f}s")
+
+    def _granted(self, stats: _ProviderStats, started: float):
+        stats.acquired += 1
+        stats.in_flight += 1
+        stats.waits.append(time.monotonic() - started)
+
+    @contextmanager
+    def limit(self, provider: str, timeout: Optional[float] = None):
+        """
+        Blocking variant for the requests / SDK based clients (runs in worker threads).
+        """
+        timeout = self.get_limit(provider).queue_timeout if timeout is None else timeout
+        stats = self._stats_for(provider)
+        client = self._client()
+        started = time.monotonic()
+        deadline = started + timeout
+        wait, lease = self._try_acquire(provider, client)
+        if lease is None:
+            stats.queued += 1
+            stats.waiting += 1
+            while lease is None and time.monotonic() < deadline:
+                time.sleep(self._sleep_for(wait, deadline))
+                wait, lease = self._try_acquire(provider, client)
+            if lease is None:
+                self._timed_out(stats, provider, timeout)
+            stats.waiting -= 1
+        self._granted(stats, started)
+        try:
+            yield
+        except Exception as e:
+            if _status_code(e) == 429:
+                self.penalize(provider, _retry_after(e))
+            raise
+        finally:
+            stats.in_flight -= 1
+            self._release(provider, lease, client)
+
+    @asynccontextmanager
+    async def alimit(self, provider: str, timeout: Optional[float] = None):
+        """
+        Async variant; Redis calls run in a thread so the event loop never blocks on them.
+        """
+        timeout = self.get_limit(provider).queue_timeout if timeout is None else timeout
+        stats = self._stats_for(provider)
+        client = self._client()
+        started = time.monotonic()
+        deadline = started + timeout
+
+        async def attempt():
+            if client is None:
+                return self._try_acquire(provider, None)
+            future = asyncio.ensure_future(asyncio.to_thread(self._try_acquire, provider, client))
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # 被取消（如对冲请求落败）时线程里可能已拿到名额，拿到就立即归还
+                future.add_done_callback(
+                    lambda f: f.cancelled() or f.exception() or f.result()[1] is None
+                    or self._release(provider, f.result()[1], client)
+                )
+                raise
+
+        wait, lease = await attempt()
+        if lease is None:
+            stats.queued += 1
+            stats.waiting += 1
+            try:
+                while lease is None and time.monotonic() < deadline:
+                    await asyncio.sleep(self._sleep_for(wait, deadline))
+                    wait, lease = await attempt()
+            except BaseException:
+                stats.waiting -= 1
+                raise
+            if lease is None:
+                self._timed_out(stats, provider, timeout)
+            stats.waiting -= 1
+        self._granted(stats, started)
+        try:
+            yield
+        except Exception as e:
+            if _status_code(e) == 429:
+                await self.apenalize(provider, _retry_after(e))
+            raise
+        finally:
+            stats.in_flight -= 1
+            if lease and client is not None:
+                await asyncio.to_thread(self._release, provider, lease, client)
+            else:
+                self._release(provider, lease, client)
+
+    # ---------------- 429 ----------------
+    def penalize(self, provider: str, retry_after: Optional[float] = None):
+        """
+        Provider answered 429: stop handing out slots for `retry_after` seconds on every worker.
+        """
+        seconds = retry_after if retry_after and retry_after > 0 else RATE_LIMIT_DEFAULT_BACKOFF_SECONDS
+        self._stats_for(provider).rate_limited += 1
+        logging.warning(f"[RateLimiter] {provider} rate limited, pausing for {seconds:.1f}s")
+        client = self._client()
+        if client:
+            try:
+                client.set(self._keys(provider)[2], "1", px=int(seconds * 1000))
+                return
+            except redis.RedisError as e:
+                logging.warning(f"[RateLimiter] Failed to share {provider} pause: {e}")
+        self._bucket(provider).pause(seconds)
+
+    async def apenalize(self, provider: str, retry_after: Optional[float] = None):
+        """
+        Async `penalize`: the Redis probe and SET run in a thread, off the event loop.
+        """
+        if self._client() is None:
+            self.penalize(provider, retry_after)
+        else:
+            await asyncio.to_thread(self.penalize, provider, retry_after)
+
+    def stats(self) -> dict:
+        result = {}
+        for provider, stats in list(self._stats.items()):
+            limit = self.get_limit(provider)
+            result[provider] = dict(stats.snapshot(), rps=limit.rps, burst=limit.burst,
+                                    concurrency=limit.concurrency)
+        return result
+
+
+rate_limiter = RateLimiter()
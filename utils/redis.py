@@ -1,22 +1,77 @@
 # utils/redis.py
 import logging
 import redis
+import time
 import uuid
 import os
 from typing import Optional
 
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 SESSION_PREFIX = "session:"
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+
+# 连接探测超时；探测失败后隔多久再试（期间 r 为假值，各缓存走本地 fallback）
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "1"))
+REDIS_RECONNECT_SECONDS = float(os.getenv("REDIS_RECONNECT_SECONDS", "30"))
+
+
+class LazyRedis:
+    """
+    Redis client that connects on first use instead of at import time.
+
+    Truthiness keeps the old `if r:` contract: the first check pings once (no retries, short
+    timeout) and the result is cached; while Redis is unreachable `r` is falsy and callers use
+    their local fallbacks, with a new probe at most every REDIS_RECONNECT_SECONDS.
+    Attribute access is forwarded to the underlying redis.Redis.
+    """
+
+    def __init__(self, host: str = REDIS_HOST, port: int = REDIS_PORT, **kwargs):
+        self.host = host
+        self.port = port
+        self._kwargs = kwargs
+        self._client: Optional[redis.Redis] = None
+        self._available: Optional[bool] = None
+        self._checked_at = 0.0
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis(host=self.host, port=self.port, **self._kwargs)
+        return self._client
+
+    def _probe(self) -> bool:
+        probe = redis.Redis(host=self.host, port=self.port, socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                            retry=Retry(NoBackoff(), 0))
+        try:
+            return bool(probe.ping())
+        except redis.exceptions.RedisError:
+            return False
+        finally:
+            probe.close()
+
+    def __bool__(self) -> bool:
+        now = time.monotonic()
+        if self._available is None or (not self._available and now - self._checked_at >= REDIS_RECONNECT_SECONDS):
+            was_available = self._available
+            self._available = self._probe()
+            self._checked_at = now
+            if not self._available and was_available is None:
+                logging.error("Redis connection failed. Please check host/port.")
+            elif self._available and was_available is False:
+                logging.info("[Redis] Connection restored")
+        return self._available
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
 
-try:
-    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
-    r.ping()  # 检查连接
-except redis.exceptions.ConnectionError:
-    logging.error("Redis connection failed. Please check host/port.")
-    r = None  # fallback 安全处理
+r = LazyRedis(decode_responses=True)
 
-def create_session(user_id: int, expire_seconds: int = 3600) -> str:
+def create_session(user_id: int, expire_seconds: int = SESSION_TTL_SECONDS) -> str:
     token = str(uuid.uuid4())
     if r:
         r.setex(f"{SESSION_PREFIX}{token}", expire_seconds, user_id)
@@ -41,6 +96,6 @@ def delete_session(token: str):
     if r:
         r.delete(f"{SESSION_PREFIX}{token}")
 
-def refresh_session(token: str, expire_seconds: int = 3600):
+def refresh_session(token: str, expire_seconds: int = SESSION_TTL_SECONDS):
     if r:
         r.expire(f"{SESSION_PREFIX}{token}", expire_seconds)
\ No newline at end of file
@@ -0,0 +1,76 @@
+# utils/uploads.py
+import hashlib
+import logging
+import os
+from typing import NamedTuple, Optional
+from uuid import uuid4
+
+from fastapi import HTTPException, UploadFile
+
+from utils.utils import upload_to_imgbb, convert_image_to_png
+
+UPLOAD_DIR = os.path.join(os.getcwd(), "temp_uploads")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+
+
+class StoredUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+
+
+async def save_upload_stream(file: UploadFile, upload_dir: str = UPLOAD_DIR,
+                             chunk_size: int = UPLOAD_CHUNK_SIZE,
+                             max_bytes: int = UPLOAD_MAX_BYTES) -> StoredUpload:
+    """
+    Copies an UploadFile to disk chunk by chunk, hashing it on the way.
+
+    Only one chunk is held in memory at a time, and the content hash comes for free, so
+    callers never need to reopen the file just to fingerprint it.
+    """
+    os.makedirs(upload_dir, exist_ok=True)  # 自动创建目录
+    file_ext = os.path.splitext(file.filename or "")[-1] or ".png"
+    file_path = os.path.join(upload_dir, f"user_upload_{uuid4().hex}{file_ext}")
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(file_path, "wb") as f:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        discard_upload(file_path)
+        raise
+
+    return StoredUpload(file_path, digest.hexdigest(), size)
+
+
+def normalize_and_upload(image_path: str) -> Optional[str]:
+    """
+    img2img 输入只做一次归一化（3:4 PNG）并只上传一次；返回的 URL 同时用于
+    user_upload 记录和 SD init image。
+    """
+    png_path = convert_image_to_png(image_path)
+    try:
+        return upload_to_imgbb(png_path)
+    finally:
+        discard_upload(png_path)
+
+
+def discard_upload(path: Optional[str]):
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.warning(f"[Uploads] Failed to remove {path}: {e}")
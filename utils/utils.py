@@ -6,11 +6,8 @@ import re
 import string
 from uuid import uuid4
 
-import numpy as np
-from PIL import Image
-from dotenv import load_dotenv
-import requests
-from pydub import AudioSegment
+from utils.image_host import upload_image
+from utils.image_pipeline import preprocess_image
 
 
 def save_json(file_path, new_json_content):
@@ -233,68 +230,34 @@ def parse_description_from_input(user_input: str) -> list:
 
 
 
-def upload_to_imgbb(image_path: str) -> str:
+def upload_to_imgbb(image_path: str, content_hash: str = None) -> str:
     """
-    Upload a local image to imgbb and return a publicly accessible URL.
+    Upload a local image to the configured image host (imgbb by default) and return a publicly accessible URL.
+
+    Identical content is uploaded only once: see utils.image_host.upload_image.
 
     Args:
         image_path (str): Path to the image file.
-        api_key (str): Your imgbb API key.
+        content_hash (str): Optional sha256 of the file, if the caller already computed it.
 
     Returns:
         str: URL of uploaded image or None if failed.
     """
-    load_dotenv()
-    api_key = os.getenv('UPLOAD_API_KEY')
-    try:
-        with open(image_path, "rb") as file:
-            response = requests.post(
-                "https://api.imgbb.com/1/upload",
-                params={"key": api_key},
-                files={"image": file}
-            )
-        result = response.json()
-        if result.get("status") == 200:
-            return result["data"]["url"]
-        else:
-            print("❌ Upload failed:", result.get("error"))
-            return None
-    except Exception as e:
-        print("❌ Exception during upload:", str(e))
-        return None
+    return upload_image(image_path, content_hash=content_hash)
 
 
 
 def convert_image_to_png(input_path, output_dir="converted", max_size=800):
+    """
+    居中裁剪为 3:4 并缩放到 576x768 PNG（单次 draft + crop/resize，见 utils.image_pipeline）
+    """
     os.makedirs(output_dir, exist_ok=True)
     unique_name = f"{uuid4().hex}.png"
     output_path = os.path.join(output_dir, unique_name)
 
-    with Image.open(input_path) as img:
-        img = img.convert("RGB")
-
-        # ✅ 强制裁剪为 3:4 居中
-        width, height = img.size
-        target_ratio = 3 / 4
-        current_ratio = width / height
-
-        if current_ratio > target_ratio:
-            # 宽过长：裁剪左右
-            new_width = int(height * target_ratio)
-            left = (width - new_width) // 2
-            img = img.crop((left, 0, left + new_width, height))
-        elif current_ratio < target_ratio:
-            # 高过长：裁剪上下
-            new_height = int(width / target_ratio)
-            top = (height - new_height) // 2
-            img = img.crop((0, top, width, top + new_height))
-        # 如果正好是 3:4 就不需要裁剪
-
-        # ✅ 缩放到标准尺寸（576x768）
-        img = img.resize((576, 768))
-
-        # 保存为 PNG
-        img.save(output_path, "PNG")
+    buffer = preprocess_image(input_path, size=(576, 768), crop_to_ratio=True, fmt="PNG")
+    with open(output_path, "wb") as f:
+        f.write(buffer.getbuffer())
 
     return output_path
 
@@ -310,11 +273,11 @@ def normalize_image_output(image_path, size=(512, 512)):
     if not image_path or not os.path.exists(image_path):
         raise FileNotFoundError(f"❌ 图片路径无效：{image_path}")
 
-    img = Image.open(image_path).convert("RGB")
-    img = img.resize(size)
+    buffer = preprocess_image(image_path, size=size, crop_to_ratio=False, fmt="JPEG")
 
     normalized_path = image_path.replace(".jpg", "_normalized.jpg").replace(".png", "_normalized.jpg")
-    img.save(normalized_path, format="JPEG")
+    with open(normalized_path, "wb") as f:
+        f.write(buffer.getbuffer())
 
     print("🖼️ 已归一化图像保存为：", normalized_path)
     return normalized_path
@@ -332,6 +295,8 @@ def normalize_audio_output(audio_path, target_sample_rate=44100):
     if not os.path.exists(audio_path):
         raise FileNotFoundError(f"❌ 音频路径无效：{audio_path}")
 
+    from pydub import AudioSegment  # pydub 只有音频接口用到，延迟导入
+
     audio = AudioSegment.from_file(audio_path)
     audio = audio.set_frame_rate(target_sample_rate).set_channels(1)
 